@@ -1,10 +1,15 @@
 from contextlib import contextmanager
+import datetime
 import json
+import math
 import numpy as np
 import os
 import psycopg2
 import psycopg2.pool
+import Queue
 import sys
+import threading
+import time
 
 try:
     import cPickle as pickle
@@ -17,6 +22,237 @@ except:
     import StringIO
 
 
+# Columns of the generations table filled by recordRun, in COPY order.
+GENERATION_COLUMNS = ("run_id", "generation", "runtime",
+    "food_max", "food_min", "food_avg", "food_std",
+    "moves_max", "moves_min", "moves_avg", "moves_std",
+    "moves_left", "moves_right", "moves_forward", "moves_none",
+    "elite")
+
+# Defaults of the background writer of DBUtils.startRun.
+WRITER_BATCH_SIZE  = 100
+WRITER_FLUSH_SECS  = 5.0
+WRITER_MAX_PENDING = 1000
+# Seconds between checks for a failed writer while the queue is full.
+WRITER_POLL_SECS   = 0.1
+
+# Table holding the ids of each key of DBUtils.getIDs.
+ID_TABLES = {
+    "trail"      : "trails",
+    "network"    : "networks",
+    "mutate"     : "mutate",
+    "selection"  : "selection",
+    "variations" : "variations"
+}
+
+
+def _copy_float(value):
+    """ Formats a float for COPY like psycopg2 quotes it in a query.
+    """
+    value = float(value)
+
+    if math.isnan(value):
+        return "NaN"
+    elif math.isinf(value):
+        return "Infinity" if value > 0 else "-Infinity"
+
+    return repr(value)
+
+
+def _copy_interval(value):
+    """ Formats a datetime.timedelta for COPY like psycopg2 quotes it in a
+    query.
+    """
+    return "{0} days {1}.{2:06d} seconds".format(value.days, value.seconds,
+        value.microseconds)
+
+
+def generations_copy_buffer(run_id, gen_info):
+    """ Writes the records of the generations of a run to an in-memory
+    buffer in the text format of COPY, giving the same rows as inserting
+    them one at a time.
+
+    Args:
+        run_id (int): Id of the run.
+        gen_info (list): Record of each generation.
+
+    Returns:
+        StringIO. Buffer positioned at its start, with the columns of
+        GENERATION_COLUMNS.
+    """
+    buf = StringIO.StringIO()
+
+    for curr_gen in gen_info:
+        buf.write("\t".join([
+            str(int(run_id)),
+            str(int(curr_gen["gen"])),
+            _copy_interval(curr_gen["runtime"]),
+            # Whole numbers like psycopg2 sends them for smallint columns.
+            str(int(curr_gen["food_max"])),
+            str(int(curr_gen["food_min"])),
+            _copy_float(curr_gen["food_avg"]),
+            _copy_float(curr_gen["food_std"]),
+            str(int(curr_gen["moves_max"])),
+            str(int(curr_gen["moves_min"])),
+            _copy_float(curr_gen["moves_avg"]),
+            _copy_float(curr_gen["moves_std"]),
+            str(int(curr_gen["moves_left"])),
+            str(int(curr_gen["moves_right"])),
+            str(int(curr_gen["moves_forward"])),
+            str(int(curr_gen["moves_none"])),
+            "{" + ",".join(_copy_float(gene)
+                for gene in curr_gen["elite"]) + "}"]))
+        buf.write("\n")
+
+    buf.seek(0)
+
+    return buf
+
+
+class RunWriter(object):
+    """ Records a run from a background thread as it evolves. The thread
+    adds the run with a runtime of zero, writes the generations in batches
+    with COPY and sets the runtime at the end, all in one transaction on a
+    pooled connection. A new configuration of the run is committed first
+    in a short transaction of its own. Made by DBUtils.startRun.
+    """
+
+    def __init__(self, pool, begin_run, run_info, batch_size, flush_secs,
+        max_pending):
+        if batch_size < 1 or max_pending < 1:
+            raise ValueError(
+                "Batch size ({0}) and most pending ({1}) must be at "
+                "least 1.".format(batch_size, max_pending))
+
+        self.__pool       = pool
+        self.__begin_run  = begin_run
+        self.__run_info   = dict(run_info, runtime=datetime.timedelta(0))
+        self.__batch_size = batch_size
+        self.__flush_secs = flush_secs
+
+        # Adding blocks once the database falls max_pending behind.
+        self.__queue  = Queue.Queue(maxsize=max_pending)
+        self.__run_id = None
+        self.__error  = None
+        self.__record_times = {"generations" : 0.0, "waited" : 0.0}
+
+        self.__thread = threading.Thread(target=self.__write)
+        self.__thread.daemon = True
+        self.__thread.start()
+
+    def __write(self):
+        """ Body of the thread.
+        """
+        con = None
+        try:
+            con  = self.__pool.getconn()
+            curs = con.cursor()
+
+            self.__run_id = self.__begin_run(curs, self.__run_info,
+                self.__record_times)
+
+            batch      = []
+            last_flush = time.time()
+
+            while True:
+                try:
+                    item = self.__queue.get(timeout=max(0.0,
+                        self.__flush_secs - (time.time() - last_flush)))
+                except Queue.Empty:
+                    item = None
+
+                finished = item is not None and item[0] == "finish"
+                if item is not None and not finished:
+                    batch.append(item[1])
+
+                if (finished or len(batch) >= self.__batch_size or
+                    time.time() - last_flush >= self.__flush_secs):
+                    if batch:
+                        phase_start = time.time()
+                        curs.copy_from(
+                            generations_copy_buffer(self.__run_id, batch),
+                            "generations", columns=GENERATION_COLUMNS)
+                        self.__record_times["generations"] += (
+                            time.time() - phase_start)
+                        batch = []
+
+                    last_flush = time.time()
+
+                if finished:
+                    phase_start = time.time()
+                    curs.execute("""UPDATE run SET runtime = %s
+                        WHERE id = %s;""", (item[1], self.__run_id))
+                    curs.close()
+                    con.commit()
+                    self.__record_times["commit"] = time.time() - phase_start
+                    break
+        except Exception as e:
+            self.__error = e
+
+            if con is not None:
+                con.rollback()
+        finally:
+            if con is not None:
+                self.__pool.putconn(con)
+
+    def __put(self, item):
+        """ Queues an item for the thread, waiting while the queue is full.
+        """
+        wait_start = time.time()
+
+        while True:
+            # The thread stops taking items if it fails.
+            if self.__error is not None:
+                raise self.__error
+
+            try:
+                self.__queue.put(item, timeout=WRITER_POLL_SECS)
+                break
+            except Queue.Full:
+                pass
+
+        self.__record_times["waited"] += time.time() - wait_start
+
+    def add(self, record):
+        """ Queues the record of a generation to be written.
+
+        Raises:
+            Exception: The error that stopped the thread, if it failed.
+        """
+        self.__put(("record", record))
+
+    def finish(self, runtime):
+        """ Writes the remaining generations and the runtime of the run and
+        commits it.
+
+        Args:
+            runtime (datetime.timedelta): Time taken by the run.
+
+        Returns:
+            int. Id of the run.
+
+        Raises:
+            Exception: The error that stopped the thread, if it failed.
+        """
+        self.__put(("finish", runtime))
+        self.__thread.join()
+
+        if self.__error is not None:
+            raise self.__error
+
+        return self.__run_id
+
+    def getRecordTimes(self):
+        """ Returns the seconds spent in each phase of recording the run.
+
+        Returns:
+            dict. With keys "config", "run", "generations" and "commit",
+            and "waited" for the time add and finish were blocked by a
+            full queue.
+        """
+        return dict(self.__record_times)
+
+
 class NetworkNotFound(Exception):
     def __init__(self, value):
         self.value = value
@@ -25,7 +261,7 @@ class NetworkNotFound(Exception):
 
 
 class DBUtils(object):
-    def __init__(self, config_file, debug=False):
+    def __init__(self, config_file, debug=False, max_connections=10):
 
         with open(config_file) as fh:
             config = json.load(fh)
@@ -39,9 +275,12 @@ class DBUtils(object):
 
         self.__debug = debug
 
-        self.__pool        = psycopg2.pool.SimpleConnectionPool(
+        self.__record_times = {}
+
+        # Run writers use connections from their own threads.
+        self.__pool        = psycopg2.pool.ThreadedConnectionPool(
             1,
-            10,
+            max_connections,
             self.__dsn)
 
     @contextmanager
@@ -53,34 +292,58 @@ class DBUtils(object):
             self.__pool.putconn(con)
 
     def getIDs(self):
-        # Returns a list of network, trail, and mutate ids in a dictionary
-        # with keys of "trail", "network", "mutate".
+        """ Returns the ids of the trails, networks, mutation, selection and
+        variation types. Each table is queried for its own ids, all in one
+        round trip.
+
+        Returns:
+            dict. Sorted list of ids keyed by "trail", "network", "mutate",
+            "selection" and "variations".
+        """
+        ids = dict((key, []) for key in ID_TABLES)
 
         with self.__getCursor() as curs:
-            curs.execute("SELECT trails.id, networks.id,"
-            "mutate.id, selection.id, variations.id "
-            "FROM trails, networks, mutate, selection, variations;")
-            results = curs.fetchall()
+            curs.execute(" UNION ALL ".join(
+                "SELECT '{0}', id FROM {1}".format(key, table)
+                for key, table in sorted(ID_TABLES.items())) + ";")
 
-        return {
-            "trail" : list(set([int(i[0]) for i in results])),
-            "network" : list(set([int(i[1]) for i in results])),
-            "mutate" : list(set([int(i[2]) for i in results])),
-            "selection" : list(set([int(i[3]) for i in results])),
-            "variations" : list(set([int(i[4]) for i in results])),
-        }
+            for key, curr_id in curs.fetchall():
+                ids[key].append(int(curr_id))
 
-    def getRunConfigID(self, run_info):
-        """ Gets the id in the run_config table based off a run_info dict.
+        return dict((key, sorted(curr_ids))
+            for key, curr_ids in ids.items())
 
-        This is performed by checking if the configuration of the run exists
-        in the database. If it does not, it is added and a run
-        configuration id is created and returned.
+    @contextmanager
+    def __transaction(self):
+        """ Runs a transaction on a pooled connection, committing it if the
+        block succeeds and rolling it back otherwise.
+        """
+        con = self.__pool.getconn()
+        try:
+            curs = con.cursor()
+            try:
+                yield curs
+            finally:
+                curs.close()
+
+            con.commit()
+        except:
+            con.rollback()
+            raise
+        finally:
+            self.__pool.putconn(con)
 
-        If debug is set, operation will not commit.
+    def __runConfigID(self, curs, run_info):
+        """ Gets the id in the run_config table of a run_info dict within
+        the transaction of curs, adding the configuration if it does not
+        exist yet.
+
+        Runs recording the same new configuration at the same time wait for
+        each other on an advisory lock held until the transaction ends, so
+        they share one row. The caller should commit soon after.
         """
-        conn = psycopg2.connect(self.__dsn)
-        curs = conn.cursor()
+        curs.execute("SELECT pg_advisory_xact_lock(hashtext(%s));",
+            ("run_config", ))
 
         curs.execute("""SELECT id
             FROM run_config
@@ -169,27 +432,59 @@ class DBUtils(object):
             print "DEBUG: Row was found!"
 
         # Get the run_id from either first search or second insert.
-        run_id = curs.fetchone()[0]
+        return curs.fetchone()[0]
 
-        if not self.__debug:
-            conn.commit()
-        else:
-            conn.rollback()
-            print "DEBUG: id of the row was {0}.".format(run_id)
+    def getRunConfigID(self, run_info):
+        """ Gets the id in the run_config table based off a run_info dict.
 
-        curs.close()
-        conn.close()
+        This is performed by checking if the configuration of the run exists
+        in the database. If it does not, it is added and a run
+        configuration id is created and returned.
 
-        return run_id
+        If debug is set, operation will not commit.
+        """
+        con = self.__pool.getconn()
+        try:
+            curs = con.cursor()
+            config_id = self.__runConfigID(curs, run_info)
+            curs.close()
+
+            if not self.__debug:
+                con.commit()
+            else:
+                con.rollback()
+                print "DEBUG: id of the row was {0}.".format(config_id)
+        except:
+            con.rollback()
+            raise
+        finally:
+            self.__pool.putconn(con)
+
+        return config_id
 
-    def recordRun(self, run_info, gen_info):
-        conn = psycopg2.connect(self.__dsn)
-        curs = conn.cursor()
+    def __beginRun(self, curs, run_info, record_times):
+        """ Adds the row of a run within the transaction of curs. The
+        configuration of the run is added first, if it is new, in a short
+        transaction of its own on another pooled connection, so the lock
+        guarding it is not held while the run is written.
+
+        Args:
+            curs (cursor): Cursor of the transaction.
+            run_info (dict): Configuration and details of the run.
+            record_times (dict): Receives the seconds spent on the
+                configuration and the run as "config" and "run".
 
+        Returns:
+            int. Id of the run.
+        """
         # See if this configuration exists in the run_configurations.
         # Add it to the table if not, if so, just use the config_id.
-        config_id = self.getRunConfigID(run_info)
+        phase_start = time.time()
+        with self.__transaction() as config_curs:
+            config_id = self.__runConfigID(config_curs, run_info)
+        record_times["config"] = time.time() - phase_start
 
+        phase_start = time.time()
         curs.execute("""
             INSERT INTO run (id,
                 host_configs_id,
@@ -208,7 +503,50 @@ class DBUtils(object):
             config_id))
 
         run_id = curs.fetchone()[0]
+        record_times["run"] = time.time() - phase_start
+
+        return run_id
+
+    def recordRun(self, run_info, gen_info, bulk=True):
+        """ Records a run and its generations in one transaction on a pooled
+        connection. The configuration of the run is added first, if it is
+        new, in a short transaction of its own, so it stays recorded even
+        if recording the run fails.
+
+        Args:
+            run_info (dict): Configuration and details of the run.
+            gen_info (list): Record of each generation.
+            bulk (bool): Streams the generations with COPY instead of
+                inserting them one at a time.
+
+        Returns:
+            int. Id of the run.
+        """
+        record_times = {}
+
+        with self.__transaction() as curs:
+            run_id = self.__beginRun(curs, run_info, record_times)
+
+            phase_start = time.time()
+            if bulk:
+                curs.copy_from(generations_copy_buffer(run_id, gen_info),
+                    "generations", columns=GENERATION_COLUMNS)
+            else:
+                self.__insertGenerations(curs, run_id, gen_info)
+            record_times["generations"] = time.time() - phase_start
+
+            # The transaction is committed when the block ends.
+            phase_start = time.time()
+
+        record_times["commit"] = time.time() - phase_start
+
+        self.__record_times = record_times
 
+        return run_id
+
+    def __insertGenerations(self, curs, run_id, gen_info):
+        """ Inserts the generations of a run one row at a time.
+        """
         for curr_gen in gen_info:
             curr_gen["run_id"] = run_id
 
@@ -237,12 +575,76 @@ class DBUtils(object):
             %(moves_none)s,
             %(elite)s); """, gen_info)
 
-        conn.commit()
+    def syncRun(self, run_info, gen_info):
+        """ Records a run like recordRun unless it was recorded before. A run
+        is known by its host name and the date it started, so uploading a
+        spooled run again after an interruption does not duplicate it.
 
-        curs.close()
-        conn.close()
+        Args:
+            run_info (dict): Configuration and details of the run.
+            gen_info (list): Record of each generation.
 
-        return run_id
+        Returns:
+            tuple. Id of the run and True if it was added by this call.
+        """
+        record_times = {}
+
+        with self.__transaction() as curs:
+            # Uploads of the same run wait for each other.
+            curs.execute("SELECT pg_advisory_xact_lock(hashtext(%s));", (
+                "{0} {1}".format(run_info["hostname"],
+                    run_info["run_date"].isoformat()), ))
+
+            curs.execute("""SELECT id FROM run
+                WHERE hostname = %s AND run_date = %s;""", (
+                run_info["hostname"], run_info["run_date"]))
+
+            existing = curs.fetchone()
+            if existing is not None:
+                return existing[0], False
+
+            run_id = self.__beginRun(curs, run_info, record_times)
+
+            phase_start = time.time()
+            curs.copy_from(generations_copy_buffer(run_id, gen_info),
+                "generations", columns=GENERATION_COLUMNS)
+            record_times["generations"] = time.time() - phase_start
+
+            phase_start = time.time()
+
+        record_times["commit"] = time.time() - phase_start
+
+        self.__record_times = record_times
+
+        return run_id, True
+
+    def startRun(self, run_info, batch_size=WRITER_BATCH_SIZE,
+        flush_secs=WRITER_FLUSH_SECS, max_pending=WRITER_MAX_PENDING):
+        """ Starts recording a run in the background while it evolves.
+
+        Args:
+            run_info (dict): Configuration and details of the run, without
+                its runtime.
+            batch_size (int): Generations written together.
+            flush_secs (float): Most seconds a generation waits to be
+                written.
+            max_pending (int): Most generations waiting to be written
+                before RunWriter.add blocks.
+
+        Returns:
+            RunWriter. Receives the generations of the run.
+        """
+        return RunWriter(self.__pool, self.__beginRun, run_info,
+            batch_size, flush_secs, max_pending)
+
+    def getRecordTimes(self):
+        """ Returns the seconds the last recordRun spent in each phase.
+
+        Returns:
+            dict. With keys "config", "run", "generations" and "commit", or
+            empty if no run was recorded.
+        """
+        return dict(self.__record_times)
 
 
     def getTrailData(self, trailID):
@@ -0,0 +1,148 @@
+"""
+This module caches the results of evaluating individuals so genomes seen
+before, such as unchanged offspring and surviving elites, are not
+simulated again.
+"""
+import collections
+import hashlib
+import numpy as np
+
+
+class FitnessCache(object):
+    """ Bounded cache of evaluation results keyed by the content of the
+    genome, dropping the least recently used result when full.
+
+    Keys are a hash of the genome's float64 bytes along with everything
+    else that decides the result: network id, trail id, moves limit and
+    the delay line integrator.
+    """
+
+    def __init__(self, max_size=100000):
+        if max_size < 1:
+            raise ValueError(
+                "Max size ({0}) must be at least 1.".format(max_size))
+
+        self.__max_size = max_size
+        self.__entries  = collections.OrderedDict()
+
+        self.hits   = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self.__entries)
+
+    @staticmethod
+    def key(individual, network_id, trail_id, moves, dl_integrator="odeint"):
+        """ Builds the key of an evaluation.
+
+        Returns:
+            tuple. Hashable key for get and put.
+        """
+        digest = hashlib.sha1(
+            np.asarray(individual, dtype=np.float64).tostring()).digest()
+
+        return (network_id, trail_id, moves, dl_integrator, digest)
+
+    def get(self, key):
+        """ Returns the result stored for a key, or None.
+        """
+        result = self.__entries.pop(key, None)
+
+        if result is None:
+            self.misses += 1
+            return None
+
+        self.__entries[key] = result
+        self.hits += 1
+
+        return result
+
+    def put(self, key, result):
+        """ Stores the result of an evaluation.
+        """
+        self.__entries[key] = result
+
+        if len(self.__entries) > self.__max_size:
+            self.__entries.popitem(last=False)
+
+    def lookup(self, individuals, key_args):
+        """ Looks up the results of individuals. Individuals with the same
+        genome as an earlier one are only missed once.
+
+        Args:
+            individuals (list): Individuals to look up.
+            key_args (tuple): Arguments of key after the individual.
+
+        Returns:
+            tuple. Keys of the individuals, results found keyed by key and
+            an OrderedDict of the missed individuals keyed by key, to pass
+            to store.
+        """
+        keys    = [FitnessCache.key(ind, *key_args) for ind in individuals]
+        results = {}
+        missed  = collections.OrderedDict()
+
+        for ind, key in zip(individuals, keys):
+            if key in results or key in missed:
+                # Same genome as an earlier individual of this call.
+                self.hits += 1
+                continue
+
+            result = self.get(key)
+            if result is None:
+                missed[key] = ind
+            else:
+                results[key] = result
+
+        return keys, results, missed
+
+    def store(self, lookup, missed_results):
+        """ Stores the results of the individuals missed by lookup.
+
+        Args:
+            lookup (tuple): Returned by lookup.
+            missed_results (list): Result of each missed individual.
+
+        Returns:
+            list. Result of each individual passed to lookup.
+        """
+        keys, results, missed = lookup
+
+        for key, result in zip(missed.keys(), missed_results):
+            self.put(key, result)
+            results[key] = result
+
+        return [results[key] for key in keys]
+
+    def evaluate(self, individuals, evaluate_all, key_args):
+        """ Evaluates individuals, only passing on those not in the cache.
+        Individuals with the same genome are evaluated once.
+
+        Args:
+            individuals (list): Individuals to evaluate.
+            evaluate_all (function): Evaluates a list of individuals and
+                returns a list of results.
+            key_args (tuple): Arguments of key after the individual.
+
+        Returns:
+            list. Result of each individual.
+        """
+        lookup = self.lookup(individuals, key_args)
+        missed = lookup[2]
+
+        if missed:
+            return self.store(lookup, evaluate_all(missed.values()))
+        else:
+            return self.store(lookup, [])
+
+    def getStats(self):
+        """ Returns the counters of the cache.
+
+        Returns:
+            dict. With keys "hits", "misses" and "size".
+        """
+        return {
+            "hits"   : self.hits,
+            "misses" : self.misses,
+            "size"   : len(self.__entries)
+        }
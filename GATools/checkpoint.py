@@ -0,0 +1,73 @@
+"""
+This module saves the state of a GA run to disk so a run that dies can be
+continued where it left off. Checkpoints are pickled with the highest
+protocol, which stores numpy arrays as raw bytes, and are replaced
+atomically so a crash while writing leaves the previous checkpoint intact.
+"""
+import os
+import tempfile
+
+try:
+    import cPickle as pickle
+except:
+    import pickle
+
+# Version of the checkpoint layout. Checkpoints of another version are
+# not read.
+CHECKPOINT_VERSION = 2
+
+
+def checkpoint_path(checkpoint_dir, network_id, trail_id, repeat):
+    """ Returns the path of the checkpoint of a repeat.
+    """
+    return os.path.join(checkpoint_dir,
+        "network{0}_trail{1}_repeat{2}.ckpt".format(
+            network_id, trail_id, repeat))
+
+
+def write_checkpoint(path, state):
+    """ Writes a checkpoint atomically, replacing any earlier one.
+
+    Args:
+        path (str): Path of the checkpoint.
+        state (dict): State of the run.
+    """
+    state = dict(state, version=CHECKPOINT_VERSION)
+
+    fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path) or ".",
+        prefix=os.path.basename(path), suffix=".tmp")
+
+    try:
+        with os.fdopen(fd, "wb") as temp_file:
+            pickle.dump(state, temp_file, pickle.HIGHEST_PROTOCOL)
+            temp_file.flush()
+            os.fsync(temp_file.fileno())
+
+        os.rename(temp_path, path)
+    except:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+
+def read_checkpoint(path):
+    """ Reads a checkpoint.
+
+    Returns:
+        dict. State of the run, or None if there is no checkpoint.
+
+    Raises:
+        ValueError: If the checkpoint was written with another layout.
+    """
+    if not os.path.exists(path):
+        return None
+
+    with open(path, "rb") as in_file:
+        state = pickle.load(in_file)
+
+    if state.get("version") != CHECKPOINT_VERSION:
+        raise ValueError(
+            "Checkpoint {0} has version {1} instead of {2}.".format(
+                path, state.get("version"), CHECKPOINT_VERSION))
+
+    return state
@@ -0,0 +1,351 @@
+"""
+This module holds the network and trail templates used to evaluate
+individuals and the backends that run evaluations. Templates are shipped to
+each worker once and unpickled once per process, so an evaluation only has
+to apply the individual's parameters and reset the trail.
+"""
+import collections
+import hashlib
+import math
+import multiprocessing
+import scoop
+import scoop.futures
+import scoop.shared
+import time
+
+try:
+    import cPickle as pickle
+except:
+    import pickle
+
+# Backends that may run evaluations.
+BACKENDS = ("scoop", "pool", "serial")
+
+# Chunks given to each worker when sizing chunks automatically, so one slow
+# chunk does not leave the other workers idle at the end of a batch.
+CHUNKS_PER_WORKER = 4
+
+# Longest time in seconds an automatically sized chunk should take.
+MAX_CHUNK_SECONDS = 2.0
+
+# Seconds a worker waits for a template shared by the SCOOP root.
+SHARE_TIMEOUT = 60
+
+# Pickled templates known to this process, keyed by template key.
+_TEMPLATE_PICKLES = {}
+
+# Unpickled (network, trail) templates of this process.
+_TEMPLATES = {}
+
+
+def template_key(network_id, trail_id, network_pickle, trail_pickle):
+    """ Builds the key of a template from the network and trail ids and a
+    hash of their pickled content.
+    """
+    digest = hashlib.sha1(network_pickle + trail_pickle).hexdigest()
+
+    return "template_{0}_{1}_{2}".format(network_id, trail_id, digest[:16])
+
+
+def share_template(network_id, trail_id, agent_network, agent_trail):
+    """ Makes a network and trail available to every worker.
+
+    Args:
+        network_id (int): Database id of the network.
+        trail_id (int): Database id of the trail.
+        agent_network (network): Network read in without parameters set.
+        agent_trail (trail): Trail read in and not yet moved on.
+
+    Returns:
+        str. Key to pass to load_template.
+    """
+    network_pickle = pickle.dumps(agent_network, pickle.HIGHEST_PROTOCOL)
+    trail_pickle   = pickle.dumps(agent_trail, pickle.HIGHEST_PROTOCOL)
+
+    key = template_key(network_id, trail_id, network_pickle, trail_pickle)
+
+    if key not in _TEMPLATE_PICKLES:
+        _TEMPLATE_PICKLES[key] = (network_pickle, trail_pickle)
+
+        if (scoop.IS_RUNNING and
+            scoop.shared.getConst(key, timeout=0) is None):
+            scoop.shared.setConst(**{key : _TEMPLATE_PICKLES[key]})
+
+    return key
+
+
+def load_template(key):
+    """ Returns the network and trail of a template.
+
+    The objects are unpickled the first time a process asks for them and
+    reused after that. Callers must set the network parameters and reset
+    the trail before using them.
+
+    Returns:
+        tuple. network, trail.
+    """
+    if key not in _TEMPLATES:
+        template_pickles = _TEMPLATE_PICKLES.get(key)
+
+        if template_pickles is None and scoop.IS_RUNNING:
+            template_pickles = scoop.shared.getConst(key,
+                timeout=SHARE_TIMEOUT)
+
+        if template_pickles is None:
+            raise KeyError("Template {0} has not been shared.".format(key))
+
+        _TEMPLATES[key] = (
+            pickle.loads(template_pickles[0]),
+            pickle.loads(template_pickles[1]))
+
+    return _TEMPLATES[key]
+
+
+def _preload_templates(template_pickles):
+    """ Initializes a pool worker with pickled templates, unpickling each
+    of them once.
+    """
+    _TEMPLATE_PICKLES.update(template_pickles)
+
+    for key in template_pickles:
+        load_template(key)
+
+
+def _apply_args(func_args):
+    """ Calls a function with a tuple of arguments on a pool worker.
+    """
+    return func_args[0](*func_args[1])
+
+
+def _apply_chunk(task):
+    """ Calls a function with a chunk of items on a worker.
+    """
+    return task[0](task[1])
+
+
+class _FinishedTask(object):
+    """ Result of a task run as soon as it was submitted, answering like
+    multiprocessing's AsyncResult.
+    """
+
+    def __init__(self, result):
+        self.__result = result
+
+    def ready(self):
+        return True
+
+    def get(self):
+        return self.__result
+
+
+class EvaluationBackend(object):
+    """ Runs evaluations with SCOOP, a pool of local processes or serially
+    in this process. Every backend returns the results in order, so runs
+    with the same seed are identical whichever backend is used.
+    """
+
+    def __init__(self, name="scoop", processes=None):
+        """ Creates a backend.
+
+        Args:
+            name (str): One of BACKENDS.
+            processes (int): Size of the process pool. Defaults to the
+                number of CPUs. Only used by the pool backend.
+        """
+        if name not in BACKENDS:
+            raise ValueError(
+                "Backend ({0}) must be one of {1}.".format(name, BACKENDS))
+
+        if processes is not None and processes < 1:
+            raise ValueError(
+                "Processes ({0}) must be at least 1.".format(processes))
+
+        self.__name      = name
+        self.__processes = processes or multiprocessing.cpu_count()
+        self.__pool      = None
+        self.__templates = None
+        self.__item_time = None
+        self.__submitted = collections.deque()
+
+    def getName(self):
+        """ Returns the name of the backend.
+        """
+        return self.__name
+
+    def getWorkers(self):
+        """ Returns the number of workers evaluations are spread over.
+        """
+        if self.__name == "scoop":
+            return getattr(scoop, "SIZE", 1) if scoop.IS_RUNNING else 1
+        elif self.__name == "pool":
+            return self.__processes
+        else:
+            return 1
+
+    def chunkSize(self, count):
+        """ Sizes chunks for a batch of count items. Each worker gets at
+        least CHUNKS_PER_WORKER chunks, and once an item has been timed
+        chunks are kept under MAX_CHUNK_SECONDS.
+
+        Returns:
+            int. Number of items in each chunk.
+        """
+        workers = self.getWorkers()
+
+        if workers == 1:
+            return max(1, count)
+
+        chunk_size = int(math.ceil(
+            float(count) / (workers * CHUNKS_PER_WORKER)))
+
+        if self.__item_time:
+            chunk_size = min(chunk_size,
+                int(MAX_CHUNK_SECONDS / self.__item_time))
+
+        return max(1, chunk_size)
+
+    def mapChunks(self, func, items, chunk_size=0):
+        """ Applies func to slices of items, so each task sent to a worker
+        handles a whole chunk.
+
+        Args:
+            func (function): Takes a list of items and returns a list with
+                a result for each.
+            items (list): Items to split into chunks.
+            chunk_size (int): Items in each chunk. Sized from the number
+                of workers and the measured time of an item when 0.
+
+        Returns:
+            list. Result for each item, in order.
+        """
+        return self.mapChunksMany([(func, items)], chunk_size)[0]
+
+    def mapChunksMany(self, batches, chunk_size=0):
+        """ Applies the function of each batch to slices of its items like
+        mapChunks. The chunks of all batches are sent to the workers
+        together.
+
+        Args:
+            batches (list): Function and list of items of each batch.
+            chunk_size (int): Items in each chunk. Sized from the number
+                of workers and the measured time of an item when 0.
+
+        Returns:
+            list. List of results for each batch, in order.
+        """
+        count = sum(len(items) for func, items in batches)
+
+        if count == 0:
+            return [[] for batch in batches]
+
+        if chunk_size < 1:
+            chunk_size = self.chunkSize(count)
+
+        start_time = time.time()
+
+        tasks = [(batch_idx, (func, items[idx:idx + chunk_size]))
+            for batch_idx, (func, items) in enumerate(batches)
+            for idx in xrange(0, len(items), chunk_size)]
+
+        results = [[] for batch in batches]
+        for (batch_idx, task), chunk_results in zip(tasks,
+            self.map(_apply_chunk, [task for batch_idx, task in tasks])):
+            results[batch_idx].extend(chunk_results)
+
+        # Time spent on an item by one worker, assuming all were busy.
+        self.__item_time = ((time.time() - start_time) *
+            min(self.getWorkers(), count) / count)
+
+        return results
+
+    def start(self, templates):
+        """ Prepares the workers to evaluate against templates. The pool
+        backend starts its processes here with the templates preloaded.
+
+        Args:
+            templates (list): Keys returned by share_template.
+        """
+        if self.__name != "pool" or self.__templates == set(templates):
+            return
+
+        self.close()
+
+        self.__templates = set(templates)
+        self.__pool      = multiprocessing.Pool(self.__processes,
+            initializer=_preload_templates,
+            initargs=(dict((key, _TEMPLATE_PICKLES[key])
+                for key in self.__templates),))
+
+    def map(self, func, *iterables):
+        """ Applies func to every item of the iterables like the builtin
+        map.
+
+        Returns:
+            list. Result for each item, in order.
+        """
+        if self.__name == "scoop":
+            return list(scoop.futures.map(func, *iterables))
+        elif self.__name == "serial" or self.__pool is None:
+            return map(func, *iterables)
+        elif len(iterables) == 1:
+            return self.__pool.map(func, iterables[0])
+        else:
+            return self.__pool.map(_apply_args,
+                [(func, items) for items in zip(*iterables)])
+
+    def submit(self, func, item):
+        """ Starts func(item) without waiting for it to finish. The serial
+        backend runs it right away.
+        """
+        if self.__name == "scoop":
+            task = scoop.futures.submit(func, item)
+        elif self.__name == "serial" or self.__pool is None:
+            task = _FinishedTask(func(item))
+        else:
+            task = self.__pool.apply_async(func, (item,))
+
+        self.__submitted.append((item, task))
+
+    def getSubmitted(self):
+        """ Returns the number of submitted items that have not been
+        returned by nextCompleted yet.
+        """
+        return len(self.__submitted)
+
+    def nextCompleted(self):
+        """ Waits for a submitted item to finish, returning the item that
+        has waited longest when several have.
+
+        Returns:
+            tuple. The item and the result of func(item).
+        """
+        if not self.__submitted:
+            raise ValueError("No items have been submitted.")
+
+        if self.__name == "scoop":
+            finished = next(scoop.futures.as_completed(
+                [task for item, task in self.__submitted]))
+
+            for idx, (item, task) in enumerate(self.__submitted):
+                if task is finished:
+                    del self.__submitted[idx]
+                    return item, task.result()
+
+        while True:
+            for idx, (item, task) in enumerate(self.__submitted):
+                if task.ready():
+                    del self.__submitted[idx]
+                    return item, task.get()
+
+            self.__submitted[0][1].wait(0.01)
+
+    def close(self):
+        """ Stops the processes of the pool backend.
+        """
+        if self.__pool is not None:
+            self.__pool.close()
+            self.__pool.join()
+
+        self.__pool      = None
+        self.__templates = None
+        self.__submitted.clear()
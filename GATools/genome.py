@@ -0,0 +1,147 @@
+"""
+This module varies a whole population of genomes at once. The genomes are
+the rows of one contiguous float64 matrix, and crossover and mutation are
+applied to every row together with masks instead of one gene at a time.
+Rows are handed to DEAP as views of the matrix.
+"""
+import numpy as np
+
+
+def matrix_views(matrix, individual_class, fitness_class):
+    """ Returns each row of a matrix as an individual that shares the
+    row's memory.
+
+    Args:
+        matrix (numpy.ndarray): (population, genome length) matrix.
+        individual_class (type): numpy.ndarray based individual class made
+            with deap.creator.
+        fitness_class (type): Fitness class of the individuals.
+
+    Returns:
+        list. An individual with an invalid fitness for each row.
+    """
+    views = []
+
+    for row in matrix:
+        ind = row.view(individual_class)
+        ind.fitness = fitness_class()
+        views.append(ind)
+
+    return views
+
+
+def cx_two_point(matrix, prob):
+    """ Applies two point crossover to the pairs of neighbouring rows of a
+    matrix in place, like deap.tools.cxTwoPoint on each pair.
+
+    Args:
+        matrix (numpy.ndarray): (population, genome length) matrix.
+        prob (float): Probability of each pair being crossed.
+
+    Returns:
+        numpy.ndarray. Mask of the rows that were crossed.
+    """
+    pairs, size = len(matrix) // 2, matrix.shape[1]
+    changed     = np.zeros(len(matrix), dtype=bool)
+
+    if pairs == 0 or size < 2:
+        return changed
+
+    crossed = np.random.uniform(size=pairs) < prob
+
+    # Pick the points like cxTwoPoint, which never picks the same point.
+    point_a = np.random.randint(1, size + 1, pairs)
+    point_b = np.random.randint(1, size, pairs)
+    point_b[point_b >= point_a] += 1
+
+    cols = np.arange(size)
+    mask = ((cols >= np.minimum(point_a, point_b)[:, None]) &
+        (cols < np.maximum(point_a, point_b)[:, None]) & crossed[:, None])
+
+    first  = matrix[0:2 * pairs:2]
+    second = matrix[1:2 * pairs:2]
+
+    swapped      = first[mask]
+    first[mask]  = second[mask]
+    second[mask] = swapped
+
+    changed[0:2 * pairs:2] = crossed
+    changed[1:2 * pairs:2] = crossed
+
+    return changed
+
+
+def _mutated(matrix, prob, indpb):
+    """ Picks the rows to mutate and the genes to change in them.
+
+    Returns:
+        tuple. Mask of the rows and mask of the genes.
+    """
+    rows  = np.random.uniform(size=len(matrix)) < prob
+    genes = (np.random.uniform(size=matrix.shape) < indpb) & rows[:, None]
+
+    return rows, genes
+
+
+def mut_gaussian(matrix, prob, indpb, mu=0.0):
+    """ Adds Gaussian noise to the genes of rows in place, like
+    deap.tools.mutGaussian with sigma set to the standard deviation of the
+    row.
+
+    Args:
+        matrix (numpy.ndarray): (population, genome length) matrix.
+        prob (float): Probability of each row being mutated.
+        indpb (float): Probability of each gene of a mutated row changing.
+        mu (float): Mean of the noise.
+
+    Returns:
+        numpy.ndarray. Mask of the rows that were mutated.
+    """
+    sigma       = np.std(matrix, axis=1)
+    rows, genes = _mutated(matrix, prob, indpb)
+
+    noise = np.random.normal(mu, 1.0, matrix.shape) * sigma[:, None]
+    matrix += np.where(genes, noise, 0.0)
+
+    return rows
+
+
+def mut_uniform(matrix, prob, low, up, indpb):
+    """ Replaces genes of rows in place with values drawn uniformly between
+    low and up.
+
+    Args:
+        matrix (numpy.ndarray): (population, genome length) matrix.
+        prob (float): Probability of each row being mutated.
+        low (float): Lower bound of the new values.
+        up (float): Upper bound of the new values.
+        indpb (float): Probability of each gene of a mutated row changing.
+
+    Returns:
+        numpy.ndarray. Mask of the rows that were mutated.
+    """
+    rows, genes = _mutated(matrix, prob, indpb)
+
+    matrix[...] = np.where(genes,
+        np.random.uniform(low, up, matrix.shape), matrix)
+
+    return rows
+
+
+def mut_flip_bit(matrix, prob, indpb):
+    """ Flips genes of rows in place like deap.tools.mutFlipBit, which turns
+    zero into one and anything else into zero.
+
+    Args:
+        matrix (numpy.ndarray): (population, genome length) matrix.
+        prob (float): Probability of each row being mutated.
+        indpb (float): Probability of each gene of a mutated row changing.
+
+    Returns:
+        numpy.ndarray. Mask of the rows that were mutated.
+    """
+    rows, genes = _mutated(matrix, prob, indpb)
+
+    matrix[...] = np.where(genes, (matrix == 0).astype(float), matrix)
+
+    return rows
@@ -0,0 +1,27 @@
+"""
+This module replaces individuals of a steady-state population one child at
+a time. Every individual in the population stays a distinct object, so a
+child never fills more than one place.
+"""
+
+
+def replace_worst(population, child):
+    """ Puts a child in the place of the worst individual of a population
+    if the child is fitter.
+
+    Args:
+        population (list): Evaluated individuals, changed in place.
+        child (Individual): Evaluated child.
+
+    Returns:
+        int. Index the child took, or None if it was not fitter.
+    """
+    worst = min(range(len(population)),
+        key=lambda idx: population[idx].fitness)
+
+    if not population[worst].fitness < child.fitness:
+        return None
+
+    population[worst] = child
+
+    return worst
@@ -0,0 +1,444 @@
+"""
+This module records runs in a local SQLite file so a GA never waits on
+PostgreSQL. The file has the run, run_config and generations tables of
+sql/create.sql. Runtimes are stored in microseconds and elites as the bytes
+of a float64 array so runs are uploaded exactly as they were recorded.
+sync.py uploads the finished runs later with DBUtils.syncRun.
+
+The file also keeps copies of the trails and networks runs were started
+with, so once they are copied in, runs can be spooled with no database.
+"""
+import datetime
+import json
+import numpy as np
+import pickle
+import sqlite3
+import time
+
+# Generations inserted together by a SpoolWriter.
+SPOOL_BATCH_SIZE = 100
+
+# Seconds to wait for another process writing the same file.
+SPOOL_TIMEOUT = 60.0
+
+# Format of run_date, which keeps the microseconds.
+DATE_FORMAT = "%Y-%m-%d %H:%M:%S.%f"
+
+# Columns of run_config that identify a configuration.
+RUN_CONFIG_COLUMNS = ("networks_id", "trails_id", "mutate_id",
+    "selection_id", "variations_id", "generations", "population",
+    "moves_limit", "sel_tourn_size", "p_mutate", "p_crossover",
+    "weight_min", "weight_max", "lambda", "algorithm_ver",
+    "mean_check_length")
+
+# Columns of generations taken from a generation record, after run_id.
+GENERATION_VALUES = ("gen", "runtime", "food_max", "food_min", "food_avg",
+    "food_std", "moves_max", "moves_min", "moves_avg", "moves_std",
+    "moves_left", "moves_right", "moves_forward", "moves_none", "elite")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS run_config (
+    id integer PRIMARY KEY,
+    networks_id int NOT NULL,
+    trails_id int NOT NULL,
+    mutate_id int NOT NULL,
+    selection_id int NOT NULL,
+    variations_id int NOT NULL,
+    generations int NOT NULL,
+    population int NOT NULL,
+    moves_limit int NOT NULL,
+    sel_tourn_size int,
+    p_mutate real NOT NULL,
+    p_crossover real NOT NULL,
+    weight_min real NOT NULL,
+    weight_max real NOT NULL,
+    lambda int,
+    algorithm_ver int NOT NULL,
+    mean_check_length int
+);
+
+-- finished is set once all generations are written and synced_run_id
+-- once the run is uploaded.
+CREATE TABLE IF NOT EXISTS run (
+    id integer PRIMARY KEY,
+    run_config_id int NOT NULL REFERENCES run_config (id),
+    host_configs_id int NOT NULL,
+    run_date text NOT NULL,
+    runtime int NOT NULL,
+    hostname text NOT NULL,
+    debug boolean NOT NULL,
+    finished boolean NOT NULL DEFAULT 0,
+    synced_run_id int
+);
+
+CREATE TABLE IF NOT EXISTS generations (
+    id integer PRIMARY KEY,
+    run_id int NOT NULL REFERENCES run (id),
+    generation int NOT NULL,
+    runtime int NOT NULL,
+    food_max real NOT NULL,
+    food_min real NOT NULL,
+    food_avg real NOT NULL,
+    food_std real NOT NULL,
+    moves_max real NOT NULL,
+    moves_min real NOT NULL,
+    moves_avg real NOT NULL,
+    moves_std real NOT NULL,
+    moves_left int NOT NULL,
+    moves_right int NOT NULL,
+    moves_forward int NOT NULL,
+    moves_none int NOT NULL,
+    elite blob NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS idx_run_id ON generations (run_id);
+
+-- trail_data is the grid as JSON and net the pickled PyBrain network.
+CREATE TABLE IF NOT EXISTS trails (
+    id integer PRIMARY KEY,
+    name text NOT NULL,
+    init_rot int NOT NULL,
+    trail_data text NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS networks (
+    id integer PRIMARY KEY,
+    net blob NOT NULL
+);
+"""
+
+
+def _microseconds(value):
+    """ Returns a datetime.timedelta in whole microseconds.
+    """
+    return (value.days * 86400 + value.seconds) * 10**6 + value.microseconds
+
+
+def _timedelta(value):
+    """ Returns the datetime.timedelta of a number of microseconds.
+    """
+    return datetime.timedelta(microseconds=value)
+
+
+def _generation_row(run_id, record):
+    """ Returns the values of a generation record for the generations
+    table.
+    """
+    row = [run_id]
+
+    for name in GENERATION_VALUES:
+        if name == "runtime":
+            row.append(_microseconds(record[name]))
+        elif name == "elite":
+            row.append(buffer(np.asarray(record[name],
+                dtype=np.float64).tostring()))
+        elif name in ["moves_left", "moves_right", "moves_forward",
+            "moves_none", "gen"]:
+            row.append(int(record[name]))
+        else:
+            row.append(float(record[name]))
+
+    return row
+
+
+class SpoolWriter(object):
+    """ Records a run in a spool as it evolves, inserting its generations
+    in batches. The run is only uploaded by sync.py once finish is called.
+    Made by SpoolDB.startRun.
+    """
+
+    def __init__(self, conn, run_id, record_times, batch_size):
+        self.__conn         = conn
+        self.__run_id       = run_id
+        self.__record_times = record_times
+        self.__batch_size   = batch_size
+        self.__batch        = []
+
+        self.__record_times["generations"] = 0.0
+
+    def __flush(self):
+        """ Inserts the waiting generations.
+        """
+        phase_start = time.time()
+
+        with self.__conn:
+            self.__conn.executemany("""INSERT INTO generations (run_id,
+                generation, runtime, food_max, food_min, food_avg, food_std,
+                moves_max, moves_min, moves_avg, moves_std, moves_left,
+                moves_right, moves_forward, moves_none, elite)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?);""",
+                [_generation_row(self.__run_id, record)
+                    for record in self.__batch])
+
+        self.__batch = []
+        self.__record_times["generations"] += time.time() - phase_start
+
+    def add(self, record):
+        """ Adds the record of a generation.
+        """
+        self.__batch.append(record)
+
+        if len(self.__batch) >= self.__batch_size:
+            self.__flush()
+
+    def finish(self, runtime):
+        """ Writes the remaining generations and the runtime of the run.
+
+        Args:
+            runtime (datetime.timedelta): Time taken by the run.
+
+        Returns:
+            int. Id of the run in the spool.
+        """
+        if self.__batch:
+            self.__flush()
+
+        phase_start = time.time()
+
+        with self.__conn:
+            self.__conn.execute("""UPDATE run
+                SET runtime = ?, finished = 1
+                WHERE id = ?;""", (_microseconds(runtime), self.__run_id))
+
+        self.__record_times["commit"] = time.time() - phase_start
+
+        return self.__run_id
+
+    def getRecordTimes(self):
+        """ Returns the seconds spent in each phase of recording the run.
+
+        Returns:
+            dict. With keys "config", "run", "generations" and "commit".
+        """
+        return dict(self.__record_times)
+
+
+class SpoolDB(object):
+    """ Local store of runs with the recording methods of DBUtils.
+    """
+
+    def __init__(self, path, batch_size=SPOOL_BATCH_SIZE):
+        if batch_size < 1:
+            raise ValueError(
+                "Batch size ({0}) must be at least 1.".format(batch_size))
+
+        self.__batch_size = batch_size
+        self.__conn = sqlite3.connect(path, timeout=SPOOL_TIMEOUT)
+
+        # Another process may be writing the same file.
+        self.__conn.execute("PRAGMA journal_mode = WAL;")
+        self.__conn.execute("PRAGMA synchronous = NORMAL;")
+        self.__conn.executescript(SCHEMA)
+
+        self.__record_times = {}
+
+    def __runConfigID(self, run_info):
+        """ Gets the id in the run_config table of a run_info dict, adding
+        the configuration if it does not exist yet.
+        """
+        values = [run_info[name] for name in RUN_CONFIG_COLUMNS]
+
+        row = self.__conn.execute("SELECT id FROM run_config WHERE " +
+            " AND ".join("{0} IS ?".format(name)
+                for name in RUN_CONFIG_COLUMNS) + ";", values).fetchone()
+
+        if row is not None:
+            return row[0]
+
+        return self.__conn.execute(
+            "INSERT INTO run_config ({0}) VALUES ({1});".format(
+                ", ".join(RUN_CONFIG_COLUMNS),
+                ", ".join(["?"] * len(RUN_CONFIG_COLUMNS))),
+            values).lastrowid
+
+    def startRun(self, run_info):
+        """ Starts recording a run while it evolves.
+
+        Args:
+            run_info (dict): Configuration and details of the run, without
+                its runtime.
+
+        Returns:
+            SpoolWriter. Receives the generations of the run.
+        """
+        record_times = {}
+
+        with self.__conn:
+            phase_start = time.time()
+            config_id = self.__runConfigID(run_info)
+            record_times["config"] = time.time() - phase_start
+
+            phase_start = time.time()
+            run_id = self.__conn.execute("""INSERT INTO run (run_config_id,
+                host_configs_id, run_date, runtime, hostname, debug)
+                VALUES (?, ?, ?, 0, ?, ?);""", (
+                config_id,
+                run_info["host_type_id"],
+                run_info["run_date"].strftime(DATE_FORMAT),
+                run_info["hostname"],
+                bool(run_info["debug"]))).lastrowid
+            record_times["run"] = time.time() - phase_start
+
+        return SpoolWriter(self.__conn, run_id, record_times,
+            self.__batch_size)
+
+    def recordRun(self, run_info, gen_info):
+        """ Records a finished run and its generations.
+
+        Args:
+            run_info (dict): Configuration and details of the run.
+            gen_info (list): Record of each generation.
+
+        Returns:
+            int. Id of the run in the spool.
+        """
+        writer = self.startRun(run_info)
+
+        for record in gen_info:
+            writer.add(record)
+
+        run_id = writer.finish(run_info["runtime"])
+
+        self.__record_times = writer.getRecordTimes()
+
+        return run_id
+
+    def getRecordTimes(self):
+        """ Returns the seconds the last recordRun spent in each phase.
+
+        Returns:
+            dict. With keys "config", "run", "generations" and "commit", or
+            empty if no run was recorded.
+        """
+        return dict(self.__record_times)
+
+    def getUnsynced(self):
+        """ Returns the finished runs that were not uploaded yet.
+
+        Returns:
+            list. Id of each run in the spool.
+        """
+        return [row[0] for row in self.__conn.execute("""SELECT id FROM run
+            WHERE finished AND synced_run_id IS NULL
+            ORDER BY id;""")]
+
+    def getUnfinished(self):
+        """ Returns the runs that were started but never finished, such as
+        those of a process that died.
+
+        Returns:
+            list. Id of each run in the spool.
+        """
+        return [row[0] for row in self.__conn.execute("""SELECT id FROM run
+            WHERE NOT finished
+            ORDER BY id;""")]
+
+    def readRun(self, run_id):
+        """ Reads a spooled run in the form DBUtils.recordRun takes.
+
+        Args:
+            run_id (int): Id of the run in the spool.
+
+        Returns:
+            tuple. run_info dict and list of generation records.
+        """
+        row = self.__conn.execute("""SELECT {0}, host_configs_id, run_date,
+            runtime, hostname, debug
+            FROM run JOIN run_config ON run.run_config_id = run_config.id
+            WHERE run.id = ?;""".format(", ".join(RUN_CONFIG_COLUMNS)),
+            (run_id, )).fetchone()
+
+        run_info = dict(zip(RUN_CONFIG_COLUMNS, row))
+        run_info["host_type_id"] = row[-5]
+        run_info["run_date"]     = datetime.datetime.strptime(row[-4],
+            DATE_FORMAT)
+        run_info["runtime"]      = _timedelta(row[-3])
+        run_info["hostname"]     = row[-2]
+        run_info["debug"]        = bool(row[-1])
+
+        gen_info = []
+        for gen_row in self.__conn.execute("""SELECT {0} FROM generations
+            WHERE run_id = ?
+            ORDER BY generation;""".format(", ".join(
+                "generation" if name == "gen" else name
+                for name in GENERATION_VALUES)), (run_id, )):
+            record = dict(zip(GENERATION_VALUES, gen_row))
+            record["runtime"] = _timedelta(record["runtime"])
+            record["elite"]   = np.frombuffer(record["elite"],
+                dtype=np.float64).tolist()
+            gen_info.append(record)
+
+        return run_info, gen_info
+
+    def markSynced(self, run_id, synced_run_id):
+        """ Marks a spooled run as uploaded.
+
+        Args:
+            run_id (int): Id of the run in the spool.
+            synced_run_id (int): Id of the run in PostgreSQL.
+        """
+        with self.__conn:
+            self.__conn.execute("""UPDATE run SET synced_run_id = ?
+                WHERE id = ?;""", (synced_run_id, run_id))
+
+    def addTrail(self, trail_id, trail_data, name, init_rot):
+        """ Keeps a copy of a trail, replacing any kept before.
+
+        Args:
+            trail_id (int): Id of the trail in PostgreSQL.
+            trail_data (numpy.matrix): Grid of the trail.
+            name (str): Name of the trail.
+            init_rot (int): Initial rotation of the agent.
+        """
+        with self.__conn:
+            self.__conn.execute("""INSERT OR REPLACE INTO trails (id, name,
+                init_rot, trail_data) VALUES (?, ?, ?, ?);""", (trail_id,
+                name, int(init_rot),
+                json.dumps(np.asarray(trail_data).tolist())))
+
+    def getTrailData(self, trail_id):
+        """ Returns a trail like DBUtils.getTrailData.
+
+        Returns:
+            tuple. Grid, name and initial rotation of the trail, or None if
+            it was not copied into the spool.
+        """
+        row = self.__conn.execute("""SELECT trail_data, name, init_rot
+            FROM trails WHERE id = ?;""", (trail_id, )).fetchone()
+
+        if row is None:
+            return None
+
+        return np.matrix(json.loads(row[0])), row[1], row[2]
+
+    def addNetwork(self, network_id, net):
+        """ Keeps a copy of a network, replacing any kept before.
+
+        Args:
+            network_id (int): Id of the network in PostgreSQL.
+            net (Network): PyBrain network.
+        """
+        with self.__conn:
+            self.__conn.execute("""INSERT OR REPLACE INTO networks (id, net)
+                VALUES (?, ?);""", (network_id,
+                buffer(pickle.dumps(net, pickle.HIGHEST_PROTOCOL))))
+
+    def getNetworkByID(self, network_id):
+        """ Returns a network like DBUtils.getNetworkByID.
+
+        Returns:
+            Network. PyBrain network, or None if it was not copied into the
+            spool.
+        """
+        row = self.__conn.execute("SELECT net FROM networks WHERE id = ?;",
+            (network_id, )).fetchone()
+
+        if row is None:
+            return None
+
+        return pickle.loads(str(row[0]))
+
+    def close(self):
+        """ Closes the spool.
+        """
+        self.__conn.close()
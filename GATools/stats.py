@@ -0,0 +1,129 @@
+"""
+This module computes the statistics recorded for each generation. Food
+and moves are small non-negative integers, so one bincount of each gives
+the minimum, maximum, mean, standard deviation and mode together.
+"""
+import numpy as np
+
+# Names of the fitness values, in order.
+FITNESS_NAMES = ("food", "moves")
+
+
+def _column_stats(values):
+    """ Returns the statistics of one fitness value of a population.
+
+    Returns:
+        dict. With keys "min", "max", "avg", "std" and "mode".
+    """
+    int_values = values.astype(np.int64)
+
+    if (int_values != values).any() or (int_values < 0).any():
+        # Not counts, so there is nothing to bincount.
+        uniques, inverse = np.unique(values, return_inverse=True)
+        counts = np.bincount(inverse)
+
+        return {
+            "min"  : np.min(values),
+            "max"  : np.max(values),
+            "avg"  : np.mean(values),
+            "std"  : np.std(values),
+            "mode" : uniques[np.argmax(counts)]
+        }
+
+    counts  = np.bincount(int_values)
+    present = np.flatnonzero(counts)
+    levels  = np.arange(len(counts), dtype=np.float64)
+    mean    = levels.dot(counts) / len(values)
+
+    return {
+        "min"  : levels[present[0]],
+        "max"  : levels[present[-1]],
+        "avg"  : mean,
+        "std"  : np.sqrt(((levels - mean) ** 2).dot(counts) / len(values)),
+        # Ties go to the smallest value like scipy.stats.mode.
+        "mode" : levels[np.argmax(counts)]
+    }
+
+
+class GenerationStats(object):
+    """ Statistics of the fitness of a population, read into a fitness
+    array allocated once for the population size.
+    """
+
+    def __init__(self, size):
+        self.__fitness = np.zeros((size, len(FITNESS_NAMES)))
+
+    def compile(self, fitness_values):
+        """ Computes the statistics of a generation.
+
+        Args:
+            fitness_values (list): Fitness values of each individual.
+
+        Returns:
+            dict. Statistics of each fitness value, keyed by FITNESS_NAMES,
+            like deap.tools.MultiStatistics.compile.
+        """
+        count = len(fitness_values)
+
+        if count > len(self.__fitness):
+            self.__fitness = np.zeros((count, len(FITNESS_NAMES)))
+
+        fitness = self.__fitness[:count]
+        fitness[...] = fitness_values
+
+        return dict((name, _column_stats(fitness[:, idx]))
+            for idx, name in enumerate(FITNESS_NAMES))
+
+
+class RollingWindow(object):
+    """ Standard deviation of the last values pushed, kept up to date in
+    constant time per value.
+    """
+
+    def __init__(self, length):
+        if length < 1:
+            raise ValueError(
+                "Length ({0}) must be at least 1.".format(length))
+
+        self.__values = np.zeros(length)
+        self.__pushed = 0
+        self.__sum    = 0.0
+        self.__sum_sq = 0.0
+
+    def push(self, value):
+        """ Adds a value, dropping the oldest one if the window is full.
+        """
+        idx = self.__pushed % len(self.__values)
+
+        if self.isFull():
+            old = self.__values[idx]
+            self.__sum    -= old
+            self.__sum_sq -= old * old
+
+        self.__values[idx] = value
+        self.__pushed     += 1
+
+        if idx == len(self.__values) - 1:
+            # Start over from the values to drop accumulated rounding.
+            self.__sum    = self.__values.sum()
+            self.__sum_sq = self.__values.dot(self.__values)
+        else:
+            self.__sum    += value
+            self.__sum_sq += value * value
+
+    def isFull(self):
+        """ Returns True once the window has been filled.
+        """
+        return self.__pushed >= len(self.__values)
+
+    def std(self):
+        """ Returns the standard deviation of the values in the window.
+        """
+        count = min(self.__pushed, len(self.__values))
+
+        if count == 0:
+            return 0.0
+
+        mean = self.__sum / count
+
+        return np.sqrt(max(0.0, self.__sum_sq / count - mean * mean))
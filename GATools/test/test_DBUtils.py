@@ -1,7 +1,11 @@
+import datetime
+import numpy as np
 import os
 import unittest
 
 from ..DBUtils import DBUtils
+from ..DBUtils import GENERATION_COLUMNS
+from ..DBUtils import generations_copy_buffer
 
 class TestDatabaseUtils(unittest.TestCase):
 
@@ -24,5 +28,56 @@ class TestDatabaseUtils(unittest.TestCase):
         pass
 
 
+class TestGenerationsCopy(unittest.TestCase):
+
+    def setUp(self):
+        rand_state = np.random.RandomState(3)
+
+        self.gen_info = [{
+            "gen"           : gen,
+            "runtime"       : datetime.timedelta(days=gen, seconds=7,
+                microseconds=25),
+            "food_max"      : 17.0,
+            "food_min"      : 2.0,
+            "food_avg"      : rand_state.uniform(0, 90),
+            "food_std"      : float("nan"),
+            "moves_max"     : 200.0,
+            "moves_min"     : 31.0,
+            "moves_avg"     : rand_state.uniform(0, 200),
+            "moves_std"     : 1e-12,
+            "moves_left"    : 6,
+            "moves_right"   : np.int64(3),
+            "moves_forward" : 105,
+            "moves_none"    : 0,
+            "elite"         : rand_state.uniform(-5, 5, 7).tolist()
+        } for gen in range(3)]
+
+    def test_rows(self):
+        rows = generations_copy_buffer(12, self.gen_info).read().split("\n")
+
+        # Each row ends with a newline.
+        self.assertEqual(rows[-1], "")
+        self.assertEqual(len(rows), len(self.gen_info) + 1)
+
+        for row, curr_gen in zip(rows, self.gen_info):
+            fields = dict(zip(GENERATION_COLUMNS, row.split("\t")))
+
+            self.assertEqual(len(fields), len(GENERATION_COLUMNS))
+            self.assertEqual(fields["run_id"], "12")
+            self.assertEqual(fields["generation"], str(curr_gen["gen"]))
+            self.assertEqual(fields["runtime"],
+                "{0} days 7.000025 seconds".format(curr_gen["gen"]))
+            self.assertEqual(fields["food_max"], "17")
+            self.assertEqual(fields["moves_right"], "3")
+            self.assertEqual(fields["food_std"], "NaN")
+
+            # Floats are written without losing precision.
+            self.assertEqual(float(fields["food_avg"]), curr_gen["food_avg"])
+            self.assertEqual(float(fields["moves_std"]), 1e-12)
+            self.assertEqual(
+                [float(x) for x in fields["elite"].strip("{}").split(",")],
+                curr_gen["elite"])
+
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,94 @@
+# Helpers for testing.
+import numpy as np
+import unittest
+
+# Parts of design under test.
+from ..cache import FitnessCache
+
+TEST_KEY_ARGS = (1, 3, 200, "odeint")
+
+
+class TestFitnessCacheFunctions(unittest.TestCase):
+
+    def setUp(self):
+        self.rand_state = np.random.RandomState(3)
+        self.evaluated  = []
+
+    def evaluate_all(self, individuals):
+        # Stands in for simulating each individual on the trail.
+        self.evaluated.extend(individuals)
+        return [(sum(ind), len(ind)) for ind in individuals]
+
+    def test_key(self):
+        ind = list(self.rand_state.uniform(-5, 5, 10))
+
+        self.assertEqual(FitnessCache.key(ind, *TEST_KEY_ARGS),
+            FitnessCache.key(np.array(ind), *TEST_KEY_ARGS))
+
+        # Anything that changes the result must change the key.
+        keys = set([
+            FitnessCache.key(ind, 1, 3, 200, "odeint"),
+            FitnessCache.key(ind, 2, 3, 200, "odeint"),
+            FitnessCache.key(ind, 1, 4, 200, "odeint"),
+            FitnessCache.key(ind, 1, 3, 100, "odeint"),
+            FitnessCache.key(ind, 1, 3, 200, "linear"),
+            FitnessCache.key(ind[:-1] + [ind[-1] + 1e-12], *TEST_KEY_ARGS)])
+        self.assertEqual(len(keys), 6)
+
+    def test_evaluate(self):
+        cache = FitnessCache()
+        pop   = [list(self.rand_state.uniform(-5, 5, 10)) for idx in range(20)]
+
+        expected = self.evaluate_all(pop)
+        self.evaluated = []
+
+        self.assertEqual(
+            cache.evaluate(pop, self.evaluate_all, TEST_KEY_ARGS), expected)
+        self.assertEqual(len(self.evaluated), len(pop))
+        self.assertEqual(cache.getStats(),
+            {"hits" : 0, "misses" : len(pop), "size" : len(pop)})
+
+        # Seen genomes come from the cache.
+        self.evaluated = []
+        self.assertEqual(
+            cache.evaluate(pop[::-1], self.evaluate_all, TEST_KEY_ARGS),
+            expected[::-1])
+        self.assertEqual(self.evaluated, [])
+        self.assertEqual(cache.hits, len(pop))
+
+    def test_evaluate_clones(self):
+        # Clones within one batch are only evaluated once.
+        cache = FitnessCache()
+        ind   = list(self.rand_state.uniform(-5, 5, 10))
+        other = list(self.rand_state.uniform(-5, 5, 10))
+        pop   = [ind, list(ind), other, list(ind)]
+
+        results = cache.evaluate(pop, self.evaluate_all, TEST_KEY_ARGS)
+
+        self.assertEqual(results, self.evaluate_all(pop))
+        self.assertEqual(self.evaluated[:2], [ind, other])
+        self.assertEqual(cache.getStats(),
+            {"hits" : 2, "misses" : 2, "size" : 2})
+
+    def test_eviction(self):
+        cache = FitnessCache(max_size=2)
+        keys  = [FitnessCache.key([value], *TEST_KEY_ARGS)
+            for value in range(3)]
+
+        cache.put(keys[0], (1, 1))
+        cache.put(keys[1], (2, 1))
+
+        # Using the first key makes the second the least recently used.
+        self.assertEqual(cache.get(keys[0]), (1, 1))
+        cache.put(keys[2], (3, 1))
+
+        self.assertEqual(len(cache), 2)
+        self.assertEqual(cache.get(keys[1]), None)
+        self.assertEqual(cache.get(keys[2]), (3, 1))
+
+    def test_invalid_size(self):
+        self.assertRaises(ValueError, FitnessCache, 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,158 @@
+# Helpers for testing.
+import numpy as np
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import unittest
+
+try:
+    import cPickle as pickle
+except:
+    import pickle
+
+# Parts of design under test.
+from ..checkpoint import checkpoint_path
+from ..checkpoint import read_checkpoint
+from ..checkpoint import write_checkpoint
+from ..spool import SpoolDB
+from ..trail.network import network
+
+ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "..",
+    ".."))
+
+# NSGA2 selection after varOr, which keeps the same parent object in
+# several places of the population.
+RESUME_ARGS = ["--script-mode", "--backend", "serial", "--seed", "3",
+    "-g", "8", "--variation", "2", "-s", "3", "--no-early-quit",
+    "5", "10", "20", "60", "1"]
+RESUME_STOP_GEN = 5
+
+# Runs ga_runner and dies right after the checkpoint of a generation is
+# written, like a run that was killed.
+STOP_SCRIPT = """
+import os
+import sys
+sys.path.insert(0, {0!r})
+import ga_runner
+
+write_checkpoint = ga_runner.write_checkpoint
+def stop(path, state):
+    write_checkpoint(path, state)
+    if state["status"] == "running" and state["gen"] == {1}:
+        os._exit(3)
+
+ga_runner.write_checkpoint = stop
+sys.argv = ["ga_runner.py"] + sys.argv[1:]
+ga_runner.main(ga_runner.utils.parse_args(ga_runner.DB_CONFIG_FILE))
+"""
+
+
+class TestCheckpointFunctions(unittest.TestCase):
+
+    def setUp(self):
+        self.checkpoint_dir = tempfile.mkdtemp()
+        self.path = checkpoint_path(self.checkpoint_dir, 1, 3, 0)
+
+    def tearDown(self):
+        shutil.rmtree(self.checkpoint_dir)
+
+    def test_round_trip(self):
+        np.random.seed(3)
+        state = {
+            "gen"          : 12,
+            "genomes"      : np.random.uniform(-5, 5, (20, 30)),
+            "random_state" : np.random.get_state()
+        }
+
+        write_checkpoint(self.path, state)
+        restored = read_checkpoint(self.path)
+
+        self.assertEqual(restored["gen"], 12)
+        self.assertTrue((restored["genomes"] == state["genomes"]).all())
+
+        # The random number generator continues where it was saved.
+        expected = np.random.uniform(size=5)
+        np.random.set_state(restored["random_state"])
+        self.assertTrue((np.random.uniform(size=5) == expected).all())
+
+    def test_replace(self):
+        write_checkpoint(self.path, {"gen" : 1})
+        write_checkpoint(self.path, {"gen" : 2})
+
+        self.assertEqual(read_checkpoint(self.path)["gen"], 2)
+
+        # No temporary files are left behind.
+        self.assertEqual(os.listdir(self.checkpoint_dir),
+            [os.path.basename(self.path)])
+
+    def test_missing(self):
+        self.assertEqual(read_checkpoint(self.path), None)
+
+    def test_version(self):
+        with open(self.path, "wb") as out_file:
+            pickle.dump({"version" : -1}, out_file)
+
+        self.assertRaises(ValueError, read_checkpoint, self.path)
+
+
+class TestCheckpointResume(unittest.TestCase):
+
+    def setUp(self):
+        self.run_dir = tempfile.mkdtemp()
+
+        rand_state = np.random.RandomState(3)
+        trail = (rand_state.uniform(size=(16, 16)) < 0.3).astype(int)
+        trail[0, 0] = 5
+
+        # Runs are spooled so no database is needed.
+        for name in ["full.sqlite", "resumed.sqlite"]:
+            spool = SpoolDB(os.path.join(self.run_dir, name))
+            spool.addTrail(5, trail, "Random", 90)
+            spool.addNetwork(1, network.createJeffersonMDLNetwork(4, 5, 4))
+            spool.close()
+
+        os.mkdir(os.path.join(self.run_dir, "checkpoints"))
+
+    def tearDown(self):
+        shutil.rmtree(self.run_dir)
+
+    def run_ga(self, command, spool, extra_args=[]):
+        with open(os.devnull, "w") as devnull:
+            return subprocess.call([sys.executable] + command +
+                ["--spool", spool] + extra_args + RESUME_ARGS,
+                cwd=self.run_dir, stdout=devnull, stderr=devnull)
+
+    def spooled_generations(self, name):
+        spool = SpoolDB(os.path.join(self.run_dir, name))
+        run_ids = spool.getUnsynced()
+        self.assertEqual(len(run_ids), 1)
+        gen_info = spool.readRun(run_ids[0])[1]
+        spool.close()
+
+        # Runtimes differ between any two runs.
+        for record in gen_info:
+            del record["runtime"]
+
+        return gen_info
+
+    def test_resume(self):
+        ga_runner = os.path.join(ROOT_DIR, "ga_runner.py")
+        checkpoint_args = ["--checkpoint-dir", "checkpoints",
+            "--checkpoint-gens", "1"]
+
+        self.assertEqual(self.run_ga([ga_runner], "full.sqlite"), 0)
+
+        self.assertEqual(self.run_ga(["-c",
+            STOP_SCRIPT.format(ROOT_DIR, RESUME_STOP_GEN)],
+            "resumed.sqlite", checkpoint_args), 3)
+        self.assertEqual(self.run_ga([ga_runner], "resumed.sqlite",
+            checkpoint_args + ["--resume"]), 0)
+
+        self.assertEqual(self.spooled_generations("resumed.sqlite"),
+            self.spooled_generations("full.sqlite"))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,275 @@
+# Helpers for testing.
+import numpy as np
+import scipy.integrate
+import unittest
+
+# Parts of design under test.
+from ..chemistry import DelayLine
+from ..chemistry import DelayLineBatch
+from ..chemistry import DelayLineCache
+from ..chemistry import delay_line_jacobian
+from ..chemistry import delay_line_rhs
+
+TEST_LENGTHS = [2, 3, 5]
+TEST_STEPS   = 10
+TEST_COUNT   = 20
+
+
+def reference_rhs(y_in, t0, rate_k):
+    """ Rates of change written out one reaction at a time, using the
+    constants the delay line has always run with.
+    """
+    k_bind, k_return = rate_k[-1, 0], rate_k[-1, 2]
+    length = len(rate_k)
+
+    dy = np.zeros(len(y_in))
+    for curr_n in range(1, length + 1):
+        x_c_prev = 4 * (curr_n - 1)
+        x_s      = x_c_prev + 1
+        x_im     = x_c_prev + 2
+        x_n      = x_c_prev + 3
+        x_c      = x_c_prev + 4
+
+        bind    = k_bind * y_in[x_c_prev] * y_in[x_s]
+        release = k_bind * y_in[x_im]
+        ret     = k_return * y_in[x_s]
+
+        dy[x_c_prev] -= bind
+        dy[x_s]      += release - bind - ret
+        dy[x_im]     += bind - release
+        dy[x_n]      += release
+        dy[x_c]      += release
+
+        if curr_n > 1:
+            dy[x_s - 4] += ret
+
+    return dy
+
+
+class TestDelayLineFunctions(unittest.TestCase):
+
+    def setUp(self):
+        self.rand_state = np.random.RandomState(3)
+
+    def rate_constants(self, length):
+        return abs(self.rand_state.uniform(-5, 5, (length, 3)))
+
+    def test_rhs(self):
+        for length in TEST_LENGTHS:
+            rate_k = self.rate_constants(length)
+            rate_v = np.repeat(rate_k[-1, [0, 0, 2]], length)
+            y_in   = self.rand_state.uniform(0, 1, 4 * length + 1)
+
+            self.assertTrue(np.allclose(
+                delay_line_rhs(y_in, 0, rate_v, length),
+                reference_rhs(y_in, 0, rate_k)))
+
+            # Several delay lines at once must match each on its own.
+            y_many = self.rand_state.uniform(0, 1, (4, 4 * length + 1))
+            self.assertTrue(np.allclose(
+                delay_line_rhs(y_many, 0, rate_v, length),
+                [reference_rhs(row, 0, rate_k) for row in y_many]))
+
+    def test_closure_constants(self):
+        # Only the first and last constants of the last row are used, as
+        # the delay line always has. Changing this changes every run.
+        for length in TEST_LENGTHS:
+            rate_k = self.rate_constants(length)
+            other  = self.rate_constants(length)
+            other[-1, [0, 2]] = rate_k[-1, [0, 2]]
+
+            dl       = DelayLine(rate_k, user_interactive=False)
+            dl_other = DelayLine(other, user_interactive=False)
+            batch    = DelayLineBatch(np.array([rate_k, other]))
+
+            for idx in range(0, TEST_STEPS):
+                value    = self.rand_state.randint(0, 2)
+                expected = dl.evaluate(value)
+
+                self.assertTrue(np.array_equal(dl_other.evaluate(value),
+                    expected))
+                self.assertTrue(np.allclose(batch.evaluate([value, value]),
+                    [expected, expected], atol=1e-6))
+
+    def test_jacobian(self):
+        for length in TEST_LENGTHS:
+            rate_v = abs(self.rand_state.uniform(-5, 5, 3 * length))
+            y_in   = self.rand_state.uniform(0, 1, 4 * length + 1)
+            eps    = 1e-7
+
+            expected = np.array([
+                (delay_line_rhs(y_in + eps * unit, 0, rate_v, length) -
+                 delay_line_rhs(y_in, 0, rate_v, length)) / eps
+                for unit in np.eye(len(y_in))]).T
+
+            self.assertTrue(np.allclose(
+                delay_line_jacobian(y_in, 0, rate_v, length), expected,
+                atol=1e-5))
+
+    def test_evaluate(self):
+        # Final values must match integrating the full trajectory.
+        t_val = np.arange(0, 100, 0.01)
+
+        for length in TEST_LENGTHS:
+            rate_k = self.rate_constants(length)
+            dl     = DelayLine(rate_k, user_interactive=False)
+            prev   = [0] * length
+
+            for idx in range(0, TEST_STEPS):
+                value    = self.rand_state.randint(0, 2)
+                expected = scipy.integrate.odeint(reference_rhs,
+                    DelayLine.build_y0_input(value, prev), t_val,
+                    args=(rate_k,))[-1][3::4]
+                actual   = dl.evaluate(value)
+                prev     = expected
+
+                self.assertTrue(np.allclose(actual, expected, atol=1e-6), (
+                    "Delay line of length {0} does not match on step " +
+                    "{1}!\nExpected:\n{2}\nActual:\n{3}").format(
+                        length, idx, expected, actual))
+
+    def test_evaluate_rk4(self):
+        for length in TEST_LENGTHS:
+            rate_k = self.rate_constants(length)
+            dl_ode = DelayLine(rate_k, user_interactive=False)
+            dl_rk4 = DelayLine(rate_k, user_interactive=False,
+                integrator="rk4")
+
+            for idx in range(0, TEST_STEPS):
+                value = self.rand_state.randint(0, 2)
+
+                self.assertTrue(np.allclose(
+                    dl_rk4.evaluate(value), dl_ode.evaluate(value),
+                    atol=1e-3))
+
+    def test_batch_evaluate(self):
+        # Each row of a batch must move like a delay line on its own.
+        for length in TEST_LENGTHS:
+            for integrator in ["odeint", "rk4"]:
+                rate_k = abs(self.rand_state.uniform(-5, 5,
+                    (TEST_COUNT, length, 3)))
+                batch  = DelayLineBatch(rate_k, integrator=integrator)
+                dls    = [DelayLine(row, user_interactive=False)
+                    for row in rate_k]
+                expected = np.zeros((TEST_COUNT, length))
+
+                for idx in range(0, TEST_STEPS):
+                    values = self.rand_state.randint(0, 2, TEST_COUNT)
+                    active = self.rand_state.uniform(size=TEST_COUNT) < 0.8
+
+                    for row in np.flatnonzero(active):
+                        expected[row] = dls[row].evaluate(values[row])
+
+                    actual = batch.evaluate(values, active)
+
+                    self.assertTrue(np.allclose(actual, expected,
+                        atol=1e-3 if integrator == "rk4" else 1e-6), (
+                        "Delay line batch of length {0} using {1} does " +
+                        "not match on step {2}!").format(
+                            length, integrator, idx))
+
+    def test_linear(self):
+        # The surrogate is fit to reproduce moves from the empty delay line.
+        for length in TEST_LENGTHS:
+            rate_k = self.rate_constants(length)
+
+            for value in [0, 1]:
+                dl     = DelayLine(rate_k, user_interactive=False)
+                dl_lin = DelayLine(rate_k, user_interactive=False,
+                    integrator="linear")
+
+                self.assertTrue(np.allclose(
+                    dl_lin.evaluate(value), dl.evaluate(value), atol=1e-6))
+
+    def test_linear_batch(self):
+        rate_k = abs(self.rand_state.uniform(-5, 5, (TEST_COUNT, 3, 3)))
+        batch  = DelayLineBatch(rate_k, integrator="linear")
+        dls    = [DelayLine(row, user_interactive=False, integrator="linear")
+            for row in rate_k]
+
+        for idx in range(0, TEST_STEPS):
+            values = self.rand_state.randint(0, 2, TEST_COUNT)
+            active = self.rand_state.uniform(size=TEST_COUNT) < 0.8
+            actual = batch.evaluate(values, active)
+
+            for row in np.flatnonzero(active):
+                self.assertTrue(np.allclose(
+                    actual[row], dls[row].evaluate(values[row])))
+
+    def test_cache(self):
+        # Cached responses must match integrating every move.
+        for length in TEST_LENGTHS:
+            rate_k = self.rate_constants(length)
+            cache  = DelayLineCache()
+            dl     = DelayLine(rate_k, user_interactive=False)
+            dl_one = DelayLine(rate_k, user_interactive=False, cache=cache)
+            dl_two = DelayLine(rate_k, user_interactive=False, cache=cache)
+
+            for idx in range(0, TEST_STEPS):
+                value    = self.rand_state.randint(0, 2)
+                expected = dl.evaluate(value)
+
+                self.assertTrue(np.allclose(dl_one.evaluate(value), expected))
+                self.assertTrue(np.allclose(dl_two.evaluate(value), expected))
+
+            # The second delay line repeats the moves of the first.
+            self.assertTrue(cache.hits >= TEST_STEPS)
+            self.assertEqual(cache.hits + cache.misses, 2 * TEST_STEPS)
+
+    def test_cache_batch(self):
+        rate_k = abs(self.rand_state.uniform(-5, 5, (TEST_COUNT, 3, 3)))
+        cache  = DelayLineCache()
+        batch  = DelayLineBatch(rate_k)
+        cached = DelayLineBatch(rate_k, cache=cache)
+
+        for idx in range(0, TEST_STEPS):
+            values = self.rand_state.randint(0, 2, TEST_COUNT)
+
+            self.assertTrue(np.allclose(
+                cached.evaluate(values), batch.evaluate(values)))
+
+        self.assertEqual(cache.hits + cache.misses, TEST_COUNT * TEST_STEPS)
+
+    def test_cache_eviction(self):
+        rate_v = np.ones(6)
+        cache  = DelayLineCache(max_size=2)
+
+        keys = [cache.key(rate_v, [0.0, 0.0], value) for value in range(3)]
+        cache.put(keys[0], [1.0, 2.0])
+        cache.put(keys[1], [3.0, 4.0])
+
+        # Using the first key makes the second the least recently used.
+        self.assertEqual(list(cache.get(keys[0])), [1.0, 2.0])
+        cache.put(keys[2], [5.0, 6.0])
+
+        self.assertEqual(len(cache), 2)
+        self.assertEqual(cache.get(keys[1]), None)
+        self.assertEqual(cache.getStats(),
+            {"hits" : 1, "misses" : 1, "size" : 2})
+
+    def test_cache_exact_key(self):
+        # Outputs that differ in the last bit must not share a response.
+        rate_v = np.ones(6)
+        cache  = DelayLineCache()
+        prev   = np.array([0.25, 0.5])
+
+        cache.put(cache.key(rate_v, prev, 1), [1.0, 2.0])
+
+        self.assertEqual(cache.get(cache.key(rate_v,
+            np.nextafter(prev, 1.0), 1)), None)
+        self.assertEqual(list(cache.get(cache.key(rate_v, list(prev), 1))),
+            [1.0, 2.0])
+
+    def test_invalid_integrator(self):
+        rate_k = self.rate_constants(2)
+
+        self.assertRaises(ValueError, DelayLine, rate_k,
+            user_interactive=False, integrator="euler")
+        self.assertRaises(ValueError, DelayLine, rate_k,
+            user_interactive=True, integrator="rk4")
+        self.assertRaises(ValueError, DelayLineBatch,
+            np.array([rate_k]), integrator="euler")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,98 @@
+# Helpers for testing.
+import unittest
+
+# Parts of design under test.
+from ..evaluation import BACKENDS
+from ..evaluation import EvaluationBackend
+from ..evaluation import load_template
+from ..evaluation import share_template
+
+TEST_ITEMS = range(0, 50)
+
+
+def scaled_length(value, template):
+    # Stands in for evaluating an individual against a template.
+    network, trail = load_template(template)
+    return value * len(network) + len(trail)
+
+
+def negate_chunk(values):
+    return [-value for value in values]
+
+
+class TestEvaluationBackend(unittest.TestCase):
+
+    def setUp(self):
+        self.template = share_template(1, 2, [0, 1, 2], "trail")
+
+    def test_map(self):
+        expected = [scaled_length(value, self.template)
+            for value in TEST_ITEMS]
+
+        for name in BACKENDS:
+            backend = EvaluationBackend(name, processes=2)
+            backend.start([self.template])
+
+            self.assertEqual(
+                backend.map(scaled_length, TEST_ITEMS,
+                    [self.template] * len(TEST_ITEMS)),
+                expected, "Backend {0} does not match!".format(name))
+            self.assertEqual(
+                backend.map(abs, [-value for value in TEST_ITEMS]),
+                list(TEST_ITEMS))
+
+            backend.close()
+
+    def test_mapChunks(self):
+        expected = negate_chunk(TEST_ITEMS)
+
+        for name in BACKENDS:
+            backend = EvaluationBackend(name, processes=2)
+            backend.start([self.template])
+
+            for chunk_size in [0, 1, 7, 50, 100]:
+                self.assertEqual(
+                    backend.mapChunks(negate_chunk, TEST_ITEMS, chunk_size),
+                    expected, ("Backend {0} does not match with chunks " +
+                        "of {1}!").format(name, chunk_size))
+
+            self.assertEqual(backend.mapChunks(negate_chunk, []), [])
+
+            backend.close()
+
+    def test_chunkSize(self):
+        # A single worker takes the whole batch at once.
+        self.assertEqual(EvaluationBackend("serial").chunkSize(100), 100)
+
+        # Otherwise each worker gets several chunks.
+        backend = EvaluationBackend("pool", processes=5)
+        self.assertEqual(backend.chunkSize(100), 5)
+        self.assertEqual(backend.chunkSize(3), 1)
+
+    def test_submit(self):
+        for name in ["serial", "pool"]:
+            backend = EvaluationBackend(name, processes=2)
+            backend.start([self.template])
+
+            for value in TEST_ITEMS:
+                backend.submit(abs, -value)
+
+            completed = []
+            while backend.getSubmitted():
+                completed.append(backend.nextCompleted())
+
+            # Items may finish in any order, but each exactly once.
+            self.assertEqual(sorted(completed),
+                [(-value, value) for value in reversed(TEST_ITEMS)])
+            self.assertRaises(ValueError, backend.nextCompleted)
+
+            backend.close()
+
+    def test_invalid(self):
+        self.assertRaises(ValueError, EvaluationBackend, "threads")
+        self.assertRaises(ValueError, EvaluationBackend, "pool",
+            processes=0)
+
+
+if __name__ == '__main__':
+    unittest.main()
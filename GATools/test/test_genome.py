@@ -0,0 +1,90 @@
+# Helpers for testing.
+from deap import base, creator
+import numpy as np
+import unittest
+
+# Parts of design under test.
+from ..genome import cx_two_point
+from ..genome import matrix_views
+from ..genome import mut_flip_bit
+from ..genome import mut_gaussian
+from ..genome import mut_uniform
+
+TEST_ROWS   = 21
+TEST_LENGTH = 12
+
+creator.create("TestGenomeFitness", base.Fitness, weights=(1.0,))
+creator.create("TestGenomeIndividual", np.ndarray,
+    fitness=creator.TestGenomeFitness)
+
+
+class TestGenomeFunctions(unittest.TestCase):
+
+    def setUp(self):
+        np.random.seed(3)
+        self.matrix = np.random.uniform(-5, 5, (TEST_ROWS, TEST_LENGTH))
+
+    def test_matrix_views(self):
+        views = matrix_views(self.matrix, creator.TestGenomeIndividual,
+            creator.TestGenomeFitness)
+
+        self.assertEqual(len(views), TEST_ROWS)
+        self.assertFalse(views[0].fitness.valid)
+
+        # Changing a view changes the matrix.
+        views[2][3] = 100.0
+        self.assertEqual(self.matrix[2, 3], 100.0)
+
+    def test_cx_two_point(self):
+        original = self.matrix.copy()
+        changed  = cx_two_point(self.matrix, 1.0)
+
+        # The last row has no partner.
+        self.assertEqual(list(changed), [True] * (TEST_ROWS - 1) + [False])
+        self.assertTrue((self.matrix[-1] == original[-1]).all())
+
+        for idx in range(0, TEST_ROWS - 1, 2):
+            swapped = np.flatnonzero(self.matrix[idx] != original[idx])
+
+            # One contiguous segment is swapped between the pair.
+            self.assertTrue(len(swapped) > 0)
+            self.assertEqual(len(swapped), swapped[-1] - swapped[0] + 1)
+            self.assertTrue((self.matrix[idx, swapped] ==
+                original[idx + 1, swapped]).all())
+            self.assertTrue((self.matrix[idx + 1, swapped] ==
+                original[idx, swapped]).all())
+
+        self.assertFalse(cx_two_point(self.matrix, 0.0).any())
+
+    def test_mut_gaussian(self):
+        original = self.matrix.copy()
+
+        self.assertFalse(mut_gaussian(self.matrix, 0.0, 1.0).any())
+        self.assertTrue((self.matrix == original).all())
+
+        rows = mut_gaussian(self.matrix, 0.5, 1.0)
+        self.assertTrue((self.matrix[rows] != original[rows]).all())
+        self.assertTrue((self.matrix[~rows] == original[~rows]).all())
+
+    def test_mut_uniform(self):
+        original = self.matrix.copy()
+
+        rows = mut_uniform(self.matrix, 1.0, 10.0, 11.0, 0.5)
+        changed = self.matrix != original
+
+        self.assertTrue(rows.all())
+        self.assertTrue(changed.any())
+        self.assertTrue((self.matrix[changed] >= 10.0).all())
+        self.assertTrue((self.matrix[changed] <= 11.0).all())
+
+    def test_mut_flip_bit(self):
+        bits = np.random.randint(0, 2, (TEST_ROWS, TEST_LENGTH)).astype(float)
+        original = bits.copy()
+
+        mut_flip_bit(bits, 1.0, 1.0)
+
+        self.assertTrue((bits == 1 - original).all())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,59 @@
+# Helpers for testing.
+from deap import base, creator
+import random
+import unittest
+
+# Parts of design under test.
+from ..replacement import replace_worst
+
+TEST_POPULATION = 20
+TEST_CHILDREN   = 500
+
+creator.create("TestReplacementFitness", base.Fitness, weights=(1.0, -1.0))
+creator.create("TestReplacementIndividual", list,
+    fitness=creator.TestReplacementFitness)
+
+
+class TestReplacementFunctions(unittest.TestCase):
+
+    def setUp(self):
+        self.rand_state = random.Random(3)
+
+    def individual(self):
+        ind = creator.TestReplacementIndividual([self.rand_state.random()])
+        ind.fitness.values = (self.rand_state.randint(0, 10),
+            self.rand_state.randint(0, 10))
+        return ind
+
+    def test_replace_worst(self):
+        population = [self.individual() for _ in range(TEST_POPULATION)]
+
+        for _ in range(TEST_CHILDREN):
+            child = self.individual()
+            worst = min(ind.fitness for ind in population)
+            idx   = replace_worst(population, child)
+
+            if worst < child.fitness:
+                self.assertTrue(population[idx] is child)
+            else:
+                self.assertEqual(idx, None)
+
+            # Every place holds its own individual and the worst only gets
+            # better.
+            self.assertEqual(len(population), TEST_POPULATION)
+            self.assertEqual(len(set(id(ind) for ind in population)),
+                TEST_POPULATION)
+            self.assertTrue(min(ind.fitness for ind in population) >= worst)
+
+    def test_keeps_fitter(self):
+        population = [self.individual() for _ in range(TEST_POPULATION)]
+        before     = list(population)
+        child      = self.individual()
+        child.fitness.values = (-1, 11)
+
+        self.assertEqual(replace_worst(population, child), None)
+        self.assertEqual(population, before)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,165 @@
+# Helpers for testing.
+import datetime
+import numpy as np
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import unittest
+
+# Parts of design under test.
+from ..spool import SpoolDB
+from ..trail.network import network
+
+TEST_GENERATIONS = 7
+TEST_BATCH_SIZE  = 3
+
+GA_RUNNER = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+    "..", "..", "ga_runner.py")
+
+
+class TestSpoolDB(unittest.TestCase):
+
+    def setUp(self):
+        self.spool_dir = tempfile.mkdtemp()
+        self.spool = SpoolDB(os.path.join(self.spool_dir, "runs.sqlite"),
+            batch_size=TEST_BATCH_SIZE)
+
+        rand_state = np.random.RandomState(3)
+
+        self.run_info = {
+            "trails_id"         : 5,
+            "networks_id"       : 1,
+            "selection_id"      : 6,
+            "mutate_id"         : 5,
+            "host_type_id"      : 1,
+            "variations_id"     : 5,
+            "run_date"          : datetime.datetime(2015, 3, 1, 12, 30, 5),
+            "hostname"          : "node1",
+            "generations"       : TEST_GENERATIONS,
+            "population"        : 40,
+            "moves_limit"       : 200,
+            "sel_tourn_size"    : None,
+            "lambda"            : 0,
+            "p_mutate"          : 0.1,
+            "p_crossover"       : 0.6,
+            "weight_min"        : -5.0,
+            "weight_max"        : 5.0,
+            "debug"             : False,
+            "algorithm_ver"     : 2,
+            "mean_check_length" : 100,
+            "runtime"           : datetime.timedelta(seconds=65,
+                microseconds=7)
+        }
+
+        self.gen_info = [{
+            "gen"           : gen,
+            "runtime"       : datetime.timedelta(
+                microseconds=rand_state.randint(0, 10**6)),
+            "food_max"      : 17.0,
+            "food_min"      : 2.0,
+            "food_avg"      : rand_state.uniform(0, 90),
+            "food_std"      : rand_state.uniform(0, 10),
+            "moves_max"     : 200.0,
+            "moves_min"     : 31.0,
+            "moves_avg"     : rand_state.uniform(0, 200),
+            "moves_std"     : rand_state.uniform(0, 10),
+            "moves_left"    : 6,
+            "moves_right"   : 3,
+            "moves_forward" : 105,
+            "moves_none"    : 0,
+            "elite"         : rand_state.uniform(-5, 5, 11).tolist()
+        } for gen in range(TEST_GENERATIONS)]
+
+    def tearDown(self):
+        self.spool.close()
+        shutil.rmtree(self.spool_dir)
+
+    def test_record_run(self):
+        run_id = self.spool.recordRun(self.run_info, self.gen_info)
+
+        self.assertEqual(self.spool.getUnsynced(), [run_id])
+
+        # Runs read back exactly as they were recorded.
+        run_info, gen_info = self.spool.readRun(run_id)
+        self.assertEqual(run_info, self.run_info)
+        self.assertEqual(gen_info, self.gen_info)
+
+        # The configuration is shared by runs with the same one.
+        other_id = self.spool.recordRun(self.run_info, self.gen_info[:1])
+        self.assertEqual(self.spool.readRun(other_id)[0], self.run_info)
+        self.assertEqual(self.spool.getUnsynced(), [run_id, other_id])
+
+    def test_writer(self):
+        writer = self.spool.startRun(self.run_info)
+
+        for record in self.gen_info:
+            writer.add(record)
+
+        # Runs are not uploaded until they are finished.
+        self.assertEqual(self.spool.getUnsynced(), [])
+        self.assertEqual(len(self.spool.getUnfinished()), 1)
+
+        run_id = writer.finish(self.run_info["runtime"])
+
+        self.assertEqual(self.spool.getUnfinished(), [])
+        self.assertEqual(self.spool.readRun(run_id),
+            (self.run_info, self.gen_info))
+
+    def test_mark_synced(self):
+        run_id = self.spool.recordRun(self.run_info, self.gen_info)
+        self.spool.markSynced(run_id, 120)
+
+        self.assertEqual(self.spool.getUnsynced(), [])
+
+    def test_trails_networks(self):
+        trail = np.matrix(np.eye(4, dtype=int))
+
+        self.assertEqual(self.spool.getTrailData(5), None)
+        self.assertEqual(self.spool.getNetworkByID(1), None)
+
+        self.spool.addTrail(5, trail, "Diagonal", 90)
+        self.spool.addNetwork(1, network.createJeffersonStyleNetwork())
+
+        trail_data, name, init_rot = self.spool.getTrailData(5)
+        self.assertTrue(np.array_equal(trail_data, trail))
+        self.assertEqual((name, init_rot), ("Diagonal", 90))
+        self.assertEqual(len(self.spool.getNetworkByID(1).params),
+            len(network.createJeffersonStyleNetwork().params))
+
+    def test_spooled_run(self):
+        # Once its trail and network are in the spool, a run is spooled
+        # where there is no config/config.json or database.
+        trail = np.zeros((8, 8), dtype=int)
+        trail[0, 0]  = 5
+        trail[0, 1:] = 1
+
+        self.spool.addTrail(5, trail, "Line", 90)
+        self.spool.addNetwork(1, network.createJeffersonStyleNetwork())
+
+        with open(os.devnull, "w") as devnull:
+            returncode = subprocess.call([sys.executable,
+                os.path.abspath(GA_RUNNER), "--script-mode",
+                "--backend", "serial", "--spool", "runs.sqlite", "-g", "3",
+                "-s", "6", "--variation", "5", "--mutate-type", "5",
+                "--no-early-quit", "5", "10", "0", "20", "1"],
+                cwd=self.spool_dir, stdout=devnull, stderr=devnull)
+
+        self.assertEqual(returncode, 0)
+
+        run_ids = self.spool.getUnsynced()
+        self.assertEqual(len(run_ids), 1)
+
+        run_info, gen_info = self.spool.readRun(run_ids[0])
+        self.assertEqual((run_info["trails_id"], run_info["networks_id"]),
+            (5, 1))
+        self.assertEqual(len(gen_info), 3)
+
+    def test_invalid(self):
+        self.assertRaises(ValueError, SpoolDB,
+            os.path.join(self.spool_dir, "other.sqlite"), batch_size=0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,63 @@
+# Helpers for testing.
+import numpy as np
+import scipy.stats
+import unittest
+
+# Parts of design under test.
+from ..stats import GenerationStats
+from ..stats import RollingWindow
+
+TEST_SIZE   = 50
+TEST_WINDOW = 7
+
+
+class TestStatsFunctions(unittest.TestCase):
+
+    def setUp(self):
+        self.rand_state = np.random.RandomState(3)
+
+    def check_record(self, record, fitness):
+        for idx, name in enumerate(["food", "moves"]):
+            values = fitness[:, idx]
+
+            self.assertEqual(record[name]["min"], np.min(values))
+            self.assertEqual(record[name]["max"], np.max(values))
+            self.assertAlmostEqual(record[name]["avg"], np.mean(values))
+            self.assertAlmostEqual(record[name]["std"], np.std(values))
+            self.assertEqual(record[name]["mode"],
+                scipy.stats.mode(values)[0][0])
+
+    def test_compile(self):
+        gen_stats = GenerationStats(TEST_SIZE)
+
+        for count in [1, TEST_SIZE / 2, TEST_SIZE, 2 * TEST_SIZE]:
+            fitness = np.column_stack([
+                self.rand_state.randint(0, 90, count),
+                self.rand_state.randint(50, 200, count)]).astype(float)
+
+            self.check_record(
+                gen_stats.compile([tuple(fit) for fit in fitness]), fitness)
+
+    def test_compile_fractions(self):
+        # Fitness that is not a count is still handled.
+        fitness = self.rand_state.randint(-3, 3, (TEST_SIZE, 2)) / 2.0
+
+        self.check_record(GenerationStats(TEST_SIZE).compile(fitness),
+            fitness)
+
+    def test_rolling_window(self):
+        window = RollingWindow(TEST_WINDOW)
+        values = self.rand_state.uniform(20, 40, 10 * TEST_WINDOW)
+
+        for idx, value in enumerate(values):
+            window.push(value)
+
+            self.assertEqual(window.isFull(), idx + 1 >= TEST_WINDOW)
+            self.assertAlmostEqual(window.std(),
+                np.std(values[max(0, idx + 1 - TEST_WINDOW):idx + 1]))
+
+        self.assertRaises(ValueError, RollingWindow, 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,89 @@
+# Helpers for testing.
+import numpy as np
+import unittest
+
+# Parts of design under test.
+from ..trail.batch import trail_batch
+from ..trail.trail import trail
+
+from .test_trail_trail import TEST_TRAIL, TEST_TRAIL_FOOD_CNT
+
+BATCH_COUNT = 25
+BATCH_MOVES = 60
+
+
+class TestTrailBatchFunctions(unittest.TestCase):
+
+    def setUp(self):
+        self.trail_i = trail()
+        self.trail_i.readTrailInstant(TEST_TRAIL, "Stuff", 0)
+
+        # Random moves for every agent, picked by the food ahead.
+        rand_state = np.random.RandomState(12)
+        self.move_table = rand_state.randint(0, 4,
+            size=(BATCH_COUNT, BATCH_MOVES, 2))
+
+    def __runSingle(self, idx):
+        trail_temp = trail()
+        trail_temp.readTrailInstant(TEST_TRAIL, "Stuff", 0)
+
+        for step in range(0, BATCH_MOVES):
+            if trail_temp.getFoodStats()[1] == 0:
+                break
+
+            curr_move = self.move_table[idx, step,
+                int(trail_temp.isFoodAhead())]
+
+            if curr_move == 1:
+                trail_temp.turnLeft()
+            elif curr_move == 2:
+                trail_temp.turnRight()
+            elif curr_move == 3:
+                trail_temp.moveForward()
+            else:
+                trail_temp.noMove()
+
+        return trail_temp
+
+    def test_run(self):
+        batch = trail_batch(self.trail_i, BATCH_COUNT)
+        step = [0]
+
+        def determine_moves(food_ahead, active):
+            next_moves = self.move_table[np.arange(BATCH_COUNT), step[0],
+                food_ahead.astype(int)]
+            step[0] += 1
+            return next_moves
+
+        batch.run(determine_moves, BATCH_MOVES)
+
+        batch_moves = batch.getMovesStats()
+
+        for idx in range(0, BATCH_COUNT):
+            single = self.__runSingle(idx)
+
+            self.assertEqual(
+                batch.getFoodConsumed()[idx], single.getFoodConsumed(),
+                "Food consumed does not match for agent {0}!".format(idx))
+            self.assertEqual(
+                batch.getNumMoves()[idx], single.getNumMoves(),
+                "Moves made do not match for agent {0}!".format(idx))
+
+            for key, value in single.getMovesStats().items():
+                self.assertEqual(batch_moves[key][idx], value)
+
+    def test_reset(self):
+        batch = trail_batch(self.trail_i, BATCH_COUNT)
+
+        batch.applyMoves(np.repeat(3, BATCH_COUNT),
+            np.ones(BATCH_COUNT, dtype=bool))
+        batch.reset()
+
+        self.assertTrue((batch.getFoodConsumed() == 0).all())
+        self.assertTrue((batch.getNumMoves() == 0).all())
+        self.assertTrue((batch.getFoodStats()[1] ==
+            TEST_TRAIL_FOOD_CNT).all())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,113 @@
+# Helpers for testing.
+import numpy as np
+import unittest
+
+# Parts of design under test.
+from ..trail.network import network
+
+TEST_STEPS      = 100
+TEST_POPULATION = 20
+
+TEST_NETWORKS = [
+    network.createJeffersonStyleNetwork(
+        in_count=2, hidden_count=5, output_count=4),
+    network.createJeffersonStyleNetwork(
+        in_count=2, hidden_count=10, output_count=3),
+    network.createJeffersonStyleNetwork(
+        in_count=2, hidden_count=5, output_count=4, recurrent=False),
+    network.createJeffersonStyleNetwork(
+        in_count=2, hidden_count=5, output_count=4, in_to_out_connect=False),
+    network.createJeffersonMDLNetwork(
+        mdl_length=2, hidden_count=5, output_count=4),
+    network.createJeffersonMDLNetwork(
+        mdl_length=8, hidden_count=10, output_count=3),
+    network.create_jefferson_chemical_network(
+        mdl_length=3, hidden_count=5, output_count=3),
+]
+
+
+class TestNetworkFunctions(unittest.TestCase):
+
+    def setUp(self):
+        self.rand_state = np.random.RandomState(7)
+
+    def test_activate(self):
+        # Native forward pass must match PyBrain activate().
+        for pybrain_net in TEST_NETWORKS:
+            pybrain_net.reset()
+
+            an = network()
+            an.readNetworkInstant(pybrain_net.copy())
+
+            nn_params = self.rand_state.uniform(-5, 5,
+                len(pybrain_net.params))
+
+            if "Chemical" in pybrain_net.name:
+                dl_params = self.rand_state.uniform(0, 1, 9)
+            else:
+                dl_params = []
+
+            an.updateParameters(list(nn_params) + list(dl_params))
+            pybrain_net._setParameters(list(nn_params))
+
+            for idx in range(0, TEST_STEPS):
+                nn_input = self.rand_state.randint(0, 2, pybrain_net.indim)
+
+                actual   = an.activate(nn_input)
+                expected = pybrain_net.activate(nn_input)
+
+                self.assertTrue(np.allclose(actual, expected), (
+                    "Network {0} does not match PyBrain on step {1}!\n" +
+                    "Expected:\n{2}\nActual:\n{3}").format(
+                        pybrain_net.name, idx, expected, actual))
+
+    def test_updateParameters(self):
+        # New parameters must also reset the recurrent state.
+        pybrain_net = TEST_NETWORKS[0]
+
+        an = network()
+        an.readNetworkInstant(pybrain_net.copy())
+
+        nn_params = list(self.rand_state.uniform(-5, 5,
+            len(pybrain_net.params)))
+
+        an.updateParameters(nn_params)
+        first = [an.activate([1, 0]) for _ in range(0, 10)]
+
+        an.updateParameters(nn_params)
+        second = [an.activate([1, 0]) for _ in range(0, 10)]
+
+        self.assertTrue(np.allclose(first, second))
+
+    def test_determinePopulationMoves(self):
+        # Moves for a population must match each individual on its own.
+        for pybrain_net in TEST_NETWORKS:
+            an = network()
+            an.readNetworkInstant(pybrain_net.copy())
+
+            params_length = len(pybrain_net.params)
+            if "Chemical" in pybrain_net.name:
+                params_length += 9
+
+            population = self.rand_state.uniform(-5, 5,
+                (TEST_POPULATION, params_length))
+            food_ahead = self.rand_state.randint(0, 2,
+                (TEST_STEPS, TEST_POPULATION)).astype(bool)
+
+            an.updatePopulationParameters(population)
+            actual = [an.determinePopulationMoves(row) for row in food_ahead]
+
+            for idx, individual in enumerate(population):
+                an.updateParameters(list(individual))
+
+                for step in range(0, TEST_STEPS):
+                    self.assertEqual(
+                        actual[step][idx],
+                        an.determineMove(food_ahead[step, idx]), (
+                            "Network {0} move does not match for individual " +
+                            "{1} on step {2}!").format(
+                                pybrain_net.name, idx, step))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,6 +1,7 @@
 # Helpers for testing.
 import numpy as np
 import os
+import pickle
 import unittest
 
 # Parts of design under test.
@@ -31,8 +32,6 @@ AGENT_START_Y = 4
 
 DB_CONFIG_FILE = 'config/config.json'
 
-# TODO: Add a test that checks if maze has been modified by the class after passed in to instant read.
-
 class TestTrailFunctions(unittest.TestCase):
 
     def setUp(self):
@@ -74,6 +73,60 @@ class TestTrailFunctions(unittest.TestCase):
             (trail_temp.getMatrix()==TEST_TRAIL).all(),
             "Input trail does not match test trail!")
 
+    def test_readTrailInstantUnmodified(self):
+        trail_in = TEST_TRAIL.copy()
+
+        trail_temp = trail()
+        trail_temp.readTrailInstant(trail_in, "Stuff", 90)
+        trail_temp.moveForward()
+
+        self.assertTrue(
+            (trail_in==TEST_TRAIL).all(),
+            "Input trail was modified by the trail class!")
+
+    def test_pickle(self):
+        self.trail_i.moveForward()
+        self.trail_i.turnRight()
+
+        trail_temp = pickle.loads(pickle.dumps(self.trail_i))
+
+        self.assertTrue(
+            (trail_temp.getMatrix()==self.trail_i.getMatrix()).all(),
+            "Unpickled trail does not match original trail!")
+        self.assertEqual(trail_temp.getFoodStats(),
+            self.trail_i.getFoodStats())
+        self.assertEqual(trail_temp.getMovesStats(),
+            self.trail_i.getMovesStats())
+
+        trail_temp.turnLeft()
+        trail_temp.moveForward()
+        self.trail_i.turnLeft()
+        self.trail_i.moveForward()
+
+        self.assertTrue(
+            (trail_temp.getMatrix()==self.trail_i.getMatrix()).all(),
+            "Unpickled trail does not move like original trail!")
+
+    def test_reset(self):
+        self.trail_i.moveForward()
+        self.trail_i.turnLeft()
+        self.trail_i.moveForward()
+        self.trail_i.noMove()
+
+        self.trail_i.reset()
+
+        self.assertTrue(
+            (self.trail_i.getMatrix()==TEST_TRAIL).all(),
+            "Reset trail does not match test trail!")
+        self.assertEqual(self.trail_i.getFoodStats(),
+            (0, TEST_TRAIL_FOOD_CNT))
+        self.assertEqual(self.trail_i.getNumMoves(), 0)
+
+        # The agent must move like it does on a freshly read trail.
+        self.trail_i.moveForward()
+        self.assertEqual(self.trail_i.getFoodConsumed(), 1)
+        self.assertTrue(self.trail_i.isFoodAhead())
+
     def test_getTrailDim(self):
         trail_x, trail_y = self.trail_i.getTrailDim()
 
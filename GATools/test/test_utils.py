@@ -0,0 +1,87 @@
+# Helpers for testing.
+import json
+import os
+import shutil
+import StringIO
+import sys
+import tempfile
+import time
+import unittest
+
+# Parts of design under test.
+from ..utils import utils
+
+TEST_ARGV = ["ga_runner.py", "5", "40", "0", "200", "1", "3",
+    "-s", "6", "--variation", "5"]
+
+# Database that refuses connections right away.
+TEST_CONFIG = {"database" : {"host" : "127.0.0.1", "db" : "ga_runner",
+    "user" : "ga_runner", "port" : 1, "password" : ""}}
+
+TEST_IDS = {"trail" : [1, 5], "network" : [1, 2, 3],
+    "mutate" : [1, 2, 3, 4, 5], "selection" : [1, 6],
+    "variations" : [1, 2, 3, 4, 5]}
+
+
+class TestParseArgs(unittest.TestCase):
+
+    def setUp(self):
+        self.config_dir  = tempfile.mkdtemp()
+        self.config_file = os.path.join(self.config_dir, "config.json")
+        self.argv        = sys.argv
+        self.stderr      = sys.stderr
+
+    def tearDown(self):
+        sys.argv   = self.argv
+        sys.stderr = self.stderr
+
+        cache_path = utils.id_cache_path(self.config_file)
+        if os.path.exists(cache_path):
+            os.remove(cache_path)
+
+        shutil.rmtree(self.config_dir)
+
+    def parse(self, argv):
+        sys.argv = argv
+        return utils.parse_args(self.config_file)
+
+    def write_config(self, ids=None):
+        with open(self.config_file, "w") as fh:
+            json.dump(TEST_CONFIG, fh)
+
+        if ids is not None:
+            with open(utils.id_cache_path(self.config_file), "w") as fh:
+                json.dump({"time" : time.time(),
+                    "config_mtime" : os.path.getmtime(self.config_file),
+                    "ids" : ids}, fh)
+
+    def test_no_config(self):
+        # Ids are not checked without a configuration.
+        args = self.parse(TEST_ARGV[:5] + ["7"] + TEST_ARGV[6:])
+
+        self.assertEqual(args.trail, 5)
+        self.assertEqual(args.network, [7, 3])
+
+    def test_no_database(self):
+        self.write_config()
+
+        self.assertEqual(utils.get_valid_ids(self.config_file), None)
+        self.assertEqual(self.parse(TEST_ARGV).network, [1, 3])
+
+    def test_cached_ids(self):
+        self.write_config(TEST_IDS)
+
+        self.assertEqual(utils.get_valid_ids(self.config_file), TEST_IDS)
+        self.assertEqual(self.parse(TEST_ARGV).network, [1, 3])
+
+        # An invalid id is checked against the stale cache since the
+        # database can not be reached.
+        sys.stderr = StringIO.StringIO()
+        with self.assertRaises(SystemExit):
+            self.parse(TEST_ARGV[:5] + ["4"] + TEST_ARGV[6:])
+
+        self.assertTrue("invalid choice: 4" in sys.stderr.getvalue())
+
+
+if __name__ == '__main__':
+    unittest.main()
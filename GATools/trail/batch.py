@@ -0,0 +1,175 @@
+import numpy as np
+
+from .trail import GridVals, _ahead_tables
+
+
+class trail_batch(object):
+    """ Runs one trail for a whole population of agents in lockstep.
+
+    The food left on the trail is held as a (population, height, width)
+    array and the agents' positions, headings and counters as arrays, so
+    each move is applied to every agent at once with array operations.
+    Moves use the codes returned by network.determineMove and the food and
+    move counts match running each agent on its own trail.
+    """
+
+    # Change of heading (in 90 degree steps) for each move code.
+    __HEADING_DELTA = np.array([0, -1, 1, 0])
+
+    def __init__(self, agent_trail, count):
+        """ Prepares count agents at the start of a loaded trail.
+
+        Args:
+            agent_trail (trail): Trail read in and not yet moved on.
+            count (int): Number of agents in the population.
+        """
+        data_matrix = np.asarray(agent_trail.getMatrix())
+        height, width = data_matrix.shape
+
+        self.__trail_name = agent_trail.getName()
+        self.__count      = count
+        self.__rows       = np.arange(count)
+        self.__ahead      = np.array(_ahead_tables(width, height))
+
+        # The start square holds the agent and, from its value, the heading.
+        self.__start_pos = np.flatnonzero(
+            (data_matrix >= GridVals.ANT0) &
+            (data_matrix <= GridVals.ANT270))[0]
+        self.__start_heading = (
+            data_matrix.flat[self.__start_pos] - GridVals.ANT0)
+
+        self.__food_init  = ((data_matrix == GridVals.FOOD) |
+            (data_matrix == GridVals.END))
+        self.__food_total = agent_trail.getFoodStats()[1]
+
+        self.reset()
+
+    def reset(self):
+        """ Puts every agent back at the start of a full trail.
+        """
+        self.__food = np.repeat(
+            self.__food_init[np.newaxis], self.__count, axis=0)
+        self.__food_flat = self.__food.reshape(self.__count, -1)
+
+        self.__pos     = np.repeat(self.__start_pos, self.__count)
+        self.__heading = np.repeat(self.__start_heading, self.__count)
+
+        self.__food_consumed = np.zeros(self.__count, dtype=int)
+
+        # Count of moves made, one column per move code.
+        self.__moves = np.zeros((self.__count, 4), dtype=int)
+
+    def run(self, determine_moves, moves):
+        """ Moves every agent until it has eaten all the food or used up
+        its moves.
+
+        Args:
+            determine_moves: Called with the food ahead of each agent and a
+                mask of agents still looking for food. Returns an array
+                with the move code for every agent.
+            moves (int): Maximum moves for each agent.
+        """
+        for _ in xrange(moves):
+            # Agents that collected all of the food are done.
+            active = self.__food_consumed != self.__food_total
+            if not active.any():
+                break
+
+            self.applyMoves(
+                determine_moves(self.isFoodAhead(), active), active)
+
+    def applyMoves(self, moves, active):
+        """ Applies a move to each active agent.
+
+        Args:
+            moves (numpy.ndarray): Move code for each agent::
+
+                0 -- No operation
+                1 -- Turn left
+                2 -- Turn right
+                3 -- Move forward
+
+            active (numpy.ndarray): Mask of agents that make a move.
+        """
+        rows  = self.__rows[active]
+        moves = np.asarray(moves)[active]
+
+        self.__moves[rows, moves] += 1
+
+        self.__heading[rows] = (self.__heading[rows] +
+            self.__HEADING_DELTA[moves]) % 4
+
+        rows = rows[moves == 3]
+        pos  = self.__ahead[self.__heading[rows], self.__pos[rows]]
+
+        self.__food_consumed[rows] += self.__food_flat[rows, pos]
+        self.__food_flat[rows, pos] = False
+        self.__pos[rows] = pos
+
+    def isFoodAhead(self):
+        """ Determines if there is food in front of each agent.
+
+        Returns:
+            numpy.ndarray. True where the square ahead of the agent has food.
+        """
+        return self.__food_flat[self.__rows,
+            self.__ahead[self.__heading, self.__pos]]
+
+    def getFoodConsumed(self):
+        """ Returns the amount of food consumed by each agent.
+
+        Returns:
+            numpy.ndarray. Amount of food consumed.
+        """
+        return self.__food_consumed.copy()
+
+    def getNumMoves(self):
+        """ Returns the number of moves each agent has made.
+
+        Returns:
+            numpy.ndarray. Number of moves that each agent has made.
+        """
+        return self.__moves.sum(axis=1)
+
+    def getMovesStats(self):
+        """ Returns a dictionary with a count of types of moves made.
+
+        Returns:
+            dict. With keys "left", "right", "forward", "none" with an
+            array of move counts.
+        """
+        return {
+            "left"    : self.__moves[:, 1].copy(),
+            "right"   : self.__moves[:, 2].copy(),
+            "forward" : self.__moves[:, 3].copy(),
+            "none"    : self.__moves[:, 0].copy()
+        }
+
+    def getFoodStats(self):
+        """ Returns the current statistics on the agents' food.
+
+        Returns:
+            list. Food consumed, food remaining (arrays).
+        """
+        return (self.__food_consumed.copy(),
+            self.__food_total - self.__food_consumed)
+
+    def getFoodGrid(self):
+        """ Returns the food left for every agent.
+
+        Returns:
+            numpy.ndarray. (population, height, width) array, True where
+            food remains.
+        """
+        return self.__food.copy()
+
+    def getName(self):
+        """ Returns the friendly name of this trail.
+
+        Returns:
+            str. Friendly name of the trail.
+        """
+        return self.__trail_name
+
+    def __len__(self):
+        return self.__count
@@ -1,5 +1,6 @@
 from pybrain.structure import FeedForwardNetwork, RecurrentNetwork
 from pybrain.structure import LinearLayer, SigmoidLayer, FullConnection
+from pybrain.structure import BiasUnit
 
 import numpy as np
 import re
@@ -10,14 +11,24 @@ except:
     import pickle
 
 from ..chemistry import DelayLine
+from ..chemistry import DelayLineBatch
 from ..DBUtils import DBUtils
 
 class network(object):
+    # Network inputs for food ahead and no food ahead.
+    __FOOD_AHEAD    = np.array([1.0, 0.0])
+    __NO_FOOD_AHEAD = np.array([0.0, 1.0])
+
     def __init__(self, debug=False):
         self.__params_length = 0
         self.__chem_network = False
         self.__delay_line = None
         self.__dl_length = 0
+        self.__compiled = None
+        self.__pop_delay_line = None
+        self.__dl_cache = None
+        self.__dl_integrator = "odeint"
+        self.__pop_networks = []
         self.network = None
 
         self.__DEBUG = debug
@@ -33,6 +44,11 @@ class network(object):
         self.network = pgdb.getNetworkByID(network_id)
         self.__process_network()
 
+    def readNetworkInstant(self, pybrain_network):
+        """ Uses an already built PyBrain network."""
+        self.network = pybrain_network
+        self.__process_network()
+
     def __process_network(self):
         """ Examines the network and configures the class for using it.
         """
@@ -57,6 +73,26 @@ class network(object):
             print "DEBUG: Paramters are length {0}.".format(
                 self.__params_length)
 
+        # Use the native forward pass when the network allows it and fall
+        # back on PyBrain otherwise.
+        try:
+            self.__compiled = compiled_network(self.network)
+        except ValueError as e:
+            self.__compiled = None
+            if self.__DEBUG:
+                print "DEBUG: Network is NOT compiled: {0}".format(e)
+
+    def activate(self, nn_input):
+        """ Activates the neural network with one input.
+
+        Returns:
+            numpy.ndarray. Values of the network outputs.
+        """
+        if self.__compiled is not None:
+            return self.__compiled.activate(nn_input).copy()
+        else:
+            return self.network.activate(nn_input)
+
     def determineMove(self, trailAhead):
         """ Returns the move the agent should make.
 
@@ -83,19 +119,50 @@ class network(object):
             for curr_x in chem_res:
                 nn_input.append(curr_x)
                 nn_input.append(1 - curr_x)
-
-            result = self.network.activate(nn_input)
         else:
             if trailAhead == True:
-                result = self.network.activate([1, 0])
+                nn_input = self.__FOOD_AHEAD
             else:
-                result = self.network.activate([0, 1])
+                nn_input = self.__NO_FOOD_AHEAD
+
+        if self.__compiled is not None:
+            result = self.__compiled.activate(nn_input)
+        else:
+            result = self.network.activate(nn_input)
 
         if (len(result) == 3):
             return (np.argmax(result) + 1)
         else:
             return np.argmax(result)
 
+    def setDelayLineCache(self, cache):
+        """ Shares a cache of delay line responses between every delay line
+        this network creates. Only used by chemical networks.
+
+        Args:
+            cache (DelayLineCache): Cache to use or None for no cache.
+        """
+        self.__dl_cache = cache
+
+    def getDelayLineCache(self):
+        """ Returns the cache of delay line responses or None.
+        """
+        return self.__dl_cache
+
+    def setDelayLineIntegrator(self, integrator):
+        """ Selects how delay lines created from now on are integrated.
+        Only used by chemical networks.
+
+        Args:
+            integrator (str): One of DelayLine.INTEGRATORS.
+        """
+        if integrator not in DelayLine.INTEGRATORS:
+            raise ValueError(
+                "Integrator ({0}) must be one of {1}.".format(
+                    integrator, DelayLine.INTEGRATORS))
+
+        self.__dl_integrator = integrator
+
     def updateParameters(self, new_params):
         if self.__chem_network:
             # Create the chemistry delay line and pass the rest
@@ -103,11 +170,101 @@ class network(object):
             self.__delay_line = DelayLine(
                 rate_constants=abs(np.reshape(
                     new_params[-3 * self.__dl_length:],(self.__dl_length,3))),
-                user_interactive=False)
+                user_interactive=False,
+                integrator=self.__dl_integrator,
+                cache=self.__dl_cache)
+
+            nn_params = new_params[:-3 * self.__dl_length]
+        else:
+            nn_params = new_params
+
+        self.network._setParameters(nn_params)
+        self.network.reset()
+
+        if self.__compiled is not None:
+            self.__compiled.setParameters(nn_params)
+
+    def updatePopulationParameters(self, new_params):
+        """ Sets up the network for a whole population at once.
+
+        Each individual gets its own copy of the weights and recurrent state
+        for use with determinePopulationMoves.
+
+        Args:
+            new_params (numpy.ndarray): (population, params length) array
+                with one individual per row.
+        """
+        new_params = np.atleast_2d(np.asarray(new_params, dtype=float))
+
+        if self.__chem_network:
+            self.__pop_delay_line = DelayLineBatch(
+                rate_constants=abs(np.reshape(
+                    new_params[:, -3 * self.__dl_length:],
+                    (len(new_params), self.__dl_length, 3))),
+                integrator=self.__dl_integrator,
+                cache=self.__dl_cache)
+
+            nn_params = new_params[:, :-3 * self.__dl_length]
+        else:
+            nn_params = new_params
+
+        if self.__compiled is not None:
+            self.__compiled.setPopulationParameters(nn_params)
+        else:
+            # Without a native forward pass every individual needs its own
+            # PyBrain network.
+            net_pickle = pickle.dumps(self.network, pickle.HIGHEST_PROTOCOL)
+            self.__pop_networks = []
+            for row in nn_params:
+                pop_net = pickle.loads(net_pickle)
+                pop_net._setParameters(row)
+                pop_net.reset()
+                self.__pop_networks.append(pop_net)
+
+    def determinePopulationMoves(self, trailAhead, active=None):
+        """ Returns the move each individual's agent should make.
+
+        Args:
+            trailAhead (numpy.ndarray): True where there is trail/food ahead
+                of the agent.
+            active (numpy.ndarray): Optional mask of the agents still
+                moving. Others get move 0.
+
+        Returns:
+            numpy.ndarray. The next move for each agent, using the codes of
+            determineMove.
+        """
+        trailAhead = np.asarray(trailAhead, dtype=bool)
+
+        if active is None:
+            active = np.ones(len(trailAhead), dtype=bool)
+
+        if self.__chem_network:
+            chem_res = self.__pop_delay_line.evaluate(
+                trailAhead.astype(int), active)
+
+            nn_input = np.empty((len(trailAhead), 2 * self.__dl_length))
+            nn_input[:, 0::2] = chem_res
+            nn_input[:, 1::2] = 1 - chem_res
+        else:
+            nn_input = np.where(trailAhead[:, np.newaxis],
+                self.__FOOD_AHEAD, self.__NO_FOOD_AHEAD)
+
+        if self.__compiled is not None:
+            result = self.__compiled.activatePopulation(nn_input)
+        else:
+            result = np.zeros((len(trailAhead), self.network.outdim))
+            for idx in np.flatnonzero(active):
+                result[idx] = self.__pop_networks[idx].activate(nn_input[idx])
 
-            self.network._setParameters(new_params[:-3 * self.__dl_length])
+        if result.shape[1] == 3:
+            moves = np.argmax(result, axis=1) + 1
         else:
-            self.network._setParameters(new_params)
+            moves = np.argmax(result, axis=1)
+
+        moves[~active] = 0
+
+        return moves
 
     @staticmethod
     def createJeffersonStyleNetwork(
@@ -254,3 +411,288 @@ class network(object):
             name=name)
 
         return ret_net
+
+
+class compiled_network(object):
+    """ Runs a PyBrain network as plain weight matrices.
+
+    Handles networks made of linear, sigmoid and bias modules joined by
+    full connections, which covers every network built by the network
+    class. The linear parts of the network are folded together, leaving a
+    matrix for each sigmoid module, one for the outputs and one for the
+    recurrent state. Each step is then a few matrix products on a state
+    vector laid out as::
+
+        [1, inputs, recurrent module outputs of the last step, sigmoid outputs]
+
+    and gives the same outputs as activate() on the PyBrain network.
+    """
+
+    def __init__(self, pybrain_network):
+        pybrain_network.sortModules()
+
+        modules = pybrain_network.modulesSorted
+        mod_idx = dict((id(m), idx) for idx, m in enumerate(modules))
+
+        self.__kinds = []
+        for m in modules:
+            if type(m) is LinearLayer:
+                self.__kinds.append("linear")
+            elif type(m) is SigmoidLayer:
+                self.__kinds.append("sigmoid")
+            elif type(m) is BiasUnit:
+                self.__kinds.append("bias")
+            else:
+                raise ValueError(
+                    "Module {0} is not supported.".format(m.name))
+
+        self.__indims  = [m.indim for m in modules]
+        self.__outdims = [m.outdim for m in modules]
+
+        # Find where each connection's weights sit in the parameters, in
+        # the order PyBrain's _setParameters hands them out.
+        param_start = {}
+        index = 0
+        for pc in pybrain_network._containerIterator():
+            if type(pc) is not FullConnection:
+                raise ValueError(
+                    "Parameters of {0} are not supported.".format(pc.name))
+            param_start[id(pc)] = index
+            index += pc.paramdim
+
+        self.params_length = index
+
+        def conn_info(c):
+            if type(c) is not FullConnection:
+                raise ValueError(
+                    "Connection {0} is not supported.".format(c.name))
+            return (
+                mod_idx[id(c.inmod)], c.inSliceFrom, c.inSliceTo,
+                mod_idx[id(c.outmod)], c.outSliceFrom, c.outSliceTo,
+                param_start[id(c)], param_start[id(c)] + c.paramdim)
+
+        self.__conns = [
+            [conn_info(c) for c in pybrain_network.connections[m]]
+            for m in modules]
+        self.__rec_conns = [conn_info(c)
+            for c in getattr(pybrain_network, "recurrentConns", [])]
+
+        # Lay out the state vector.
+        offset = 1
+
+        self.__inputs = []
+        for m in pybrain_network.inmodules:
+            self.__inputs.append((mod_idx[id(m)], offset))
+            offset += m.indim
+        self.__in_slice = (1, offset)
+
+        self.__rec_mods = []
+        self.__rec_offsets = {}
+        for conn in self.__rec_conns:
+            if conn[0] not in self.__rec_offsets:
+                self.__rec_mods.append(conn[0])
+                self.__rec_offsets[conn[0]] = offset
+                offset += self.__outdims[conn[0]]
+        self.__rec_slice = (self.__in_slice[1], offset)
+
+        self.__stage_offsets = {}
+        self.__stage_slices = []
+        for idx, kind in enumerate(self.__kinds):
+            if kind == "sigmoid":
+                self.__stage_offsets[idx] = offset
+                self.__stage_slices.append(
+                    (offset, offset + self.__outdims[idx]))
+                offset += self.__outdims[idx]
+
+        self.__zdim = offset
+
+        self.__outputs = [mod_idx[id(m)] for m in pybrain_network.outmodules]
+
+        self.indim  = self.__in_slice[1] - self.__in_slice[0]
+        self.outdim = sum(self.__outdims[idx] for idx in self.__outputs)
+
+        # Preallocated buffers for stepping the network.
+        self.__z = np.zeros(self.__zdim)
+        self.__stage_bufs = [np.zeros(stop - start)
+            for start, stop in self.__stage_slices]
+        self.__out_buf = np.zeros(self.outdim)
+        self.__rec_buf = np.zeros(self.__rec_slice[1] - self.__rec_slice[0])
+
+        self.setParameters(pybrain_network.params)
+        self.setPopulationParameters(np.zeros((0, self.params_length)))
+
+    def weights(self, params):
+        """ Builds the network matrices for each row of parameters.
+
+        Args:
+            params (numpy.ndarray): (count, params_length) parameters.
+
+        Returns:
+            tuple. List of matrices for each sigmoid module, the output
+            matrix and the recurrent state matrix. Each has a leading axis
+            of length count and acts on the state vector.
+        """
+        params = np.atleast_2d(np.asarray(params, dtype=float))
+        count  = params.shape[0]
+        zdim   = self.__zdim
+
+        # Express the input and output of every module as a linear map of
+        # the state vector.
+        in_expr  = [np.zeros((count, dim, zdim)) for dim in self.__indims]
+        out_expr = [None] * len(self.__kinds)
+
+        def conn_weight(conn):
+            (_, in_from, in_to, _, out_from, out_to, start, stop) = conn
+            return params[:, start:stop].reshape(
+                count, out_to - out_from, in_to - in_from)
+
+        for idx, offset in self.__inputs:
+            in_expr[idx][:, :, offset:offset + self.__indims[idx]] += (
+                np.eye(self.__indims[idx]))
+
+        for conn in self.__rec_conns:
+            (in_idx, in_from, in_to, out_idx, out_from, out_to, _, _) = conn
+            offset = self.__rec_offsets[in_idx]
+            in_expr[out_idx][:, out_from:out_to,
+                offset + in_from:offset + in_to] += conn_weight(conn)
+
+        stages = []
+        for idx, kind in enumerate(self.__kinds):
+            if kind == "linear":
+                out_expr[idx] = in_expr[idx]
+            elif kind == "sigmoid":
+                stages.append(in_expr[idx])
+                offset = self.__stage_offsets[idx]
+                out_expr[idx] = np.zeros((count, self.__outdims[idx], zdim))
+                out_expr[idx][:, :, offset:offset + self.__outdims[idx]] = (
+                    np.eye(self.__outdims[idx]))
+            else:
+                out_expr[idx] = np.zeros((count, self.__outdims[idx], zdim))
+                out_expr[idx][:, :, 0] = 1.0
+
+            for conn in self.__conns[idx]:
+                (_, in_from, in_to, out_idx, out_from, out_to, _, _) = conn
+                in_expr[out_idx][:, out_from:out_to, :] += np.einsum(
+                    "pij,pjk->pik",
+                    conn_weight(conn),
+                    out_expr[idx][:, in_from:in_to, :])
+
+        out_weight = np.concatenate(
+            [out_expr[idx] for idx in self.__outputs], axis=1)
+
+        if self.__rec_mods:
+            rec_weight = np.concatenate(
+                [out_expr[idx] for idx in self.__rec_mods], axis=1)
+        else:
+            rec_weight = np.zeros((count, 0, zdim))
+
+        return stages, out_weight, rec_weight
+
+    def setParameters(self, params):
+        """ Sets the parameters of the network and resets its state.
+        """
+        stages, out_weight, rec_weight = self.weights(params)
+
+        self.__stage_weights = [w[0] for w in stages]
+        self.__out_weight = out_weight[0]
+        self.__rec_weight = rec_weight[0]
+
+        self.reset()
+
+    def reset(self):
+        """ Clears the recurrent state of the network.
+        """
+        self.__z.fill(0.0)
+        self.__z[0] = 1.0
+
+    def activate(self, inpt):
+        """ Steps the network with one input.
+
+        Returns:
+            numpy.ndarray. Values of the outputs, overwritten by the next
+            call.
+        """
+        z = self.__z
+        z[self.__in_slice[0]:self.__in_slice[1]] = inpt
+
+        for (start, stop), weight, buf in zip(self.__stage_slices,
+            self.__stage_weights, self.__stage_bufs):
+            np.dot(weight, z, out=buf)
+            _sigmoid(buf)
+            z[start:stop] = buf
+
+        np.dot(self.__out_weight, z, out=self.__out_buf)
+
+        if len(self.__rec_buf):
+            np.dot(self.__rec_weight, z, out=self.__rec_buf)
+            z[self.__rec_slice[0]:self.__rec_slice[1]] = self.__rec_buf
+
+        return self.__out_buf
+
+    def setPopulationParameters(self, params):
+        """ Sets the parameters for a population, one individual per row,
+        and resets their state.
+        """
+        stages, out_weight, rec_weight = self.weights(params)
+        count = len(out_weight)
+
+        self.__pop_stage_weights = stages
+        self.__pop_out_weight = out_weight
+        self.__pop_rec_weight = rec_weight
+
+        # Preallocated buffers for stepping the population.
+        self.__pop_z = np.zeros((count, self.__zdim))
+        self.__pop_stage_bufs = [np.zeros((count, stop - start))
+            for start, stop in self.__stage_slices]
+        self.__pop_out_buf = np.zeros((count, self.outdim))
+        self.__pop_rec_buf = np.zeros((count, len(self.__rec_buf)))
+
+        self.resetPopulation()
+
+    def resetPopulation(self):
+        """ Clears the recurrent state of every individual.
+        """
+        self.__pop_z.fill(0.0)
+        self.__pop_z[:, 0] = 1.0
+
+    def activatePopulation(self, inpt):
+        """ Steps the network of every individual with one input each.
+
+        Args:
+            inpt (numpy.ndarray): (population, indim) inputs.
+
+        Returns:
+            numpy.ndarray. (population, outdim) values of the outputs,
+            overwritten by the next call.
+        """
+        z = self.__pop_z
+        z[:, self.__in_slice[0]:self.__in_slice[1]] = inpt
+
+        for (start, stop), weight, buf in zip(self.__stage_slices,
+            self.__pop_stage_weights, self.__pop_stage_bufs):
+            np.einsum("pij,pj->pi", weight, z, out=buf)
+            _sigmoid(buf)
+            z[:, start:stop] = buf
+
+        np.einsum("pij,pj->pi", self.__pop_out_weight, z,
+            out=self.__pop_out_buf)
+
+        if len(self.__rec_buf):
+            np.einsum("pij,pj->pi", self.__pop_rec_weight, z,
+                out=self.__pop_rec_buf)
+            z[:, self.__rec_slice[0]:self.__rec_slice[1]] = (
+                self.__pop_rec_buf)
+
+        return self.__pop_out_buf
+
+
+def _sigmoid(x):
+    """ Logistic sigmoid in place, computed as PyBrain's SigmoidLayer does.
+    """
+    np.negative(x, x)
+    np.clip(x, -500, 500, x)
+    np.exp(x, x)
+    x += 1.0
+    np.reciprocal(x, x)
+
+    return x
@@ -19,114 +19,211 @@ class GridVals:
     FULL_LIST = [EMPTY, FOOD, ANT0, ANT90, ANT180, ANT270, OPT, END, HIST]
 
 
-class trail:
+# Lookup table of grid values the agent eats when it steps on them.
+_EDIBLE = bytearray(256)
+_EDIBLE[GridVals.FOOD] = 1
+_EDIBLE[GridVals.END]  = 1
+
+# Tables of the square ahead keyed by trail dimensions (width, height).
+_AHEAD_TABLES = {}
+
+
+def _ahead_tables(width, height):
+    """ Returns the square ahead of every square for each heading.
+
+    Squares are flat indexes into a row-major grid and the trail wraps
+    around at its edges. Headings are ordered 0, 90, 180, 270 degrees
+    (up, right, down, left). Tables are shared between trails of the
+    same size.
+
+    Returns:
+        tuple. Four tuples of flat indexes, one per heading.
+    """
+    key = (width, height)
+
+    if key not in _AHEAD_TABLES:
+        up, right, down, left = [], [], [], []
+        for y in xrange(height):
+            for x in xrange(width):
+                up.append(((y - 1) % height) * width + x)
+                right.append(y * width + (x + 1) % width)
+                down.append(((y + 1) % height) * width + x)
+                left.append(y * width + (x - 1) % width)
+
+        _AHEAD_TABLES[key] = (
+            tuple(up), tuple(right), tuple(down), tuple(left))
+
+    return _AHEAD_TABLES[key]
+
+
+class trail(object):
     """ Class to handle the trail for the agent to move through.
+
+    The grid is kept as a flat bytearray in row-major order and the square
+    ahead of every position is precomputed for each heading, so each move
+    is a couple of sequence lookups rather than matrix indexing. The state
+    the trail was read in with is kept so reset() can start over without
+    reading the trail again.
     """
     # Constants
     ROTATE_ANGLE = 90
     ROTATE_MAX   = 360 - 1
 
+    __slots__ = (
+        "__grid",
+        "__trail_name",
+        "__maxX",
+        "__maxY",
+        "__food_total",
+        "__ahead",
+        "__ahead_curr",
+        "__heading",
+        "__curr_agent",
+        "__curr_pos",
+        "__food_consumed",
+        "__moves_left",
+        "__moves_right",
+        "__moves_forward",
+        "__moves_none",
+        "__init_grid",
+        "__init_pos",
+        "__init_heading")
+
     def __init__(self):
         # Properties of the trail
-        self.__data_matrix   = ()
-        self.__rotation      = 0
+        self.__grid          = bytearray()
         self.__trail_name    = ""
         self.__maxX          = 0
         self.__maxY          = 0
         self.__food_total    = 0
+        self.__ahead         = ((), (), (), ())
+        self.__ahead_curr    = ()
 
         # Properties of the agent
+        self.__heading       = 0
         self.__curr_agent    = GridVals.ANT0
-        self.__currX         = 0
-        self.__currY         = 0
+        self.__curr_pos      = 0
         self.__food_consumed = 0
 
-        self.__moves            = {}
-        self.__moves["left"]    = 0
-        self.__moves["right"]   = 0
-        self.__moves["forward"] = 0
-        self.__moves["none"]    = 0
+        self.__moves_left    = 0
+        self.__moves_right   = 0
+        self.__moves_forward = 0
+        self.__moves_none    = 0
+
+        # Initial state of the trail and agent.
+        self.__init_grid     = ""
+        self.__init_pos      = 0
+        self.__init_heading  = 0
+
+    def __getstate__(self):
+        return {
+            "grid"          : str(self.__grid),
+            "trail_name"    : self.__trail_name,
+            "maxX"          : self.__maxX,
+            "maxY"          : self.__maxY,
+            "food_total"    : self.__food_total,
+            "heading"       : self.__heading,
+            "curr_pos"      : self.__curr_pos,
+            "food_consumed" : self.__food_consumed,
+            "moves"         : self.getMovesStats(),
+            "init_grid"     : self.__init_grid,
+            "init_pos"      : self.__init_pos,
+            "init_heading"  : self.__init_heading
+        }
+
+    def __setstate__(self, state):
+        self.__grid          = bytearray(state["grid"])
+        self.__trail_name    = state["trail_name"]
+        self.__maxX          = state["maxX"]
+        self.__maxY          = state["maxY"]
+        self.__food_total    = state["food_total"]
+        self.__ahead         = _ahead_tables(self.__maxX + 1, self.__maxY + 1)
+        self.__curr_pos      = state["curr_pos"]
+        self.__food_consumed = state["food_consumed"]
+
+        self.__moves_left    = state["moves"]["left"]
+        self.__moves_right   = state["moves"]["right"]
+        self.__moves_forward = state["moves"]["forward"]
+        self.__moves_none    = state["moves"]["none"]
+
+        self.__init_grid     = state["init_grid"]
+        self.__init_pos      = state["init_pos"]
+        self.__init_heading  = state["init_heading"]
+
+        self.__setHeading(state["heading"])
+
+    def copy(self):
+        """ Returns a copy of the trail that moves independently of this one.
+
+        Only the grid is copied; the move tables are shared.
+        """
+        ret_trail = trail.__new__(trail)
 
+        for attr in self.__slots__:
+            attr = "_trail" + attr
+            setattr(ret_trail, attr, getattr(self, attr))
 
-    def readTrail(self, trail_num, db_config_file):
-        pgdb = DBUtils(config_file=db_config_file)
+        ret_trail.__grid = bytearray(self.__grid)
 
-        (self.__data_matrix,
-        self.__trail_name,
-        self.__rotation) = pgdb.getTrailData(trail_num)
+        return ret_trail
 
-        # Get the count of types of things in the maze.
-        elem_count = np.bincount(np.ravel(self.__data_matrix))
-        self.__food_total  = elem_count[GridVals.FOOD]
+    def reset(self):
+        """ Puts the agent back at the start of the trail as it was read in.
 
-        if self.__food_total < 1:
-            print "WARNING: This trail has no food in it!"
+        The grid is restored with a single buffer copy.
+        """
+        self.__grid[:]       = self.__init_grid
+        self.__curr_pos      = self.__init_pos
+        self.__food_consumed = 0
 
-        self.__maxY, self.__maxX = self.__data_matrix.shape
-        self.__maxX            = self.__maxX - 1
-        self.__maxY            = self.__maxY - 1
+        self.__moves_left    = 0
+        self.__moves_right   = 0
+        self.__moves_forward = 0
+        self.__moves_none    = 0
 
-        self.__updateAgentPos()
+        self.__setHeading(self.__init_heading)
 
-        # Determine the ant's current type and position
-        self.__updateAgentRotType()
+    def readTrail(self, trail_num, db_config_file):
+        pgdb = DBUtils(config_file=db_config_file)
 
+        self.__loadTrail(*pgdb.getTrailData(trail_num))
 
     def readTrailInstant(self, trail_m, trail_s, rot_i):
-        self.__data_matrix = np.matrix(trail_m)
-        self.__trail_name  = trail_s
-        self.__rotation    = rot_i
-
-        # Get the count of types of things in the maze.
-        elem_count = np.bincount(np.ravel(self.__data_matrix))
-        self.__food_total  = elem_count[GridVals.FOOD]
-
-        if self.__food_total < 1:
-            print "WARNING: This trail has no food in it!"
-
-        self.__maxY, self.__maxX = self.__data_matrix.shape
-        self.__maxX            = self.__maxX - 1
-        self.__maxY            = self.__maxY - 1
-
-        self.__updateAgentPos()
-
-        # Determine the ant's current type and position
-        self.__updateAgentRotType()
-
+        self.__loadTrail(trail_m, trail_s, rot_i)
 
     def moveForward(self):
         """ Moves the agent forward a square relative to its current position.
         """
-        if self.__rotation == 0:
-            self.__moveUp()
-        elif self.__rotation == 90:
-            self.__moveRight()
-        elif self.__rotation == 180:
-            self.__moveDown()
-        elif self.__rotation == 270:
-            self.__moveLeft()
+        grid = self.__grid
+
+        grid[self.__curr_pos] = GridVals.HIST
+
+        # Move has occurred. Now, check if the ant consumed food at the
+        # new spot and set the agent to this position.
+        self.__curr_pos = self.__ahead_curr[self.__curr_pos]
+        self.__food_consumed += _EDIBLE[grid[self.__curr_pos]]
+        grid[self.__curr_pos] = self.__curr_agent
 
-        self.__moves["forward"] += 1
+        self.__moves_forward += 1
 
     def turnLeft(self):
         """ Rotates the agent 90 degrees left.
         """
-        self.__rotateAgent(self.__rotation - self.ROTATE_ANGLE)
-
-        self.__moves["left"] += 1
+        self.__setHeading((self.__heading - 1) % 4)
 
+        self.__moves_left += 1
 
     def turnRight(self):
         """ Rotates the agent 90 degrees right.
         """
-        self.__rotateAgent(self.__rotation + self.ROTATE_ANGLE)
+        self.__setHeading((self.__heading + 1) % 4)
 
-        self.__moves["right"] += 1
+        self.__moves_right += 1
 
     def noMove(self):
         """ Does not move the agent. Just increments the number of moves taken.
         """
-        self.__moves["none"] += 1
+        self.__moves_none += 1
 
     def getFoodConsumed(self):
         """ Returns the amount of food consumed.
@@ -140,15 +237,9 @@ class trail:
         """ Determines if there is food in front of the agent.
 
         Returns:
-            list. X, Y coordinates of the spot in front of the agent.
+            bool. True if the square in front of the agent has food.
         """
-        (xAhead, yAhead) = self.__squareAhead()
-
-        if(self.__data_matrix[yAhead, xAhead] == GridVals.FOOD or
-            self.__data_matrix[yAhead, xAhead] == GridVals.END):
-            return True
-        else:
-            return False
+        return _EDIBLE[self.__grid[self.__ahead_curr[self.__curr_pos]]] == 1
 
     def getNumMoves(self):
         """ Returns the number of moves the agent has made.
@@ -156,7 +247,8 @@ class trail:
         Returns:
             int. Number of moves that agent has made.
         """
-        return sum(self.__moves.values())
+        return (self.__moves_left + self.__moves_right +
+            self.__moves_forward + self.__moves_none)
 
     def getMovesStats(self):
         """ Returns a dictionary with a count of types of moves made.
@@ -164,8 +256,12 @@ class trail:
         Returns:
             dict. With keys "left", "right", "forward", "none" with move count.
         """
-
-        return self.__moves
+        return {
+            "left"    : self.__moves_left,
+            "right"   : self.__moves_right,
+            "forward" : self.__moves_forward,
+            "none"    : self.__moves_none
+        }
 
     def getFoodStats(self):
         """ Returns the current statistics on the agent's food.
@@ -189,147 +285,74 @@ class trail:
         Returns:
             list. X, Y size of the current trail.
         """
-        maxY, maxX = self.__data_matrix.shape
-
-        return (maxX, maxY)
+        return (self.__maxX + 1, self.__maxY + 1)
 
     def getMatrix(self):
-        """ Returns the data matrix.
+        """ Returns a copy of the grid as a data matrix.
         """
-        return self.__data_matrix
+        return np.matrix(
+            np.frombuffer(self.__grid, dtype=np.uint8).reshape(
+                self.__maxY + 1, self.__maxX + 1),
+            dtype=int)
 
-    def __squareAhead(self):
-        """ Determines the square in front of the agent based off present position.
-
-        Returns:
-            list. X, Y coordinates of the square in front of the ant.
+    def __loadTrail(self, trail_m, trail_s, rot_i):
+        """ Loads the trail grid and places the agent on it.
         """
-        newX = self.__currX
-        newY = self.__currY
-
-        # Find the point where the agent would ideally move to.
-        if self.__rotation == 0:
-            newY = newY - 1
-        elif self.__rotation == 90:
-            newX = newX + 1
-        elif self.__rotation == 180:
-            newY = newY + 1
-        elif self.__rotation == 270:
-            newX = newX - 1
-
-        # Check if the agent exceeds the minimums and maximums.
-        if newX > self.__maxX:
-            newX = newX - self.__maxX - 1
-        elif newX < 0:
-            newX = self.__maxX + newX + 1
-        if newY > self.__maxY:
-            newY = newY - self.__maxY - 1
-        elif newY < 0:
-            newY = self.__maxY + newY + 1
-
-        return (newX, newY)
-
-
-    def __moveUp(self):
-        """ Moves the agent up a square.
-        """
-        self.__moveAgent(self.__currX, self.__currY - 1)
-
-    def __moveDown(self):
-        """ Moves the agent down a square.
-        """
-        self.__moveAgent(self.__currX, self.__currY + 1)
-
-    def __moveRight(self):
-        """ Moves the agent right a square.
-        """
-        self.__moveAgent(self.__currX + 1, self.__currY)
-
-    def __moveLeft(self):
-        """ Moves the agent left a square.
-        """
-        self.__moveAgent(self.__currX - 1, self.__currY)
-
-
-    def __moveAgent(self, newX, newY):
-        # Check if at the borders and then move ant.
-        if newX > self.__maxX:
-            newX = newX - self.__maxX - 1
-        elif newX < 0:
-            newX = self.__maxX + newX + 1
-        if newY > self.__maxY:
-            newY = newY - self.__maxY - 1
-        elif newY < 0:
-            newY = self.__maxY + newY + 1
+        data_matrix = np.asarray(trail_m)
 
-        self.__data_matrix[self.__currY, self.__currX] = GridVals.HIST
-
-        self.__currY = newY
-        self.__currX = newX
-
-        # Move has occurred. Now, do steps at new spot.
-
-        # Check if the ant consumed food at the new spot
-        if (self.__data_matrix[self.__currY, self.__currX] == GridVals.FOOD or
-            self.__data_matrix[self.__currY, self.__currX] == GridVals.END):
-            self.__food_consumed = self.__food_consumed + 1
-            self.__data_matrix[self.__currY, self.__currX] = GridVals.EMPTY
-        else:
-            self.__data_matrix[self.__currY, self.__currX] = (
-                self.__data_matrix[self.__currY, self.__currX])
-
-        # Set agent to this position.
-        self.__data_matrix[self.__currY, self.__currX] = self.__curr_agent
+        self.__trail_name = trail_s
 
+        # Get the count of types of things in the maze.
+        elem_count = np.bincount(np.ravel(data_matrix),
+            minlength=GridVals.HIST + 1)
+        self.__food_total  = int(elem_count[GridVals.FOOD])
 
+        if self.__food_total < 1:
+            print "WARNING: This trail has no food in it!"
 
-    def __rotateAgent(self, newRot):
-        while newRot >= self.ROTATE_MAX:
-            newRot = newRot - self.ROTATE_MAX
+        self.__maxY, self.__maxX = data_matrix.shape
+        self.__maxX            = self.__maxX - 1
+        self.__maxY            = self.__maxY - 1
 
-        while newRot < 0:
-            newRot = newRot + self.ROTATE_MAX
+        self.__grid  = bytearray(data_matrix.astype(np.uint8).tostring())
+        self.__ahead = _ahead_tables(self.__maxX + 1, self.__maxY + 1)
 
-        newRot = self.__roundAngle(newRot)
+        self.__updateAgentPos(elem_count)
 
-        self.__rotation = newRot
-        self.__updateAgentRotType()
+        # Determine the ant's current type and position
+        self.__setHeading(int(round(float(rot_i) / self.ROTATE_ANGLE)) % 4)
 
+        self.__food_consumed = 0
+        self.__moves_left    = 0
+        self.__moves_right   = 0
+        self.__moves_forward = 0
+        self.__moves_none    = 0
 
-    def __updateAgentPos(self):
+        self.__init_grid     = str(self.__grid)
+        self.__init_pos      = self.__curr_pos
+        self.__init_heading  = self.__heading
 
-        # Get the count of types of things in the maze.
-        elem_count = np.bincount(np.ravel(self.__data_matrix))
+    def __updateAgentPos(self, elem_count):
 
-        if np.sum(elem_count[2:6] > 1):
+        if np.sum(elem_count[GridVals.ANT0:GridVals.ANT270 + 1] > 1):
             # Big error. We have two agents in maze.
             logging.error("There are two agents in the maze!")
             sys.exit(1)
 
-        if (elem_count[GridVals.ANT0] == 1):
-            currPos = np.where(self.__data_matrix == GridVals.ANT0)
-        elif(elem_count[GridVals.ANT90] == 1):
-            currPos = np.where(self.__data_matrix == GridVals.ANT90)
-        elif(elem_count[GridVals.ANT180] == 1):
-            currPos = np.where(self.__data_matrix == GridVals.ANT180)
-        elif(elem_count[GridVals.ANT270] == 1):
-            currPos = np.where(self.__data_matrix == GridVals.ANT270)
-
-        self.__currY = currPos[0].item(0)
-        self.__currX = currPos[1].item(0)
-
-
-    def __updateAgentRotType(self):
-        if (self.__rotation == 0):
-            self.__curr_agent = GridVals.ANT0
-        elif(self.__rotation == 90):
-            self.__curr_agent = GridVals.ANT90
-        elif(self.__rotation == 180):
-            self.__curr_agent = GridVals.ANT180
-        elif(self.__rotation == 270):
-            self.__curr_agent = GridVals.ANT270
-
-        self.__data_matrix[self.__currY, self.__currX] = self.__curr_agent
-
-    def __roundAngle(self, x, base=ROTATE_ANGLE):
-        return int(base * round(float(x) / base))
+        for agent in [GridVals.ANT0, GridVals.ANT90,
+            GridVals.ANT180, GridVals.ANT270]:
+            if elem_count[agent] == 1:
+                self.__curr_pos = self.__grid.index(chr(agent))
+                break
+        else:
+            logging.error("There is no agent in the maze!")
+            sys.exit(1)
+
+    def __setHeading(self, heading):
+        """ Points the agent at a heading (0 to 3 in 90 degree steps).
+        """
+        self.__heading    = heading
+        self.__ahead_curr = self.__ahead[heading]
+        self.__curr_agent = GridVals.ANT0 + heading
+
+        self.__grid[self.__curr_pos] = self.__curr_agent
@@ -1,10 +1,17 @@
 import argparse
+import hashlib
+import json
 import logging
+import os
+import psycopg2
+import tempfile
 import textwrap
 import sys
+import time
 
 # Local imports
 from DBUtils import DBUtils
+from evaluation import BACKENDS
 
 GENS_DEF        = 200
 P_MUTATE_DEF    = 0.1
@@ -15,16 +22,98 @@ SELECTION_DEF   = 3
 MUTATE_DEF      = 2
 VARIATION_DEF   = 2
 DEF_MEAN_CHANGE = 100
+DEF_MIGRATION_INTERVAL = 10
+DEF_MIGRANTS    = 1
+DEF_CHECKPOINT_GENS = 10
+DEF_CHECKPOINT_SECS = 300
 
 DEF_ERROR_VAL = None
 
+# Seconds the valid ids read from the database are cached on disk.
+ID_CACHE_SECS = 600
+
 class utils:
 
+    @staticmethod
+    def id_cache_path(db_config_file):
+        """ Returns the path of the cache of valid ids for a database
+        configuration file.
+        """
+        return os.path.join(tempfile.gettempdir(),
+            "trail-runner-ids-{0}.json".format(hashlib.sha1(
+                os.path.abspath(db_config_file)).hexdigest()[:12]))
+
+    @staticmethod
+    def get_valid_ids(db_config_file, refresh=False):
+        """ Returns the valid ids of the trails, networks, mutation,
+        selection and variation types. They are read from a cache on disk
+        if it is younger than ID_CACHE_SECS and from the database otherwise,
+        which updates the cache.
+
+        Args:
+            db_config_file (str): Database configuration file.
+            refresh (bool): Reads the ids from the database even if they are
+                cached.
+
+        Returns:
+            dict. Ids like DBUtils.getIDs, or None if the configuration can
+            not be read or there are none cached and the database can not
+            be reached.
+        """
+        cache_path = utils.id_cache_path(db_config_file)
+
+        try:
+            config_mtime = os.path.getmtime(db_config_file)
+        except OSError as e:
+            logging.warning("Could not read the database configuration: "
+                "{0}".format(e))
+            return None
+
+        try:
+            with open(cache_path) as cache_file:
+                cache = json.load(cache_file)
+        except (IOError, ValueError):
+            cache = None
+
+        # The cache is also stale once the configuration changes.
+        if cache is not None and cache["config_mtime"] != config_mtime:
+            cache = None
+
+        if (cache is not None and not refresh and
+            0 <= time.time() - cache["time"] < ID_CACHE_SECS):
+            return cache["ids"]
+
+        try:
+            ids = DBUtils(config_file=db_config_file).getIDs()
+        except (IOError, OSError, ValueError, KeyError,
+            psycopg2.Error) as e:
+            logging.warning("Could not read the valid ids from the "
+                "database: {0}".format(str(e).strip()))
+
+            if cache is not None:
+                return cache["ids"]
+            return None
+
+        try:
+            fd, temp_path = tempfile.mkstemp(
+                dir=os.path.dirname(cache_path),
+                prefix=os.path.basename(cache_path), suffix=".tmp")
+            with os.fdopen(fd, "w") as temp_file:
+                json.dump({
+                    "time"         : time.time(),
+                    "config_mtime" : config_mtime,
+                    "ids"          : ids
+                }, temp_file)
+            os.rename(temp_path, cache_path)
+        except (IOError, OSError) as e:
+            logging.warning("Could not cache the valid ids: {0}".format(e))
+
+        return ids
+
     @staticmethod
     def parse_args(db_config_file):
-        # Query the database to gather some items for argument output.
-        pgdb = DBUtils(config_file=db_config_file)
-        valid_db_opts = pgdb.getIDs()
+        # Ids are checked against the database after parsing, so --help
+        # and the other checks work without it.
 
         # Parse the arguments
         parser = argparse.ArgumentParser(
@@ -34,8 +123,7 @@ class utils:
 
         parser.add_argument("trail", type=int,
             metavar='trail',
-            help="Trail to use.",
-            choices=valid_db_opts["trail"])
+            help="Trail to use.")
         parser.add_argument("population", type=int,
             metavar="mu",
             help="Size of the population. Serves as mu "
@@ -52,13 +140,18 @@ class utils:
         parser.add_argument("network", type=int,
             metavar='network',
             nargs='*',
-            help=textwrap.dedent("Network type to use."),
-            choices=valid_db_opts["network"])
+            help=textwrap.dedent("Network type to use."))
 
         group = parser.add_argument_group('Application Options')
         group.add_argument("--disable-db",
             action='store_true',
             help="Disables logging of run to database.")
+        group.add_argument("--spool", default=None,
+            metavar="PATH",
+            help="Records runs in the local SQLite file PATH instead of the "
+            "database.\nUpload them later with sync.py. The trail and "
+            "networks are copied\ninto PATH the first time, after which "
+            "the database is not needed.")
         group.add_argument("--debug",
             action='store_true',
             help="Enables debug messages and flag for data in DB.")
@@ -73,6 +166,73 @@ class utils:
         group.add_argument("--no-early-quit",
             action='store_true',
             help='Disables automatic or early termination.')
+        group.add_argument("--lockstep",
+            action='store_true',
+            help="Steps all agents of a chunk through the trail together "
+            "instead of\nevaluating them one at a time.")
+        group.add_argument("--chunk-size", type=int, default=0,
+            metavar="N",
+            help="Number of individuals evaluated by each task. Sized "
+            "from the number of\nworkers and the measured evaluation "
+            "time by default.")
+        group.add_argument("--backend", default="scoop",
+            choices=BACKENDS,
+            help="Runs evaluations with SCOOP, a pool of local processes or "
+            "serially in\nthis process. Defaults to scoop.")
+        group.add_argument("--processes", type=int, default=None,
+            metavar="N",
+            help="Number of processes of the pool backend. Defaults to the "
+            "number of CPUs.")
+        group.add_argument("--concurrent-runs", type=int, default=1,
+            metavar="N",
+            help="Runs up to N of the repeats of all networks at the same "
+            "time, sending\ntheir evaluations to the workers together. "
+            "Defaults to 1.")
+        group.add_argument("--seed", type=int, default=None,
+            help="Seeds the random number generators so runs can be "
+            "repeated.")
+        group.add_argument("--dl-cache", type=int, default=0,
+            metavar="SIZE",
+            help="Caches up to SIZE delay line responses in each process "
+            "for chemical\nnetworks. Disabled by default.")
+        group.add_argument("--fitness-cache", type=int, default=0,
+            metavar="SIZE",
+            help="Keeps the results of up to SIZE evaluated genomes so "
+            "unchanged\nindividuals are not simulated again. Disabled by "
+            "default.")
+        group.add_argument("--share-fitness-cache",
+            action='store_true',
+            help="Keeps the fitness cache across the repeats of a network.")
+        group.add_argument("--dl-surrogate-gens", type=int, default=0,
+            metavar="N",
+            help="Screens chemical networks with a linear surrogate of the "
+            "delay line for\nthe first N generations. The population is "
+            "then evaluated again with\nthe exact integrator, which is "
+            "always used for the hall of fame.\nGenerations recorded while "
+            "screening hold the surrogate's fitness.")
+        group.add_argument("--dl-prefilter", type=int, default=0,
+            metavar="F",
+            help="Breeds F times as many offspring for chemical networks, "
+            "screens them\nwith the linear surrogate of the delay line and "
+            "evaluates only the best\nwith the exact integrator, so "
+            "recorded results are exact. Disabled by\ndefault.")
+        group.add_argument("--checkpoint-dir", default=None,
+            metavar="DIR",
+            help="Saves the state of each repeat in DIR while it runs so it "
+            "can be\nresumed. Disabled by default.")
+        group.add_argument("--checkpoint-gens", type=int,
+            default=DEF_CHECKPOINT_GENS, metavar="N",
+            help="Saves a checkpoint at least every N generations. "
+            "Defaults to {0}.".format(DEF_CHECKPOINT_GENS))
+        group.add_argument("--checkpoint-secs", type=int,
+            default=DEF_CHECKPOINT_SECS, metavar="T",
+            help="Saves a checkpoint at least every T seconds. "
+            "Defaults to {0}.".format(DEF_CHECKPOINT_SECS))
+        group.add_argument("--resume",
+            action='store_true',
+            help="Continues the repeats saved in the checkpoint directory "
+            "and skips\nthose already recorded. Give the same arguments, "
+            "including --seed, as\nthe run being resumed.")
 
         group = parser.add_argument_group('Genetic Algorithm Configuration')
         group.add_argument("-g", "--generations", type=int, nargs="?",
@@ -80,12 +240,10 @@ class utils:
             help="Number of generations to run for.")
         group.add_argument("--variation", type=int,
             default=VARIATION_DEF,
-            help="Variation type to use in DEAP.",
-            choices=valid_db_opts["variations"])
+            help="Variation type to use in DEAP.")
         group.add_argument("--mutate-type", type=int, nargs="?",
             default=MUTATE_DEF,
-            help="Mutation type.",
-            choices=valid_db_opts["mutate"])
+            help="Mutation type.")
         group.add_argument("--prob-mutate", type=float, nargs="?",
             default=P_MUTATE_DEF,
             help="Probability of a mutation to occur.")
@@ -105,12 +263,45 @@ class utils:
             "consumed. Stops algorithm\nif there is no change for this period "
             "of time. Defaults to {0}.".format(DEF_MEAN_CHANGE))
 
+        group.add_argument("--vectorized",
+            action='store_true',
+            help="Keeps the genomes of a population in one matrix and "
+            "varies them all at\nonce with NumPy. Only for variation "
+            "1 and 5.")
+        group.add_argument("--islands", type=int, default=1,
+            metavar="N",
+            help="Splits the population into N islands that evolve on the "
+            "workers and\nexchange individuals. Disabled by default.")
+        group.add_argument("--migration-interval", type=int,
+            default=DEF_MIGRATION_INTERVAL, metavar="K",
+            help="Generations between migrations of the island model. "
+            "Defaults to {0}.".format(DEF_MIGRATION_INTERVAL))
+        group.add_argument("--migrants", type=int, default=DEF_MIGRANTS,
+            metavar="M",
+            help="Best individuals of each island sent to the next island "
+            "on each\nmigration. Defaults to {0}.".format(DEF_MIGRANTS))
+
+        group.add_argument("--steady-state",
+            action='store_true',
+            help="Keeps evaluations in flight and puts each child in the "
+            "population as\nsoon as it returns instead of evolving whole "
+            "generations. Parents are\npicked at random and a child "
+            "replaces the worst individual if it is\nfitter, so the "
+            "selection type is not used.")
+        group.add_argument("--in-flight", type=int, default=0,
+            metavar="N",
+            help="Children evaluated at a time in steady-state mode. "
+            "Defaults to twice\nthe number of workers.")
+        group.add_argument("--stats-interval", type=int, default=0,
+            metavar="N",
+            help="Evaluations between the generations recorded in "
+            "steady-state mode.\nDefaults to the population size.")
+
         group = parser.add_argument_group('Genetic Algorithm '
             'Selection Configuration')
         group.add_argument("-s", "--selection", type=int,
             default=SELECTION_DEF,
-            help="Selection type to use.",
-            choices=valid_db_opts["selection"])
+            help="Selection type to use.")
         group.add_argument("--tournament-size", type=int,
             default=DEF_ERROR_VAL,
             help="If using tournament selection, the size of the tournament.")
@@ -118,15 +309,188 @@ class utils:
         args = parser.parse_args()
 
         utils.__check_args(args)
+        utils.__check_ids(parser, args, db_config_file)
 
         return args
 
+    @staticmethod
+    def __invalid_ids(args, valid_ids):
+        """ Returns the argument and value of each id that is not valid.
+        """
+        invalid = []
+
+        for key, name, values in [
+            ("trail", "trail", [args.trail]),
+            ("network", "network", args.network),
+            ("variations", "--variation", [args.variation]),
+            ("mutate", "--mutate-type", [args.mutate_type]),
+            ("selection", "-s/--selection", [args.selection])]:
+            for value in values:
+                if value is not None and value not in valid_ids[key]:
+                    invalid.append((name, value, valid_ids[key]))
+
+        return invalid
+
+    @staticmethod
+    def __check_ids(parser, args, db_config_file):
+        valid_ids = utils.get_valid_ids(db_config_file)
+
+        if valid_ids is None:
+            logging.warning("Ids of the arguments were not checked.")
+            return
+
+        if utils.__invalid_ids(args, valid_ids):
+            # Rows may have been added since the ids were cached.
+            valid_ids = utils.get_valid_ids(db_config_file, refresh=True)
+
+        for name, value, choices in utils.__invalid_ids(args, valid_ids):
+            parser.error("argument {0}: invalid choice: {1} "
+                "(choose from {2})".format(name, value,
+                    ", ".join(str(x) for x in choices)))
+
     @staticmethod
     def __check_args(args):
         if args.weight_min > args.weight_max:
             logging.critical("Minimum weight must be greater than max weight.")
             sys.exit(1)
 
+        if args.processes is not None and args.processes < 1:
+            logging.critical("Number of processes must be at least 1.")
+            sys.exit(1)
+
+        if args.concurrent_runs < 1:
+            logging.critical("Number of concurrent runs must be at least 1.")
+            sys.exit(1)
+
+        if args.chunk_size < 0:
+            logging.critical("Chunk size can not be negative.")
+            sys.exit(1)
+
+        if args.dl_cache < 0:
+            logging.critical("Delay line cache size can not be negative.")
+            sys.exit(1)
+
+        if args.fitness_cache < 0:
+            logging.critical("Fitness cache size can not be negative.")
+            sys.exit(1)
+
+        if args.dl_surrogate_gens < 0:
+            logging.critical(
+                "Delay line surrogate generations can not be negative.")
+            sys.exit(1)
+
+        if (args.dl_surrogate_gens > 0 and
+            args.dl_surrogate_gens >= args.generations):
+            logging.critical("Delay line surrogate generations must be "
+                "fewer than the generations.")
+            sys.exit(1)
+
+        if args.dl_prefilter < 0 or args.dl_prefilter == 1:
+            logging.critical("Delay line prefilter must be at least 2 to "
+                "screen any offspring.")
+            sys.exit(1)
+
+        if args.dl_prefilter > 0 and args.dl_surrogate_gens > 0:
+            logging.critical("The delay line prefilter can not be used with "
+                "surrogate generations.")
+            sys.exit(1)
+
+        if args.vectorized and args.variation not in [1, 5]:
+            logging.critical("Variation must be set to varAnd (1/5) "
+                "for vectorized variation.")
+            sys.exit(1)
+
+        if args.mean_check_length < 1:
+            logging.critical("Mean check length must be at least 1.")
+            sys.exit(1)
+
+        if args.islands < 1:
+            logging.critical("Number of islands must be at least 1.")
+            sys.exit(1)
+        elif args.islands > 1:
+            if args.migration_interval < 1:
+                logging.critical("Migration interval must be at least 1.")
+                sys.exit(1)
+
+            if (args.migrants < 0 or
+                args.migrants >= args.population // args.islands):
+                logging.critical("Migrants must be fewer than the "
+                    "individuals of an island.")
+                sys.exit(1)
+
+            if (args.variation not in [1, 5] and
+                args.lambda_ is not DEF_ERROR_VAL and
+                args.lambda_ // args.islands <=
+                    -(-args.population // args.islands)):
+                logging.critical("lambda divided among the islands must be "
+                    "greater than the individuals of an island.")
+                sys.exit(1)
+
+            if (args.fitness_cache > 0 or args.dl_surrogate_gens > 0 or
+                args.dl_prefilter > 0):
+                logging.critical("The fitness cache and delay line "
+                    "surrogate can not be used with islands.")
+                sys.exit(1)
+
+        if args.in_flight < 0 or args.stats_interval < 0:
+            logging.critical("In flight evaluations and statistics "
+                "interval can not be negative.")
+            sys.exit(1)
+
+        if args.steady_state:
+            if args.islands > 1 or args.concurrent_runs > 1:
+                logging.critical("Steady-state mode can not be used with "
+                    "islands or concurrent runs.")
+                sys.exit(1)
+
+            if (args.fitness_cache > 0 or args.dl_surrogate_gens > 0 or
+                args.dl_prefilter > 0):
+                logging.critical("The fitness cache and delay line "
+                    "surrogate can not be used in steady-state mode.")
+                sys.exit(1)
+
+            if args.variation not in [1, 5]:
+                logging.critical("Variation must be set to varAnd (1/5) "
+                    "in steady-state mode.")
+                sys.exit(1)
+
+            if args.prob_mutate <= 0 and args.prob_crossover <= 0:
+                logging.critical("Steady-state mode needs a probability of "
+                    "mutation or crossover.")
+                sys.exit(1)
+
+        if args.spool is not None and args.disable_db:
+            logging.critical("Runs can not be spooled with the database "
+                "disabled.")
+            sys.exit(1)
+
+        if args.checkpoint_dir is not None:
+            if args.dl_cache > 0 and args.lockstep:
+                # Cached responses of delay lines integrated together
+                # depend on what was cached before, which resuming loses.
+                logging.critical("The delay line cache can not be used "
+                    "with checkpoints in lockstep mode.")
+                sys.exit(1)
+
+            if args.checkpoint_gens < 1 or args.checkpoint_secs < 1:
+                logging.critical("Checkpoint generations and seconds "
+                    "must be at least 1.")
+                sys.exit(1)
+
+            if args.islands > 1 or args.steady_state:
+                logging.critical("Checkpoints can not be used with islands "
+                    "or in steady-state mode.")
+                sys.exit(1)
+
+            if not os.path.isdir(args.checkpoint_dir):
+                logging.critical("Checkpoint directory {0} does not "
+                    "exist.".format(args.checkpoint_dir))
+                sys.exit(1)
+        elif args.resume:
+            logging.critical("A checkpoint directory (--checkpoint-dir) "
+                "must be given to resume.")
+            sys.exit(1)
+
         if args.selection == 1 and args.tournament_size == DEF_ERROR_VAL:
             # Tournament selected checking.
             logging.critical("Tournament size (--tournament-size) "
@@ -8,67 +8,76 @@ TRAIL = 5
 CORES = [1, 2, 4, 8]
 GENERATIONS = 100
 
-COMMAND = ("python -m scoop -n {0} ga_runner.py --generation {1} "
+BACKENDS = ["scoop", "pool"]
+
+# Prefix of the command for each backend, given the number of cores.
+LAUNCHERS = {
+    "scoop" : "python -m scoop -n {0} ga_runner.py --backend scoop",
+    "pool"  : "python ga_runner.py --backend pool --processes {0}"
+}
+
+COMMAND = ("{0} --generation {1} "
     "--variation 5 --mutate-type 5 --prob-mutate 1.0 --no-early-quit "
     "--prob-crossover 0.6 --selection 6 --script-mode --mean-check-length 300 "
-    "{2} 100 0 {3} 1")
+    "--seed 1 {2} 100 0 {3} 1")
 
 RUN_ID_RE = "Completed repeat \d* with run ID (\d*)."
 
 results_dict = {}
 
-for core in CORES:
-    results_dict[core] = {}
-
-    for moves in MOVES:
-        results_dict[core][moves] = {}
-
-        cmd = COMMAND.format(core, GENERATIONS, TRAIL, moves)
-        cmd = cmd.split()
+for backend in BACKENDS:
+    results_dict[backend] = {}
 
-        start = datetime.datetime.now()
-        cmd_results = subprocess.check_output(cmd)
-        runtime = datetime.datetime.now() - start
+    for core in CORES:
+        results_dict[backend][core] = {}
 
-        re_res = re.search(RUN_ID_RE, cmd_results)
+        for moves in MOVES:
+            results_dict[backend][core][moves] = {}
 
-        if re_res:
-            run_id = re_res.group(1)
-        else:
-            print "WARNING: No run_id match found!!!!"
-            print cmd_results
-            run_id = 0
+            cmd = COMMAND.format(LAUNCHERS[backend].format(core),
+                GENERATIONS, TRAIL, moves)
+            cmd = cmd.split()
 
-        results_dict[core][moves]["time"] = runtime
-        results_dict[core][moves]["id"] = run_id
+            start = datetime.datetime.now()
+            cmd_results = subprocess.check_output(cmd)
+            runtime = datetime.datetime.now() - start
 
-for ttype in ["time", "id"]:
-    if ttype == "time":
-        table = ["\nTime Results", "-------------"]
-    elif ttype == "id":
-        table = ["\nRun ID Results", "--------------"]
+            re_res = re.search(RUN_ID_RE, cmd_results)
 
-    hdr =  [" Cores \ Moves "]
-    hdr += [ "{0:>10}".format(x) for x in MOVES ]
-    table.append("|" +  " | ".join(hdr) + " |")
-    table.append("|" + "-|-".join(["-" * len(x) for x in hdr]) + "-|")
-
-    for core in sorted(results_dict.keys()):
-        row = [ "{0:>15}".format(core) ]
-
-        for move in sorted(results_dict[core].keys()):
-            if ttype == "time":
-                this_value = int(
-                    round(results_dict[core][move][ttype].total_seconds()))
+            if re_res:
+                run_id = re_res.group(1)
             else:
-                this_value = results_dict[core][move][ttype]
-            row.append("{0:>10}".format(this_value))
-
-        table.append("|" + " | ".join(row) + " |")
-
-    print "\n".join(table)
-
-
-
-
-
+                print "WARNING: No run_id match found!!!!"
+                print cmd_results
+                run_id = 0
+
+            results_dict[backend][core][moves]["time"] = runtime
+            results_dict[backend][core][moves]["id"] = run_id
+
+for backend in BACKENDS:
+    for ttype in ["time", "id"]:
+        if ttype == "time":
+            title = "Time Results ({0})".format(backend)
+        elif ttype == "id":
+            title = "Run ID Results ({0})".format(backend)
+        table = ["\n" + title, "-" * len(title)]
+
+        hdr =  [" Cores \ Moves "]
+        hdr += [ "{0:>10}".format(x) for x in MOVES ]
+        table.append("|" +  " | ".join(hdr) + " |")
+        table.append("|" + "-|-".join(["-" * len(x) for x in hdr]) + "-|")
+
+        for core in sorted(results_dict[backend].keys()):
+            row = [ "{0:>15}".format(core) ]
+
+            for move in sorted(results_dict[backend][core].keys()):
+                if ttype == "time":
+                    this_value = int(round(
+                        results_dict[backend][core][move][ttype].total_seconds()))
+                else:
+                    this_value = results_dict[backend][core][move][ttype]
+                row.append("{0:>10}".format(this_value))
+
+            table.append("|" + " | ".join(row) + " |")
+
+        print "\n".join(table)
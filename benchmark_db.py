@@ -0,0 +1,108 @@
+import datetime
+import numpy as np
+import socket
+
+from GATools.DBUtils import DBUtils
+
+DB_CONFIG_FILE = "config/config.json"
+
+GENERATIONS   = [500, 5000]
+ELITE_LENGTHS = [100, 500]
+REPEATS       = 3
+
+# Existing configuration ids the benchmark runs are recorded against.
+NETWORK = 1
+TRAIL   = 5
+
+METHODS = [("executemany", False), ("copy", True)]
+
+
+def make_run_info():
+    """ Returns the run information of a benchmark run. The runs are
+    recorded with debug set so they can be told apart from real runs.
+    """
+    return {
+        "trails_id"         : TRAIL,
+        "networks_id"       : NETWORK,
+        "selection_id"      : 6,
+        "mutate_id"         : 5,
+        "host_type_id"      : 1,
+        "variations_id"     : 5,
+        "run_date"          : datetime.datetime.now(),
+        "hostname"          : socket.getfqdn(),
+        "generations"       : 1,
+        "population"        : 1,
+        "moves_limit"       : 1,
+        "sel_tourn_size"    : None,
+        "lambda"            : 0,
+        "p_mutate"          : 1.0,
+        "p_crossover"       : 0.5,
+        "weight_min"        : -5.0,
+        "weight_max"        : 5.0,
+        "debug"             : True,
+        "algorithm_ver"     : 2,
+        "mean_check_length" : 1,
+        "runtime"           : datetime.timedelta(seconds=1)
+    }
+
+
+def make_gen_info(generations, elite_length):
+    """ Returns random generation records like ga_runner makes.
+    """
+    gen_info = []
+
+    for gen in range(generations):
+        food = np.random.randint(0, 90, 2)
+        moves = np.random.randint(0, 200, 6)
+
+        gen_info.append({
+            "gen"           : gen,
+            "runtime"       : datetime.timedelta(
+                microseconds=np.random.randint(0, 10**6)),
+            "food_max"      : float(max(food)),
+            "food_min"      : float(min(food)),
+            "food_avg"      : np.random.uniform(0, 90),
+            "food_std"      : np.random.uniform(0, 10),
+            "moves_max"     : float(max(moves[:2])),
+            "moves_min"     : float(min(moves[:2])),
+            "moves_avg"     : np.random.uniform(0, 200),
+            "moves_std"     : np.random.uniform(0, 10),
+            "moves_left"    : int(moves[2]),
+            "moves_right"   : int(moves[3]),
+            "moves_forward" : int(moves[4]),
+            "moves_none"    : int(moves[5]),
+            "elite"         : np.random.uniform(-5, 5,
+                elite_length).tolist()
+        })
+
+    return gen_info
+
+
+pgdb = DBUtils(config_file=DB_CONFIG_FILE)
+
+print "Seconds to record the generations of a run (best of {0}):".format(
+    REPEATS)
+print "{0:>11} {1:>6} {2:>12} {3:>12} {4:>8}".format(
+    "Generations", "Elite", "executemany", "copy", "Speedup")
+
+for generations in GENERATIONS:
+    for elite_length in ELITE_LENGTHS:
+        gen_info = make_gen_info(generations, elite_length)
+        best = {}
+
+        for method, bulk in METHODS:
+            best[method] = None
+
+            for _ in range(REPEATS):
+                pgdb.recordRun(make_run_info(), gen_info, bulk=bulk)
+                seconds = pgdb.getRecordTimes()["generations"]
+
+                if best[method] is None or seconds < best[method]:
+                    best[method] = seconds
+
+        print "{0:>11} {1:>6} {2:>12.3f} {3:>12.3f} {4:>7.1f}x".format(
+            generations,
+            elite_length,
+            best["executemany"],
+            best["copy"],
+            best["executemany"] / max(best["copy"], 1e-9))
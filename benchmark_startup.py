@@ -0,0 +1,88 @@
+import json
+import os
+import psycopg2
+import subprocess
+import sys
+import time
+
+from GATools.DBUtils import DBUtils
+from GATools.utils import utils
+
+DB_CONFIG_FILE = "config/config.json"
+
+REPEATS = 5
+
+# Query getIDs ran before it queried each table on its own.
+CROSS_JOIN = ("SELECT trails.id, networks.id, mutate.id, selection.id, "
+    "variations.id FROM trails, networks, mutate, selection, variations;")
+
+# Arguments of a run on trail 5 with network 1.
+RUN_ARGS = ["ga_runner.py", "5", "40", "0", "200", "1"]
+
+
+def best_time(func):
+    """ Returns the fewest seconds func took in REPEATS calls.
+    """
+    best = None
+
+    for _ in range(REPEATS):
+        start = time.time()
+        func()
+        seconds = time.time() - start
+
+        if best is None or seconds < best:
+            best = seconds
+
+    return best
+
+
+def cross_join():
+    """ Runs the query of the old getIDs on a connection of its own, like
+    parse_args did before.
+    """
+    with open(DB_CONFIG_FILE) as fh:
+        config = json.load(fh)["database"]
+
+    conn = psycopg2.connect(host=config["host"], dbname=config["db"],
+        user=config["user"], port=config["port"],
+        password=config["password"])
+    curs = conn.cursor()
+    curs.execute(CROSS_JOIN)
+    curs.fetchall()
+    conn.close()
+
+
+def clear_cache():
+    cache_path = utils.id_cache_path(DB_CONFIG_FILE)
+
+    if os.path.exists(cache_path):
+        os.remove(cache_path)
+
+
+def parse_args(cold):
+    if cold:
+        clear_cache()
+
+    sys.argv = RUN_ARGS
+    utils.parse_args(DB_CONFIG_FILE)
+
+
+def help_text():
+    with open(os.devnull, "w") as devnull:
+        subprocess.call([sys.executable, "ga_runner.py", "--help"],
+            stdout=devnull, stderr=devnull)
+
+
+steps = [
+    ("Cross join of the old getIDs", cross_join),
+    ("getIDs with a query for each table",
+        lambda: DBUtils(config_file=DB_CONFIG_FILE).getIDs()),
+    ("parse_args with a cold id cache", lambda: parse_args(True)),
+    ("parse_args with a warm id cache", lambda: parse_args(False)),
+    ("ga_runner.py --help", help_text)
+]
+
+print "Seconds of each step of starting up (best of {0}):".format(REPEATS)
+
+for name, func in steps:
+    print "{0:<36} {1:>8.3f}".format(name, best_time(func))
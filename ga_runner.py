@@ -1,27 +1,32 @@
 from collections import Sequence
 import datetime
 from deap import algorithms, base, creator, tools
-from itertools import repeat
+from itertools import count, repeat
 import logging
 import numpy as np
-import os
-try:
-   import cPickle as pickle
-except:
-   import pickle
+import psycopg2
 import random
 import re
-from scipy.stats import mode
-import scoop
 import socket
 import sys
-import tempfile
 
 import time
 
+from GATools.cache import FitnessCache
+from GATools.checkpoint import checkpoint_path
+from GATools.checkpoint import read_checkpoint, write_checkpoint
+from GATools.chemistry import DelayLineCache
+from GATools.trail.batch import trail_batch as AgentTrailBatch
 from GATools.trail.network import network as AgentNetwork
 from GATools.trail.trail import trail as AgentTrail
 from GATools.DBUtils import DBUtils
+from GATools.evaluation import EvaluationBackend
+from GATools.evaluation import load_template, share_template
+from GATools.genome import cx_two_point, matrix_views
+from GATools.genome import mut_flip_bit, mut_gaussian, mut_uniform
+from GATools.replacement import replace_worst
+from GATools.spool import SpoolDB
+from GATools.stats import GenerationStats, RollingWindow
 
 from GATools.utils import utils
 
@@ -34,11 +39,20 @@ except ImportError:
 # Configure DEAP
 creator.create("FitnessMulti", base.Fitness, weights=(1.0,-0.1))
 creator.create("Individual", list, fitness=creator.FitnessMulti)
+creator.create("IndividualArray", np.ndarray, fitness=creator.FitnessMulti)
 
 # Some constants
 P_BIT_MUTATE    = 0.05
 DB_CONFIG_FILE = "config/config.json"
 
+# Arguments that shape how a run evolves. A run is only resumed from a
+# checkpoint saved with the same values.
+CHECKPOINT_ARGS = ["trail", "population", "lambda_", "moves", "generations",
+    "variation", "mutate_type", "prob_mutate", "prob_crossover",
+    "weight_min", "weight_max", "mean_check_length", "no_early_quit",
+    "selection", "tournament_size", "vectorized", "dl_surrogate_gens",
+    "dl_prefilter", "seed"]
+
 def mutUniformFloat(individual, low, up, indpb):
     """Mutate an individual by replacing attributes, with probability *indpb*,
     by a integer uniformly drawn between *low* and *up* inclusively.
@@ -69,13 +83,17 @@ def mutUniformFloat(individual, low, up, indpb):
 
     return individual,
 
-def __singleMazeTask(individual, moves, network, trail,
-    gen=None, record=None):
+def __singleMazeTask(individual, moves, template, dl_integrator="odeint"):
+    """ Evaluates a single individual on the trail.
 
-    start_time = datetime.datetime.now()
+    Returns:
+        tuple. (food consumed, moves made) and the move counts of the agent
+        as returned by trail.getMovesStats().
+    """
+    an, at = load_template(template)
+    at.reset()
 
-    an = pickle.loads(network)
-    at = pickle.loads(trail)
+    an.setDelayLineIntegrator(dl_integrator)
 
     an.updateParameters(individual)
 
@@ -95,32 +113,1221 @@ def __singleMazeTask(individual, moves, network, trail,
         else:
             at.noMove()
 
-    if gen is None:
-        return (at.getFoodConsumed(), at.getNumMoves())
+    return ((at.getFoodConsumed(), at.getNumMoves()), at.getMovesStats())
+
+def __lockstepMazeTask(individuals, moves, template, dl_integrator="odeint"):
+    """ Evaluates a list of individuals together, stepping all of their
+    agents through the trail in lockstep.
+
+    Returns:
+        list. (food consumed, moves made) and the move counts of the agent
+        for each individual, as returned by __singleMazeTask.
+    """
+    an, at = load_template(template)
+    at.reset()
+    an.setDelayLineIntegrator(dl_integrator)
+    an.updatePopulationParameters(np.array(individuals))
+
+    at = AgentTrailBatch(at, len(individuals))
+    at.run(an.determinePopulationMoves, moves)
+
+    moves_stats = dict((key, value.tolist())
+        for key, value in at.getMovesStats().iteritems())
+
+    return [
+        ((food, num_moves), dict((key, value[idx])
+            for key, value in moves_stats.iteritems()))
+        for idx, (food, num_moves) in enumerate(zip(
+            at.getFoodConsumed().tolist(), at.getNumMoves().tolist()))]
+
+def __chunkMazeTask(individuals, moves, template, dl_integrator="odeint"):
+    """ Evaluates a slice of the population one individual at a time.
+
+    Returns:
+        list. Result of __singleMazeTask for each individual.
+    """
+    return [__singleMazeTask(ind, moves, template, dl_integrator)
+        for ind in individuals]
+
+def __assignFitness(individuals, results):
+    """ Sets the fitness of each individual from the results of an
+    evaluation and keeps its move counts on it as move_stats.
+    """
+    for ind, (fit, move_stats) in zip(individuals, results):
+        ind.fitness.values = fit
+        ind.move_stats     = move_stats
+
+def __eliteMoveStats(elite, moves, template, surrogate):
+    """ Returns the move counts of the elite of a generation. When its
+    fitness came from the delay line surrogate it is simulated again with
+    the exact integrator.
+    """
+    if surrogate:
+        return __singleMazeTask(elite, moves, template)[1]
+    else:
+        return elite.move_stats
+
+def __generationRecord(gen, record, elite, move_stats, runtime):
+    """ Builds the record of a generation that is stored with the run.
+
+    Args:
+        gen (int): Generation number, starting at 1.
+        record (dict): Statistics of the population from MultiStatistics.
+        elite (Individual): Best individual of the generation.
+        move_stats (dict): Move counts of the elite.
+        runtime (datetime.timedelta): Time taken by the generation.
+
+    Returns:
+        dict. Record for DBUtils.recordRun.
+    """
+    record_info                  = {}
+    record_info["gen"]           = gen - 1
+    record_info["runtime"]       = runtime
+    record_info["food_max"]      = record["food"]["max"]
+    record_info["food_min"]      = record["food"]["min"]
+    record_info["food_avg"]      = record["food"]["avg"]
+    record_info["food_std"]      = record["food"]["std"]
+    record_info["food_mode"]     = record["food"]["mode"]
+    record_info["moves_max"]     = record["moves"]["max"]
+    record_info["moves_min"]     = record["moves"]["min"]
+    record_info["moves_avg"]     = record["moves"]["avg"]
+    record_info["moves_std"]     = record["moves"]["std"]
+    record_info["moves_mode"]    = record["moves"]["mode"]
+    record_info["moves_left"]    = move_stats["left"]
+    record_info["moves_right"]   = move_stats["right"]
+    record_info["moves_forward"] = move_stats["forward"]
+    record_info["moves_none"]    = move_stats["none"]
+    record_info["elite"]         = np.array(elite).tolist()
+
+    return record_info
+
+def __registerEvaluation(toolbox, args, template, dl_integrator):
+    """ Registers evaluate and evaluate_chunk on the toolbox, with chemical
+    networks using dl_integrator for their delay lines. evaluate_chunk
+    evaluates a slice of the population on a worker.
+    """
+    toolbox.register("evaluate", __singleMazeTask, moves=args.moves,
+        template=template, dl_integrator=dl_integrator)
+    if args.lockstep:
+        toolbox.register("evaluate_chunk", __lockstepMazeTask,
+            moves=args.moves, template=template, dl_integrator=dl_integrator)
+    else:
+        toolbox.register("evaluate_chunk", __chunkMazeTask,
+            moves=args.moves, template=template, dl_integrator=dl_integrator)
+
+def __evaluateRequests(backend, requests, chunk_size):
+    """ Evaluates the individuals requested by several GA instances,
+    sending the chunks of all of them to the backend together.
+
+    Args:
+        backend (EvaluationBackend): Backend running the evaluations.
+        requests (list): evaluate_chunk, individuals, fitness cache (or
+            None) and fitness cache key arguments of each request.
+        chunk_size (int): Individuals in each chunk, or 0 to size them
+            automatically.
+
+    Returns:
+        list. List of results for each request, in order.
+    """
+    lookups = []
+    batches = []
+    for evaluate_chunk, individuals, fitness_cache, key_args in requests:
+        if fitness_cache is not None:
+            lookup = fitness_cache.lookup(individuals, key_args)
+            batches.append((evaluate_chunk, lookup[2].values()))
+        else:
+            lookup = None
+            batches.append((evaluate_chunk, individuals))
+
+        lookups.append(lookup)
+
+    results = backend.mapChunksMany(batches, chunk_size)
+
+    for idx, (request, lookup) in enumerate(zip(requests, lookups)):
+        if lookup is not None:
+            results[idx] = request[2].store(lookup, results[idx])
+
+    return results
+
+def __getRandomState():
+    return random.getstate(), np.random.get_state()
+
+def __setRandomState(state):
+    random.setstate(state[0])
+    np.random.set_state(state[1])
+
+def __ownRandomState(instance, seed):
+    """ Runs a GA instance with random number generators of its own, seeded
+    with seed, so its results do not depend on the instances run alongside
+    it.
+    """
+    state   = None
+    results = None
+
+    while True:
+        outer_state = __getRandomState()
+
+        if state is None:
+            random.seed(seed)
+            np.random.seed(seed)
+        else:
+            __setRandomState(state)
+
+        try:
+            request = instance.send(results)
+        except StopIteration:
+            __setRandomState(outer_state)
+            return
+
+        state = __getRandomState()
+        __setRandomState(outer_state)
+
+        results = yield request
+
+def __runInstances(instances, backend, concurrent_runs, chunk_size):
+    """ Runs GA instances, keeping up to concurrent_runs of them going at
+    once. Every round, the evaluations requested by all running instances
+    are sent to the backend together.
+
+    Args:
+        instances (list): Generators returned by __gaInstance.
+        backend (EvaluationBackend): Backend running the evaluations.
+        concurrent_runs (int): Most instances running at once.
+        chunk_size (int): Individuals in each chunk, or 0 to size them
+            automatically.
+    """
+    waiting = list(reversed(instances))
+    running = []
+
+    while waiting or running:
+        while waiting and len(running) < concurrent_runs:
+            instance = waiting.pop()
+            try:
+                running.append((instance, next(instance)))
+            except StopIteration:
+                # Resumed runs that were already recorded.
+                pass
+
+        results = __evaluateRequests(backend,
+            [request for instance, request in running], chunk_size)
+
+        still_running = []
+        for (instance, request), request_results in zip(running, results):
+            try:
+                still_running.append(
+                    (instance, instance.send(request_results)))
+            except StopIteration:
+                pass
+
+        running = still_running
+
+def __buildToolbox(args, template, network_params_len, dl_integrator):
+    """ Builds the toolbox of a GA run with the operators chosen by the
+    arguments.
+
+    Returns:
+        Toolbox. Toolbox with individuals, evaluation, mate, mutate and
+        select registered.
+    """
+    toolbox = base.Toolbox()
+    toolbox.register("attr_float", random.uniform,
+        a=args.weight_min, b=args.weight_max)
+    toolbox.register("individual", tools.initRepeat, creator.Individual,
+        toolbox.attr_float, n=network_params_len)
+    if args.vectorized:
+        toolbox.register("population", __matrixPopulation, args=args,
+            network_params_len=network_params_len)
     else:
-        this_move_stats = at.getMovesStats()
-
-        record_info                  = {}
-        record_info["gen"]           = gen - 1
-        record_info["runtime"]       = (datetime.datetime.now() -
-                start_time)
-        record_info["food_max"]      = record["food"]["max"]
-        record_info["food_min"]      = record["food"]["min"]
-        record_info["food_avg"]      = record["food"]["avg"]
-        record_info["food_std"]      = record["food"]["std"]
-        record_info["food_mode"]     = record["food"]["mode"]
-        record_info["moves_max"]     = record["moves"]["max"]
-        record_info["moves_min"]     = record["moves"]["min"]
-        record_info["moves_avg"]     = record["moves"]["avg"]
-        record_info["moves_std"]     = record["moves"]["std"]
-        record_info["moves_mode"]    = record["moves"]["mode"]
-        record_info["moves_left"]    = this_move_stats["left"]
-        record_info["moves_right"]   = this_move_stats["right"]
-        record_info["moves_forward"] = this_move_stats["forward"]
-        record_info["moves_none"]    = this_move_stats["none"]
-        record_info["elite"]         = np.array(individual).tolist()
-
-        return (gen, record_info)
+        toolbox.register("population", tools.initRepeat, list,
+            toolbox.individual)
+
+    __registerEvaluation(toolbox, args, template, dl_integrator)
+    toolbox.register("mate", tools.cxTwoPoint)
+    if args.mutate_type == 1:
+        toolbox.register("mutate",
+            tools.mutFlipBit,
+            indpb=P_BIT_MUTATE)
+    elif args.mutate_type == 2:
+        toolbox.register("mutate",
+            mutUniformFloat,
+            low=args.weight_min,
+            up=args.weight_max,
+            indpb=P_BIT_MUTATE)
+    elif args.mutate_type == 3:
+        toolbox.register("mutate",
+            mutUniformFloat,
+            low=args.weight_min,
+            up=args.weight_max,
+            indpb=0.30)
+    elif args.mutate_type == 4:
+        toolbox.register("mutate",
+            mutUniformFloat,
+            low=args.weight_min,
+            up=args.weight_max,
+            indpb=0.10)
+    elif args.mutate_type == 5:
+        toolbox.register("mutate",
+            tools.mutGaussian,
+            mu=0,
+            indpb=0.05)
+    else:
+        print "ERROR: Please selct a valid mutate type!"
+        sys.exit(10)
+
+    if args.selection == 1:
+        # Selection is tournment. Must use argument from user.
+        toolbox.register("select", tools.selTournament,
+            tournsize=args.tournament_size)
+    elif args.selection == 2:
+        toolbox.register("select", tools.selRoulette)
+    elif args.selection == 3:
+        toolbox.register("select", tools.selNSGA2)
+    elif args.selection == 4:
+        toolbox.register("select", tools.selSPEA2)
+    elif args.selection == 5:
+        toolbox.register("select", tools.selRandom)
+    elif args.selection == 6:
+        toolbox.register("select", tools.selBest)
+    elif args.selection == 7:
+        toolbox.register("select", tools.selWorst)
+    elif args.selection == 8:
+        toolbox.register("select", tools.selTournamentDCD)
+    else:
+        print "ERROR: Something is wrong with selection method!"
+        sys.exit(10)
+
+    return toolbox
+
+def __matrixPopulation(n, args, network_params_len):
+    """ Creates a population whose genomes are the rows of one matrix.
+    """
+    return matrix_views(np.random.uniform(args.weight_min, args.weight_max,
+        (n, network_params_len)), creator.IndividualArray,
+        creator.FitnessMulti)
+
+def __varyMatrix(args, population):
+    """ Breeds offspring like variation 5, with the whole population varied
+    at once as the rows of one matrix. Offspring that were not changed
+    keep the fitness and move counts of their parent.
+
+    Returns:
+        list. The offspring, as views of the matrix.
+    """
+    matrix  = np.array(population, dtype=np.float64)
+    changed = cx_two_point(matrix, args.prob_crossover)
+
+    if args.mutate_type == 1:
+        changed |= mut_flip_bit(matrix, args.prob_mutate, P_BIT_MUTATE)
+    elif args.mutate_type == 2:
+        changed |= mut_uniform(matrix, args.prob_mutate,
+            args.weight_min, args.weight_max, P_BIT_MUTATE)
+    elif args.mutate_type == 3:
+        changed |= mut_uniform(matrix, args.prob_mutate,
+            args.weight_min, args.weight_max, 0.30)
+    elif args.mutate_type == 4:
+        changed |= mut_uniform(matrix, args.prob_mutate,
+            args.weight_min, args.weight_max, 0.10)
+    elif args.mutate_type == 5:
+        changed |= mut_gaussian(matrix, args.prob_mutate, 0.05)
+    else:
+        print "ERROR: Please selct a valid mutate type!"
+        sys.exit(10)
+
+    offspring = matrix_views(matrix, creator.IndividualArray,
+        creator.FitnessMulti)
+
+    for ind, parent, ind_changed in zip(offspring, population, changed):
+        if not ind_changed and parent.fitness.valid:
+            ind.fitness.values = parent.fitness.values
+            ind.move_stats     = parent.move_stats
+
+    return offspring
+
+def __varyPopulation(args, toolbox, population, lambda_=None):
+    """ Breeds the offspring of a population with the variation type chosen
+    by the arguments. Offspring that changed have an invalid fitness.
+
+    Args:
+        lambda_ (int): Offspring bred by varOr, the lambda of the arguments
+            if None.
+
+    Returns:
+        list. The offspring.
+    """
+    if args.vectorized:
+        offspring = __varyMatrix(args, population)
+    elif args.variation in [1]:
+        offspring = algorithms.varAnd(population, toolbox,
+            cxpb=args.prob_crossover, mutpb=args.prob_mutate)
+    elif args.variation in [2, 3, 4]:
+        offspring = algorithms.varOr(population, toolbox,
+            lambda_=args.lambda_ if lambda_ is None else lambda_,
+            cxpb=args.prob_crossover, mutpb=args.prob_mutate)
+    elif args.variation in [5]:
+        # Take and modify the varAnd from DEAP.
+        offspring = [toolbox.clone(ind) for ind in population]
+
+        # Apply crossover and mutation on the offspring
+        for i in range(1, len(offspring), 2):
+            if random.random() < args.prob_crossover:
+                offspring[i-1], offspring[i] = toolbox.mate(
+                    offspring[i-1], offspring[i])
+                del (offspring[i-1].fitness.values,
+                    offspring[i].fitness.values)
+
+        for i in range(len(offspring)):
+            if random.random() < args.prob_mutate:
+                if args.mutate_type in [5]:
+                    offspring[i], = toolbox.mutate(
+                        offspring[i],
+                        sigma=np.std(offspring[i]))
+                else:
+                    offspring[i], = toolbox.mutate(
+                        offspring[i], offspring[i])
+                del offspring[i].fitness.values
+
+    else:
+        print ("ERROR: Something is really wrong! " +
+            "Reached an invalid variation type!")
+        sys.exit(5)
+
+    return offspring
+
+def __prefilterOffspring(candidates, count):
+    """ Keeps the count candidates with the best fitness, in the order they
+    were bred so variation pairs them as it would have.
+
+    Returns:
+        list. The kept candidates.
+    """
+    ranked = sorted(range(len(candidates)),
+        key=lambda idx: candidates[idx].fitness, reverse=True)
+
+    return [candidates[idx] for idx in sorted(ranked[:count])]
+
+def __replacePopulation(args, toolbox, population, offspring):
+    """ Replaces the individuals of a population in place with those
+    surviving the variation type chosen by the arguments.
+    """
+    if args.variation in [2, 3]:
+        population[:] = toolbox.select(offspring, len(population))
+    elif args.variation in [4, 5]:
+        population[:] = toolbox.select(offspring + population,
+            len(population))
+    else:
+        population[:] = offspring
+
+def __debugRecord(gen, record):
+    """ Prints the statistics of a generation for debugging.
+    """
+    print "DEBUG: Completed generation {0}.".format(gen)
+    print (
+        "DEBUG: Food (Min / Max / Avg / Std / Mode): "
+              "{0} / {1} / {2} / {3} / {4}".format(
+                record["food"]["min"],
+                record["food"]["max"],
+                record["food"]["avg"],
+                record["food"]["std"],
+                record["food"]["mode"]))
+    print (
+        "DEBUG: Moves (Min / Max / Avg / Std / Mode): "
+              "{0} / {1} / {2} / {3} / {4}".format(
+                record["moves"]["min"],
+                record["moves"]["max"],
+                record["moves"]["avg"],
+                record["moves"]["std"],
+                record["moves"]["mode"]))
+
+def __earlyQuitMessage(args, gen, record, mean_food_window, max_food):
+    """ Checks if it is time to quit if variation is 3. Critera are
+    any of the following:
+     1) All food has been collected.
+     2) Mean has not changed for args.mean_check_length
+     3) Run out of generations (happens without this check)
+
+    Returns:
+        str. Why the run ended early, or an empty string to keep going.
+    """
+    if args.variation in [3, 4, 5] and not args.no_early_quit:
+        if (int(record["food"]["max"]) == int(max_food)):
+            return ("Exited at generation {0} because "
+                "all food was consumed.").format(gen)
+        elif(mean_food_window.isFull() and mean_food_window.std() < 0.1):
+            return ("Exited at generation {0} because "
+                "mean check length has been met.").format(gen)
+
+    return ""
+
+def __runInfo(args, curr_network, log_time):
+    """ Builds the details of a run recorded in the database, without its
+    runtime.
+    """
+    run_info = {}
+
+    run_info["trails_id"]    = args.trail
+    run_info["networks_id"]  = curr_network
+    run_info["selection_id"] = args.selection
+    run_info["mutate_id"]    = args.mutate_type
+    run_info["host_type_id"] = 1 # Only one host type for now.
+    run_info["variations_id"] = args.variation
+    run_info["run_date"]     = log_time
+    run_info["hostname"]     = socket.getfqdn()
+    run_info["generations"]  = args.generations
+    run_info["population"]   = args.population
+    run_info["moves_limit"]  = args.moves
+    run_info["sel_tourn_size"]  = args.tournament_size
+    if args.variation in [1, 5]:
+        run_info["lambda"] = 0
+    else:
+        # Offspring bred each generation across all islands.
+        run_info["lambda"] = args.lambda_ // args.islands * args.islands
+    run_info["p_mutate"]     = args.prob_mutate
+    run_info["p_crossover"]  = args.prob_crossover
+    run_info["weight_min"]   = args.weight_min
+    run_info["weight_max"]   = args.weight_max
+    run_info["debug"]        = args.debug
+    # Version for if anything changes in python GA Algorithm
+    run_info["algorithm_ver"] = 2
+    run_info["mean_check_length"] = args.mean_check_length
+
+    return run_info
+
+def __recordRun(args, pgdb, curr_network, curr_repeat, log_time,
+    repeat_start_time, gens_stat_list, smart_term_msg, summary, writer=None):
+    """ Records a finished run in the database and reports it.
+
+    Args:
+        args (Namespace): Parsed arguments.
+        pgdb (DBUtils): Database or SpoolDB to record the run in.
+        curr_network (int): Id of the network.
+        curr_repeat (int): Number of this repeat.
+        log_time (datetime.datetime): When the run started evolving.
+        repeat_start_time (datetime.datetime): When the run was set up.
+        gens_stat_list (list): Record of each generation.
+        smart_term_msg (str): Why the run ended early, if it did.
+        summary (dict): Receives the run ID and smart_term_msg.
+        writer (RunWriter): Writer the generations were sent to as the run
+            evolved, or None to record gens_stat_list now.
+    """
+    runtime = datetime.datetime.now() - repeat_start_time
+
+    if writer is not None:
+        run_id       = writer.finish(runtime)
+        record_times = writer.getRecordTimes()
+    elif not args.disable_db:
+        run_info            = __runInfo(args, curr_network, log_time)
+        run_info["runtime"] = runtime
+
+        run_id       = pgdb.recordRun(run_info, gens_stat_list)
+        record_times = pgdb.getRecordTimes()
+    else:
+        run_id = -1
+
+    if run_id > 0 and args.debug:
+        print (
+            "DEBUG: Recorded run {0} in {1:.3f} s (config {2:.3f} s, "
+            "run {3:.3f} s, generations {4:.3f} s, commit {5:.3f} s, "
+            "waited {6:.3f} s)."
+            ).format(
+                run_id,
+                record_times["config"] + record_times["run"] +
+                    record_times["generations"] + record_times["commit"],
+                record_times["config"],
+                record_times["run"],
+                record_times["generations"],
+                record_times["commit"],
+                record_times.get("waited", 0.0))
+
+    if args.script_mode:
+        if run_id > 0 and args.spool is not None:
+            print (
+                "Completed repeat {0} spooled as run {1}. {2}".format(
+                    curr_repeat,
+                    run_id,
+                    smart_term_msg
+                ))
+        elif run_id > 0:
+            print (
+                "Completed repeat {0} with run ID {1}. {2}".format(
+                    curr_repeat,
+                    run_id,
+                    smart_term_msg
+                ))
+        else:
+            print (
+                "Completed repeat {0} without logging to DB. {1}".format(
+                    curr_repeat,
+                    smart_term_msg
+                ))
+
+    summary["run_id"]         = run_id
+    summary["smart_term_msg"] = smart_term_msg
+
+def __checkpointArgs(args):
+    """ Returns the arguments saved with a checkpoint.
+    """
+    return dict((name, getattr(args, name)) for name in CHECKPOINT_ARGS)
+
+def __sharedSlots(population):
+    """ Returns the first place of the population holding the same object
+    as each place. varOr and selection with replacement put one object in
+    several places, and NSGA2 then gives those places a single crowding
+    distance, so resuming must share them again.
+    """
+    first = {}
+
+    return [first.setdefault(id(ind), idx)
+        for idx, ind in enumerate(population)]
+
+def __checkpointState(args, status, gen, population, halloffame,
+    gens_stat_list, log_time, repeat_start_time, smart_term_msg):
+    """ Builds the checkpoint of a run at the end of generation gen. The
+    weighted fitness values are saved so the fitness is restored exactly,
+    along with the places of the population that share an object.
+
+    Args:
+        status (str): "running" while evolving or "evolved" once the run
+            is ready to be recorded.
+
+    Returns:
+        dict. State for write_checkpoint.
+    """
+    return {
+        "args"           : __checkpointArgs(args),
+        "status"         : status,
+        "gen"            : gen,
+        "genomes"        : np.array(population, dtype=np.float64),
+        "wvalues"        : np.array([ind.fitness.wvalues
+            for ind in population]),
+        "move_stats"     : [ind.move_stats for ind in population],
+        "shared"         : __sharedSlots(population),
+        "hof_genomes"    : np.array(halloffame, dtype=np.float64),
+        "hof_wvalues"    : np.array([ind.fitness.wvalues
+            for ind in halloffame]),
+        "hof_move_stats" : [ind.move_stats for ind in halloffame],
+        "gens_stat_list" : list(gens_stat_list),
+        "random_state"   : __getRandomState(),
+        "log_time"       : log_time,
+        "elapsed"        : datetime.datetime.now() - repeat_start_time,
+        "smart_term_msg" : smart_term_msg
+    }
+
+def __restoreIndividuals(args, genomes, wvalues, move_stats, shared=None):
+    """ Rebuilds the individuals saved in a checkpoint. Places listed in
+    shared with an earlier place get the object of that place.
+
+    Returns:
+        list. Individuals of the same type as toolbox.population makes.
+    """
+    if args.vectorized:
+        individuals = matrix_views(genomes, creator.IndividualArray,
+            creator.FitnessMulti)
+    else:
+        individuals = [creator.Individual(genome.tolist())
+            for genome in genomes]
+
+    for ind, ind_wvalues, ind_move_stats in zip(individuals, wvalues,
+        move_stats):
+        ind.fitness.wvalues = tuple(ind_wvalues.tolist())
+        ind.move_stats      = ind_move_stats
+
+    if shared is not None:
+        individuals = [individuals[first] for first in shared]
+
+    return individuals
+
+def __readCheckpoint(args, checkpoint):
+    """ Reads the checkpoint of a run being resumed, quitting if it was
+    saved with other arguments.
+
+    Returns:
+        dict. State of the run, or None if it has no checkpoint.
+    """
+    state = read_checkpoint(checkpoint)
+
+    if state is not None and state["args"] != __checkpointArgs(args):
+        logging.critical("Checkpoint {0} was saved with other "
+            "arguments.".format(checkpoint))
+        sys.exit(1)
+
+    return state
+
+def __gaInstance(args, pgdb, network_info, curr_repeat, fitness_cache,
+    pbar, progress, summary):
+    """ Runs one repeat of the GA on a network and records it.
+
+    This is a generator. Each evaluation it needs is yielded as a
+    request for __evaluateRequests and the results are sent back in.
+
+    With a checkpoint directory the state of the run is saved every
+    args.checkpoint_gens generations or args.checkpoint_secs seconds, and
+    with args.resume a run continues from its checkpoint exactly as if it
+    had not been stopped.
+
+    Args:
+        args (Namespace): Parsed arguments.
+        pgdb (DBUtils): Database or SpoolDB to record the run in.
+        network_info (dict): Id, name, template, number of parameters and
+            most food of the network.
+        curr_repeat (int): Number of this repeat.
+        fitness_cache (FitnessCache): Cache of evaluations, or None.
+        pbar (ProgressBar): Progress bar to update, or None.
+        progress (iterator): Counts the generations of all instances.
+        summary (dict): Receives the run ID and the early termination
+            message of the run.
+    """
+    repeat_start_time = datetime.datetime.now()
+
+    curr_network       = network_info["id"]
+    template           = network_info["template"]
+    network_params_len = network_info["params_len"]
+
+    checkpoint = None
+    state      = None
+    if args.checkpoint_dir is not None:
+        checkpoint = checkpoint_path(args.checkpoint_dir, curr_network,
+            args.trail, curr_repeat)
+
+        if args.resume:
+            state = __readCheckpoint(args, checkpoint)
+
+    if state is not None and state["status"] == "recorded":
+        # Leave the random number generators as the run did.
+        __setRandomState(state["random_state"])
+
+        if args.script_mode:
+            print (
+                "Skipped repeat {0}, already recorded with run ID {1}.".format(
+                    curr_repeat, state["run_id"]))
+
+        summary["run_id"]         = state["run_id"]
+        summary["smart_term_msg"] = state["smart_term_msg"]
+        return
+
+    # Chemical networks may be screened with the linear delay line
+    # surrogate for the first generations.
+    surrogate = (args.dl_surrogate_gens > 0 and
+        "Chemical" in network_info["name"])
+    if surrogate and state is not None:
+        surrogate = state["gen"] <= args.dl_surrogate_gens
+    if surrogate:
+        dl_integrator = "linear"
+    else:
+        dl_integrator = "odeint"
+    toolbox = __buildToolbox(args, template, network_params_len,
+        dl_integrator)
+
+    # Or their offspring may be screened with the surrogate every
+    # generation, with only those it keeps evaluated exactly.
+    prefilter = (args.dl_prefilter > 0 and
+        "Chemical" in network_info["name"])
+    if prefilter:
+        screen = base.Toolbox()
+        __registerEvaluation(screen, args, template, "linear")
+
+    # Genomes may be lists or arrays, so compare them with numpy.
+    halloffame = tools.HallOfFame(maxsize=1, similar=np.array_equal)
+    gen_stats  = GenerationStats(args.population)
+
+    # Keep track of the recent average food.
+    mean_food_window = RollingWindow(args.mean_check_length)
+
+    if state is None:
+        # Start a new evolution
+        population = toolbox.population(n=args.population)
+
+        # Record the start of this run.
+        log_time = datetime.datetime.now()
+        gen_start_time = log_time
+
+        # Evaluate and record the first generation here.
+        invalid_ind = [ind for ind in population if not ind.fitness.valid]
+        __assignFitness(invalid_ind, (yield (toolbox.evaluate_chunk,
+            invalid_ind, fitness_cache,
+            (curr_network, args.trail, args.moves, dl_integrator))))
+
+        # Determine the current generations statistics.
+        record = gen_stats.compile(
+            [ind.fitness.values for ind in population])
+
+        if args.debug:
+            print "DEBUG: Completed generation 1"
+
+        elite = tools.selBest(population, k=1)[0]
+
+        # The elite's move counts were kept from its evaluation.
+        gens_stat_list = [__generationRecord(1, record, elite,
+            __eliteMoveStats(elite, args.moves, template, surrogate),
+            datetime.datetime.now() - gen_start_time)]
+
+        smart_term_msg = ""
+        start_gen      = 2
+    else:
+        # Continue from the checkpoint.
+        population = __restoreIndividuals(args, state["genomes"],
+            state["wvalues"], state["move_stats"], state["shared"])
+        for ind in __restoreIndividuals(args, state["hof_genomes"],
+            state["hof_wvalues"], state["hof_move_stats"]):
+            halloffame.insert(ind)
+
+        gens_stat_list = list(state["gens_stat_list"])
+
+        # The window only ever saw the generations after the first.
+        for record_info in gens_stat_list[1:]:
+            mean_food_window.push(record_info["food_avg"])
+            next(progress)
+
+        log_time          = state["log_time"]
+        repeat_start_time = datetime.datetime.now() - state["elapsed"]
+        smart_term_msg    = state["smart_term_msg"]
+
+        if state["status"] == "evolved":
+            start_gen = args.generations + 1
+        else:
+            start_gen = state["gen"] + 1
+
+        __setRandomState(state["random_state"])
+
+    # Generations are written to the database in the background as they
+    # are produced.
+    writer = None
+    if not args.disable_db:
+        writer = pgdb.startRun(__runInfo(args, curr_network, log_time))
+
+        for record_info in gens_stat_list:
+            writer.add(record_info)
+
+    if checkpoint is None:
+        # The records are only kept for checkpoints.
+        del gens_stat_list[:]
+
+    checkpoint_gen  = start_gen - 1
+    checkpoint_time = time.time()
+
+    # Begin the generational process
+    for gen in range(start_gen, args.generations + 1):
+        gen_start_time = datetime.datetime.now()
+
+        if surrogate and gen > args.dl_surrogate_gens:
+            # Screening is over. Score the population exactly
+            # before breeding from it.
+            surrogate     = False
+            dl_integrator = "odeint"
+            __registerEvaluation(toolbox, args, template, dl_integrator)
+
+            __assignFitness(population, (yield (toolbox.evaluate_chunk,
+                population, fitness_cache,
+                (curr_network, args.trail, args.moves, dl_integrator))))
+
+            halloffame.clear()
+            halloffame.update(population)
+
+        # Vary the pool of individuals
+        if prefilter:
+            candidates = []
+            for _ in range(args.dl_prefilter):
+                candidates.extend(
+                    __varyPopulation(args, toolbox, population))
+
+            screened = [ind for ind in candidates if not ind.fitness.valid]
+            __assignFitness(screened, (yield (screen.evaluate_chunk,
+                screened, fitness_cache,
+                (curr_network, args.trail, args.moves, "linear"))))
+
+            offspring = __prefilterOffspring(candidates,
+                len(candidates) // args.dl_prefilter)
+
+            # The kept offspring are scored again exactly below.
+            for ind in screened:
+                del ind.fitness.values
+        else:
+            offspring = __varyPopulation(args, toolbox, population)
+
+        # Evaluate the individuals with an invalid fitness
+        invalid_ind = [ind for ind in offspring if not ind.fitness.valid]
+        __assignFitness(invalid_ind, (yield (toolbox.evaluate_chunk,
+            invalid_ind, fitness_cache,
+            (curr_network, args.trail, args.moves, dl_integrator))))
+
+        # Update the hall of fame with the generated individuals
+        if halloffame is not None:
+            halloffame.update(offspring)
+
+        # Replace the current population by the offspring
+        __replacePopulation(args, toolbox, population, offspring)
+
+        # Determine the current generations statistics.
+        record = gen_stats.compile([ind.fitness.values for ind in population])
+
+        if args.debug:
+            __debugRecord(gen, record)
+
+        elite = tools.selBest(population, k=1)[0]
+
+        record_info = __generationRecord(gen, record, elite,
+            __eliteMoveStats(elite, args.moves, template, surrogate),
+            datetime.datetime.now() - gen_start_time)
+
+        if writer is not None:
+            writer.add(record_info)
+        if checkpoint is not None:
+            gens_stat_list.append(record_info)
+
+        # Update the recent average food.
+        mean_food_window.push(record["food"]["avg"])
+
+        # Update the progress bar
+        if pbar:
+            pbar.update(next(progress))
+
+        # Surrogate fitness is not trusted to end a run.
+        if not surrogate:
+            smart_term_msg = __earlyQuitMessage(args, gen, record,
+                mean_food_window, network_info["max_food"])
+        if smart_term_msg:
+            break
+
+        if checkpoint is not None and (
+            gen - checkpoint_gen >= args.checkpoint_gens or
+            time.time() - checkpoint_time >= args.checkpoint_secs):
+            write_checkpoint(checkpoint, __checkpointState(args, "running",
+                gen, population, halloffame, gens_stat_list, log_time,
+                repeat_start_time, smart_term_msg))
+
+            checkpoint_gen  = gen
+            checkpoint_time = time.time()
+
+    if surrogate:
+        # The run ended while screening. Score it exactly before it is
+        # kept.
+        dl_integrator = "odeint"
+        __registerEvaluation(toolbox, args, template, dl_integrator)
+
+        __assignFitness(population, (yield (toolbox.evaluate_chunk,
+            population, fitness_cache,
+            (curr_network, args.trail, args.moves, dl_integrator))))
+
+        halloffame.clear()
+        halloffame.update(population)
+
+    if checkpoint is not None:
+        # Keep the finished run in case recording it fails.
+        write_checkpoint(checkpoint, __checkpointState(args, "evolved",
+            len(gens_stat_list), population, halloffame, gens_stat_list,
+            log_time, repeat_start_time, smart_term_msg))
+
+    # Record the statistics on this run.
+    __recordRun(args, pgdb, curr_network, curr_repeat, log_time,
+        repeat_start_time, gens_stat_list, smart_term_msg, summary, writer)
+
+    if checkpoint is not None:
+        write_checkpoint(checkpoint, {
+            "args"           : __checkpointArgs(args),
+            "status"         : "recorded",
+            "run_id"         : summary["run_id"],
+            "smart_term_msg" : smart_term_msg,
+            "random_state"   : __getRandomState()
+        })
+
+def __islandTask(islands, args, template, network_params_len):
+    """ Evolves islands on a worker. An island whose individuals are not
+    all evaluated has them evaluated as its first generation.
+
+    Args:
+        islands (list): Population, number of generations and random seed
+            of each island.
+        args (Namespace): Parsed arguments.
+        template (str): Key of the network and trail template.
+        network_params_len (int): Number of parameters of the network.
+
+    Returns:
+        list. The evolved population of each island and, for each
+        generation, the fitness of its individuals, its elite and the
+        time taken.
+    """
+    toolbox     = __buildToolbox(args, template, network_params_len, "odeint")
+    outer_state = __getRandomState()
+    results     = []
+
+    # Islands share the offspring of a generation.
+    lambda_ = args.lambda_ // args.islands
+
+    for population, generations, seed in islands:
+        random.seed(seed)
+        np.random.seed(seed)
+
+        records = []
+        for _ in xrange(generations):
+            gen_start_time = datetime.datetime.now()
+
+            if all(ind.fitness.valid for ind in population):
+                offspring = __varyPopulation(args, toolbox, population,
+                    lambda_)
+            else:
+                offspring = population
+
+            invalid_ind = [ind for ind in offspring if not ind.fitness.valid]
+            if invalid_ind:
+                __assignFitness(invalid_ind,
+                    toolbox.evaluate_chunk(invalid_ind))
+
+            if offspring is not population:
+                __replacePopulation(args, toolbox, population, offspring)
+
+            records.append((
+                [ind.fitness.values for ind in population],
+                tools.selBest(population, k=1)[0],
+                datetime.datetime.now() - gen_start_time))
+
+        results.append((population, records))
+
+    # Serial backends run this in the main process.
+    __setRandomState(outer_state)
+
+    return results
+
+def __migrateRing(islands, migrants):
+    """ Replaces the worst individuals of each island in place with the
+    best of the island before it, like tools.migRing. Individuals are
+    found by position since array genomes can not be compared with ==.
+    """
+    emigrants = [tools.selBest(island, migrants) for island in islands]
+
+    for idx, island in enumerate(islands):
+        worst = sorted(range(len(island)), key=lambda pos: island[pos].fitness)
+
+        for pos, immigrant in zip(worst, emigrants[idx - 1]):
+            island[pos] = immigrant
+
+def __islandInstance(args, pgdb, network_info, curr_repeat, pbar, progress,
+    summary):
+    """ Runs one repeat of the GA on a network as an island model and
+    records it. The population is split into args.islands islands that
+    each evolve on a worker. Every args.migration_interval generations the
+    best args.migrants individuals of each island replace the worst of the
+    next island in a ring.
+
+    This is a generator like __gaInstance. Each request yielded evolves
+    every island up to the next migration.
+    """
+    repeat_start_time = datetime.datetime.now()
+
+    curr_network = network_info["id"]
+
+    toolbox = __buildToolbox(args, network_info["template"],
+        network_info["params_len"], "odeint")
+    toolbox.register("evolve_islands", __islandTask, args=args,
+        template=network_info["template"],
+        network_params_len=network_info["params_len"])
+
+    # Start a new evolution
+    population = toolbox.population(n=args.population)
+    islands    = [population[idx::args.islands]
+        for idx in range(args.islands)]
+    gen_stats  = GenerationStats(args.population)
+
+    # Record the start of this run.
+    log_time = datetime.datetime.now()
+
+    gens_stat_list   = []
+    mean_food_window = RollingWindow(args.mean_check_length)
+    smart_term_msg   = ""
+    gen              = 0
+
+    while gen < args.generations and not smart_term_msg:
+        epoch_gens = min(args.migration_interval, args.generations - gen)
+
+        results = yield (toolbox.evolve_islands,
+            [(island, epoch_gens, random.randint(0, 2**32 - 1))
+                for island in islands], None, None)
+
+        islands = [island for island, records in results]
+
+        for gen_records in zip(*[records for island, records in results]):
+            gen += 1
+
+            record = gen_stats.compile([fitness
+                for island_fitness, island_elite, runtime in gen_records
+                for fitness in island_fitness])
+
+            if args.debug:
+                __debugRecord(gen, record)
+
+            elite = tools.selBest([island_elite
+                for island_fitness, island_elite, runtime in gen_records],
+                k=1)[0]
+
+            # The islands evolve at the same time, so a generation takes
+            # as long as the slowest island.
+            gens_stat_list.append(__generationRecord(gen, record, elite,
+                elite.move_stats,
+                max(runtime for island_fitness, island_elite, runtime
+                    in gen_records)))
+
+            if gen == 1:
+                continue
+
+            # Update the recent average food.
+            mean_food_window.push(record["food"]["avg"])
+
+            # Update the progress bar
+            if pbar:
+                pbar.update(next(progress))
+
+            smart_term_msg = __earlyQuitMessage(args, gen, record,
+                mean_food_window, network_info["max_food"])
+            if smart_term_msg:
+                break
+
+        __migrateRing(islands, args.migrants)
+
+    # Record the statistics on this run.
+    __recordRun(args, pgdb, curr_network, curr_repeat, log_time,
+        repeat_start_time, gens_stat_list, smart_term_msg, summary)
+
+def __steadyStateInstance(args, pgdb, backend, network_info, curr_repeat,
+    pbar, progress, summary):
+    """ Runs one repeat of the GA on a network as a steady-state GA and
+    records it. Up to args.in_flight children are evaluated at a time and
+    each one takes its place in the population as soon as it returns,
+    instead of waiting for a whole generation. The population is recorded
+    as a generation every args.stats_interval evaluations.
+
+    This is a generator like __gaInstance, but only the first generation
+    is yielded as a request. The children are sent to the backend
+    directly.
+    """
+    repeat_start_time = datetime.datetime.now()
+
+    curr_network = network_info["id"]
+
+    toolbox = __buildToolbox(args, network_info["template"],
+        network_info["params_len"], "odeint")
+
+    in_flight      = args.in_flight or 2 * backend.getWorkers()
+    stats_interval = args.stats_interval or args.population
+
+    # Start a new evolution
+    population = toolbox.population(n=args.population)
+    gen_stats  = GenerationStats(args.population)
+
+    # Record the start of this run.
+    log_time = datetime.datetime.now()
+    gen_start_time = log_time
+
+    # Evaluate and record the first generation here.
+    __assignFitness(population, (yield (toolbox.evaluate_chunk,
+        population, None, None)))
+
+    record = gen_stats.compile([ind.fitness.values for ind in population])
+
+    if args.debug:
+        print "DEBUG: Completed generation 1"
+
+    elite = tools.selBest(population, k=1)[0]
+
+    gens_stat_list = [__generationRecord(1, record, elite, elite.move_stats,
+        datetime.datetime.now() - gen_start_time)]
+
+    mean_food_window = RollingWindow(args.mean_check_length)
+    smart_term_msg   = ""
+    gen              = 1
+    evaluations      = 0
+
+    gen_start_time = datetime.datetime.now()
+
+    while gen < args.generations and not smart_term_msg:
+        # Keep the workers busy with children of the current population.
+        # Children that were not changed keep their parent's fitness and
+        # are skipped, so only in_flight pairs are bred each time. One is
+        # mutated and evaluated anyway when nothing else is in flight.
+        for _ in range(in_flight):
+            if backend.getSubmitted() >= in_flight:
+                break
+
+            children = __varyPopulation(args, toolbox,
+                tools.selRandom(population, 2))
+            for child in children:
+                if not child.fitness.valid:
+                    backend.submit(toolbox.evaluate, child)
+
+        if not backend.getSubmitted():
+            if args.mutate_type in [5]:
+                child, = toolbox.mutate(children[0],
+                    sigma=np.std(children[0]))
+            else:
+                child, = toolbox.mutate(children[0])
+            del child.fitness.values
+
+            backend.submit(toolbox.evaluate, child)
+
+        # The child takes the place of the worst individual if it is
+        # fitter.
+        child, result = backend.nextCompleted()
+        __assignFitness([child], [result])
+        replace_worst(population, child)
+
+        evaluations += 1
+        if evaluations % stats_interval != 0:
+            continue
+
+        gen += 1
+
+        record = gen_stats.compile([ind.fitness.values for ind in population])
+
+        if args.debug:
+            __debugRecord(gen, record)
+
+        elite = tools.selBest(population, k=1)[0]
+
+        gens_stat_list.append(__generationRecord(gen, record, elite,
+            elite.move_stats, datetime.datetime.now() - gen_start_time))
+
+        gen_start_time = datetime.datetime.now()
+
+        # Update the recent average food.
+        mean_food_window.push(record["food"]["avg"])
+
+        # Update the progress bar
+        if pbar:
+            pbar.update(next(progress))
+
+        smart_term_msg = __earlyQuitMessage(args, gen, record,
+            mean_food_window, network_info["max_food"])
+
+    # Children still being evaluated are not needed any more.
+    while backend.getSubmitted():
+        backend.nextCompleted()
+
+    # Record the statistics on this run.
+    __recordRun(args, pgdb, curr_network, curr_repeat, log_time,
+        repeat_start_time, gens_stat_list, smart_term_msg, summary)
+
+def __spoolSource(args, spool):
+    """ Copies the trail and networks of a run into the spool the first
+    time they are spooled, so later runs spooled to it do not need the
+    database. Quits if they are missing and the database can not be read.
+    """
+    missing_trail    = spool.getTrailData(args.trail) is None
+    missing_networks = [network_id for network_id in args.network
+        if spool.getNetworkByID(network_id) is None]
+
+    if not missing_trail and not missing_networks:
+        return
+
+    try:
+        pgdb = DBUtils(config_file=DB_CONFIG_FILE)
+
+        if missing_trail:
+            spool.addTrail(args.trail, *pgdb.getTrailData(args.trail))
+
+        for network_id in missing_networks:
+            spool.addNetwork(network_id, pgdb.getNetworkByID(network_id))
+    except (IOError, ValueError, KeyError, psycopg2.Error) as e:
+        logging.critical("The trail and networks are not in the spool {0} "
+            "yet and could not be read from the database: {1}".format(
+                args.spool, str(e).strip()))
+        sys.exit(1)
 
 def main(args):
     run_date = time.time()
@@ -135,12 +1342,28 @@ def main(args):
     if args.quiet:
         root.propogate = False
 
-    # Set up the database.
-    pgdb = DBUtils(config_file=DB_CONFIG_FILE)
+    if args.seed is not None:
+        random.seed(args.seed)
+        np.random.seed(args.seed)
+
+    backend = EvaluationBackend(args.backend, processes=args.processes)
+
+    if args.spool is not None:
+        # Runs are recorded in the spool instead, which also keeps the trail
+        # and networks so the database is not needed.
+        recorder = SpoolDB(args.spool)
+        __spoolSource(args, recorder)
+        source   = recorder
+    else:
+        # Set up the database. Each run writer holds a connection and
+        # briefly takes another to add the configuration of its run.
+        recorder = DBUtils(config_file=DB_CONFIG_FILE,
+            max_connections=max(10, 2 * args.concurrent_runs + 1))
+        source   = recorder
 
     # Get the name of this agent trail for later use
     at = AgentTrail()
-    at.readTrail(args.trail, DB_CONFIG_FILE)
+    at.readTrailInstant(*source.getTrailData(args.trail))
     trail_name = at.getName()
 
     if not args.quiet and not args.debug and not args.script_mode:
@@ -158,18 +1381,17 @@ def main(args):
     else:
         pbar = None
 
-    current_overall_gen = 0
+    progress = count(1)
+    summary  = {"run_id" : -1, "smart_term_msg" : ""}
+
+    networks       = []
+    instances      = []
+    fitness_caches = []
 
     for curr_network in args.network:
 
         # Query the database to get the network information.
-        pybrain_network = pgdb.getNetworkByID(curr_network)
-
-        temp_f_h, temp_f_network = tempfile.mkstemp()
-        os.close(temp_f_h)
-
-        with open(temp_f_network, "w") as f:
-            pickle.dump(pybrain_network, f)
+        pybrain_network = source.getNetworkByID(curr_network)
 
         # TODO: Need to fix this for chemistry support here.
         if "Chemical" in pybrain_network.name:
@@ -185,319 +1407,77 @@ def main(args):
         # Query the database to get the trail information.
         (data_matrix,
         db_trail_name,
-        init_rot) = pgdb.getTrailData(args.trail)
-
+        init_rot) = source.getTrailData(args.trail)
+
+        # Share the network and trail with the workers once for all repeats.
+        an_temp = AgentNetwork()
+        an_temp.readNetworkInstant(pybrain_network)
+        if args.dl_cache > 0:
+            an_temp.setDelayLineCache(DelayLineCache(max_size=args.dl_cache))
+        at_temp = AgentTrail()
+        at_temp.readTrailInstant(data_matrix, db_trail_name, init_rot)
+
+        network_info = {}
+        network_info["id"]         = curr_network
+        network_info["name"]       = pybrain_network.name
+        network_info["template"]   = share_template(curr_network, args.trail,
+            an_temp, at_temp)
+        network_info["params_len"] = network_params_len
         # Calculate the maximum amount of food for potential later comparison.
-        MAX_FOOD = np.bincount(np.array(data_matrix).flatten())[1]
+        network_info["max_food"]   = np.bincount(
+            np.array(data_matrix).flatten())[1]
+
+        networks.append(network_info)
+
+        # Evaluations only depend on the genome, network, trail and moves,
+        # so the repeats may share a fitness cache.
+        fitness_cache = None
+        if args.fitness_cache > 0 and args.share_fitness_cache:
+            fitness_cache = FitnessCache(max_size=args.fitness_cache)
+            fitness_caches.append(fitness_cache)
 
         for curr_repeat in range(0, args.repeat):
-            repeat_start_time = datetime.datetime.now()
-
-            gens_stat_list = [None] * args.generations
-            # Create an empty array to store the launches for SCOOP.
-            launches = []
-
-            # Prepare the array for storing hall of fame.
-            hof_array = np.zeros((args.generations,
-                network_params_len))
-
-            toolbox = base.Toolbox()
-            toolbox.register("map", scoop.futures.map)
-            toolbox.register("attr_float", random.uniform,
-                a=args.weight_min, b=args.weight_max)
-            toolbox.register("individual", tools.initRepeat, creator.Individual,
-                toolbox.attr_float, n=network_params_len)
-            toolbox.register("population", tools.initRepeat, list,
-                toolbox.individual)
-
-            an_temp = AgentNetwork()
-            an_temp.readNetworkFromFile(temp_f_network)
-            at_temp = AgentTrail()
-            at_temp.readTrailInstant(data_matrix, db_trail_name, init_rot)
-
-            toolbox.register("evaluate", __singleMazeTask, moves=args.moves,
-                network=pickle.dumps(an_temp), trail=pickle.dumps(at_temp))
-            toolbox.register("mate", tools.cxTwoPoint)
-            if args.mutate_type == 1:
-                toolbox.register("mutate",
-                    tools.mutFlipBit,
-                    indpb=P_BIT_MUTATE)
-            elif args.mutate_type == 2:
-                toolbox.register("mutate",
-                    mutUniformFloat,
-                    low=args.weight_min,
-                    up=args.weight_max,
-                    indpb=P_BIT_MUTATE)
-            elif args.mutate_type == 3:
-                toolbox.register("mutate",
-                    mutUniformFloat,
-                    low=args.weight_min,
-                    up=args.weight_max,
-                    indpb=0.30)
-            elif args.mutate_type == 4:
-                toolbox.register("mutate",
-                    mutUniformFloat,
-                    low=args.weight_min,
-                    up=args.weight_max,
-                    indpb=0.10)
-            elif args.mutate_type == 5:
-                toolbox.register("mutate",
-                    tools.mutGaussian,
-                    mu=0,
-                    indpb=0.05)
-            else:
-                print "ERROR: Please selct a valid mutate type!"
-                sys.exit(10)
-
-            if args.selection == 1:
-                # Selection is tournment. Must use argument from user.
-                toolbox.register("select", tools.selTournament,
-                    tournsize=args.tournament_size)
-            elif args.selection == 2:
-                toolbox.register("select", tools.selRoulette)
-            elif args.selection == 3:
-                toolbox.register("select", tools.selNSGA2)
-            elif args.selection == 4:
-                toolbox.register("select", tools.selSPEA2)
-            elif args.selection == 5:
-                toolbox.register("select", tools.selRandom)
-            elif args.selection == 6:
-                toolbox.register("select", tools.selBest)
-            elif args.selection == 7:
-                toolbox.register("select", tools.selWorst)
-            elif args.selection == 8:
-                toolbox.register("select", tools.selTournamentDCD)
+            if args.fitness_cache > 0 and not args.share_fitness_cache:
+                fitness_cache = FitnessCache(max_size=args.fitness_cache)
+                fitness_caches.append(fitness_cache)
+
+            if args.steady_state:
+                instances.append(__steadyStateInstance(args, recorder, backend,
+                    network_info, curr_repeat, pbar, progress, summary))
+            elif args.islands > 1:
+                instances.append(__islandInstance(args, recorder, network_info,
+                    curr_repeat, pbar, progress, summary))
             else:
-                print "ERROR: Something is wrong with selection method!"
-                sys.exit(10)
-
-            # Start a new evolution
-            population = toolbox.population(n=args.population)
-            halloffame = tools.HallOfFame(maxsize=1)
-            food_stats = tools.Statistics(key=lambda ind: ind.fitness.values[0])
-            move_stats = tools.Statistics(key=lambda ind: ind.fitness.values[1])
-            mstats     = tools.MultiStatistics(food=food_stats, moves=move_stats)
-
-            mstats.register("min", np.min)
-            mstats.register("avg", np.mean)
-            mstats.register("max", np.max)
-            mstats.register("std", np.std)
-            mstats.register("mode", mode)
-
-            # Record the start of this run.
-            log_time = datetime.datetime.now()
-
-            # Evaluate and record the first generation here.
-            invalid_ind = [ind for ind in population if not ind.fitness.valid]
-            fitnesses = toolbox.map(toolbox.evaluate, invalid_ind)
-            for ind, fit in zip(invalid_ind, fitnesses):
-                ind.fitness.values = fit
-
-            # Determine the current generations statistics.
-            record = mstats.compile(population)
+                instances.append(__gaInstance(args, recorder, network_info,
+                    curr_repeat, fitness_cache, pbar, progress, summary))
 
-            if args.debug:
-                print "DEBUG: Completed generation 1"
-
-            hof_indiv = np.array(tools.selBest(population, k=1)[0])
-            hof_array[0] = hof_indiv
-
-            # Add the hall of fame to launches.
-            launches.append(
-                scoop.futures.submit(__singleMazeTask,
-                hof_indiv,
-                args.moves,
-                pickle.dumps(an_temp),
-                pickle.dumps(at_temp),
-                1,
-                record)
-            )
-
-            # Keep track of the average food history.
-            mean_food_history = []
-            smart_term_msg = ""
-
-            # Begin the generational process
-            for gen in range(2, args.generations + 1):
-                # Vary the pool of individuals
-                if args.variation in [1]:
-                    offspring = algorithms.varAnd(population, toolbox,
-                        cxpb=args.prob_crossover, mutpb=args.prob_mutate)
-                elif args.variation in [2, 3, 4]:
-                    offspring = algorithms.varOr(population, toolbox,
-                        lambda_=args.lambda_,
-                        cxpb=args.prob_crossover, mutpb=args.prob_mutate)
-                elif args.variation in [5]:
-                    # Take and modify the varAnd from DEAP.
-                    offspring = [toolbox.clone(ind) for ind in population]
-
-                    # Apply crossover and mutation on the offspring
-                    for i in range(1, len(offspring), 2):
-                        if random.random() < args.prob_crossover:
-                            offspring[i-1], offspring[i] = toolbox.mate(
-                                offspring[i-1], offspring[i])
-                            del (offspring[i-1].fitness.values,
-                                offspring[i].fitness.values)
-
-                    for i in range(len(offspring)):
-                        if random.random() < args.prob_mutate:
-                            if args.mutate_type in [5]:
-                                offspring[i], = toolbox.mutate(
-                                    offspring[i],
-                                    sigma=np.std(offspring[i]))
-                            else:
-                                offspring[i], = toolbox.mutate(
-                                    offspring[i], offspring[i])
-                            del offspring[i].fitness.values
+    if args.concurrent_runs > 1:
+        # Instances running together draw from random number generators of
+        # their own so the runs do not depend on how they interleave.
+        instances = [__ownRandomState(instance, random.randint(0, 2**32 - 1))
+            for instance in instances]
 
-                else:
-                    print ("ERROR: Something is really wrong! " +
-                        "Reached an invalid variation type!")
-                    sys.exit(5)
-
-                # Evaluate the individuals with an invalid fitness
-                invalid_ind = [ind for ind in offspring if not ind.fitness.valid]
-                fitnesses = toolbox.map(toolbox.evaluate, invalid_ind)
-                for ind, fit in zip(invalid_ind, fitnesses):
-                    ind.fitness.values = fit
-
-                # Update the hall of fame with the generated individuals
-                if halloffame is not None:
-                    halloffame.update(offspring)
-
-                # Replace the current population by the offspring
-                if args.variation in [2, 3]:
-                    population[:] = toolbox.select(offspring, args.population)
-                elif args.variation in [4, 5]:
-                    population[:] = toolbox.select(offspring + population,
-                        args.population)
-                else:
-                    population[:] = offspring
-
-                # Determine the current generations statistics.
-                record = mstats.compile(population)
-
-                if args.debug:
-                    print "DEBUG: Completed generation {0}.".format(gen)
-                    print (
-                        "DEBUG: Food (Min / Max / Avg / Std / Mode): "
-                              "{0} / {1} / {2} / {3} / {4}".format(
-                                record["food"]["min"],
-                                record["food"]["max"],
-                                record["food"]["avg"],
-                                record["food"]["std"],
-                                record["food"]["mode"]))
-                    print (
-                        "DEBUG: Moves (Min / Max / Avg / Std / Mode): "
-                              "{0} / {1} / {2} / {3} / {4}".format(
-                                record["moves"]["min"],
-                                record["moves"]["max"],
-                                record["moves"]["avg"],
-                                record["moves"]["std"],
-                                record["moves"]["mode"]))
-
-                hof_indiv = np.array(tools.selBest(population, k=1)[0])
-
-                hof_array[gen - 1] = hof_indiv
-
-                # Add the hall of fame to launches.
-                launches.append(
-                    scoop.futures.submit(__singleMazeTask,
-                    hof_indiv,
-                    args.moves,
-                    pickle.dumps(an_temp),
-                    pickle.dumps(at_temp),
-                    gen,
-                    record)
-                )
-
-                # Update the mean food history.
-                mean_food_history.append(record["food"]["avg"])
-
-                # Update the progress bar
-                if pbar:
-                    current_overall_gen += 1
-                    pbar.update(current_overall_gen)
-
-                # Check if it is time to quit if variation is 3. Critera are
-                # any of the following:
-                #  1) All food has been collected.
-                #  2) Mean has not changed for args.mean_check_length
-                #  3) Run out of generations (happens without this if)
-                if args.variation in [3, 4, 5] and not args.no_early_quit:
-                    if (int(record["food"]["max"]) == int(MAX_FOOD)):
-                        smart_term_msg = ("Exited at generation {0} because "
-                            "all food was consumed.").format(gen)
-                        break
-                    elif(len(mean_food_history) >= args.mean_check_length and
-                        (np.std(mean_food_history[-args.mean_check_length:])
-                            < 0.1)):
-                        smart_term_msg = ("Exited at generation {0} because "
-                            "mean check length has been met.").format(gen)
-                        break
-
-
-            # Evaluate the Hall of Fame individual for each generation here
-            # in a multithreaded fashion to speed things up.
-            for this_future in scoop.futures.as_completed(launches):
-                result = this_future.result()
-                gens_stat_list[result[0] - 1] = result[1]
-
-            # Remove all of the None values from the gen_stat_list
-            gens_stat_list = filter(lambda a: a is not None, gens_stat_list)
-
-            # Record the statistics on this run.
-            run_info = {}
-
-            run_info["trails_id"]    = args.trail
-            run_info["networks_id"]  = curr_network
-            run_info["selection_id"] = args.selection
-            run_info["mutate_id"]    = args.mutate_type
-            run_info["host_type_id"] = 1 # Only one host type for now.
-            run_info["variations_id"] = args.variation
-            run_info["run_date"]     = log_time
-            run_info["hostname"]     = socket.getfqdn()
-            run_info["generations"]  = args.generations
-            run_info["population"]   = args.population
-            run_info["moves_limit"]  = args.moves
-            run_info["sel_tourn_size"]  = args.tournament_size
-            if args.variation in [1, 5]:
-                run_info["lambda"] = 0
-            else:
-                run_info["lambda"] = args.lambda_
-            run_info["p_mutate"]     = args.prob_mutate
-            run_info["p_crossover"]  = args.prob_crossover
-            run_info["weight_min"]   = args.weight_min
-            run_info["weight_max"]   = args.weight_max
-            run_info["debug"]        = args.debug
-            # Version for if anything changes in python GA Algorithm
-            run_info["algorithm_ver"] = 2
-            run_info["mean_check_length"] = args.mean_check_length
-            run_info["runtime"]      = (datetime.datetime.now() -
-                repeat_start_time)
-
-            if not args.disable_db:
-                run_id = pgdb.recordRun(run_info, gens_stat_list)
-            else:
-                run_id = -1
-
-            if args.script_mode:
-                if run_id > 0:
-                    print (
-                        "Completed repeat {0} with run ID {1}. {2}".format(
-                            curr_repeat,
-                            run_id,
-                            smart_term_msg
-                        ))
-                else:
-                    print (
-                        "Completed repeat {0} without logging to DB. {1}".format(
-                            curr_repeat,
-                            smart_term_msg
-                        ))
+    backend.start([network_info["template"] for network_info in networks])
+
+    __runInstances(instances, backend, args.concurrent_runs, args.chunk_size)
+
+    backend.close()
+
+    if args.script_mode and args.dl_cache > 0:
+        for network_info in networks:
+            if "Chemical" not in network_info["name"]:
+                continue
 
-        # Delete the temporary file
-        os.remove(temp_f_network)
+            # Only the evaluations run by this process are counted.
+            cache_stats = load_template(network_info["template"])[0
+                ].getDelayLineCache().getStats()
+            print (
+                "Delay line cache of network {0} in this process: {1} hits, "
+                "{2} misses, {3} responses stored.".format(
+                    network_info["id"],
+                    cache_stats["hits"],
+                    cache_stats["misses"],
+                    cache_stats["size"]))
 
     # Calculate and display the total runtime
     if pbar:
@@ -505,7 +1485,17 @@ def main(args):
 
     total_time_s = time.time() - run_date
 
-    if run_id > 0:
+    run_id         = summary["run_id"]
+    smart_term_msg = summary["smart_term_msg"]
+
+    if args.spool is not None:
+        recorder.close()
+
+        print "Spooled all runs to {0} in {1}. {2}".format(
+                args.spool,
+                time.strftime('%H:%M:%S', time.gmtime(total_time_s)),
+                smart_term_msg)
+    elif run_id > 0:
         print "Final Run ID {0} completed all runs in {1}. {2}".format(
                 run_id,
                 time.strftime('%H:%M:%S', time.gmtime(total_time_s)),
@@ -515,6 +1505,15 @@ def main(args):
                 time.strftime('%H:%M:%S', time.gmtime(total_time_s)),
                 smart_term_msg)
 
+    if fitness_caches:
+        cache_hits   = sum(cache.hits for cache in fitness_caches)
+        cache_misses = sum(cache.misses for cache in fitness_caches)
+
+        print "Fitness cache: {0} hits, {1} misses ({2:.1f}% hit rate).".format(
+            cache_hits,
+            cache_misses,
+            100.0 * cache_hits / max(1, cache_hits + cache_misses))
+
 
 if __name__ == "__main__":
     args = utils.parse_args(DB_CONFIG_FILE)
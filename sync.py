@@ -0,0 +1,70 @@
+"""Script to upload the runs spooled by ga_runner.py to the database.
+
+Example:
+  Runs recorded with --spool are uploaded once the database can be
+  reached. Runs that were uploaded before are skipped, so the script can
+  be run again after an interruption.
+
+      $ python sync.py runs.sqlite
+
+"""
+import argparse
+import time
+
+from GATools.DBUtils import DBUtils
+from GATools.spool import SpoolDB
+
+CONFIG_FILE = "config/config.json"
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Uploads spooled runs to the database.')
+    parser.add_argument('spool',
+        help='The spool file written by ga_runner.py --spool.')
+    parser.add_argument('--dry-run', action='store_true',
+        help='Lists the runs that would be uploaded.')
+    parser.add_argument('--debug', action='store_true',
+        help='Enables debug information.')
+
+    args = parser.parse_args()
+
+    spool = SpoolDB(args.spool)
+
+    unfinished = spool.getUnfinished()
+    if unfinished:
+        print "Skipping {0} unfinished runs: {1}".format(len(unfinished),
+            ", ".join(str(x) for x in unfinished))
+
+    unsynced = spool.getUnsynced()
+
+    if args.dry_run:
+        print "Would upload {0} runs: {1}".format(len(unsynced),
+            ", ".join(str(x) for x in unsynced))
+        return
+
+    pgdb = DBUtils(CONFIG_FILE)
+
+    start = time.time()
+    added = 0
+
+    for spool_id in unsynced:
+        run_info, gen_info = spool.readRun(spool_id)
+
+        run_id, is_new = pgdb.syncRun(run_info, gen_info)
+
+        spool.markSynced(spool_id, run_id)
+
+        if is_new:
+            added += 1
+
+        if args.debug:
+            print "DEBUG: Spooled run {0} is run ID {1}{2}.".format(
+                spool_id, run_id, "" if is_new else " (already uploaded)")
+
+    spool.close()
+
+    print "Uploaded {0} of {1} runs in {2:.1f} s.".format(added,
+        len(unsynced), time.time() - start)
+
+if __name__ == "__main__":
+    main()